@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.utils.session_store import SESSION_DB_PATH
+
+# Reports generated at once by each API worker process
+REPORT_WORKERS = max(1, int(os.getenv("REPORT_WORKERS", "2")))
+# Reports allowed to wait for a free worker; beyond this /report answers 429
+REPORT_QUEUE_MAX = max(0, int(os.getenv("REPORT_QUEUE_MAX", "16")))
+
+# Folder under the session holding each running job's own plots and report images
+REPORT_JOBS_DIR = "report_jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = {SUCCEEDED, FAILED, CANCELLED}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_jobs (
+    job_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    current_node TEXT,
+    error TEXT,
+    report_path TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS report_job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+)
+"""
+
+_COLUMNS = (
+    "job_id", "session_id", "status", "current_node", "error", "report_path",
+    "cancel_requested", "worker_pid", "created_at", "started_at", "finished_at",
+)
+
+
+def job_work_path(session_path: str, job_id: str) -> str:
+    """The job's own folder under its session (`report_work_path` of its report)."""
+    return os.path.join(session_path, REPORT_JOBS_DIR, os.path.basename(job_id))
+
+
+def promote_files(source_dir: str, target_dir: str) -> None:
+    """Moves every file of `source_dir` into `target_dir`, each replacing its namesake atomically."""
+    if not os.path.isdir(source_dir):
+        return
+    os.makedirs(target_dir, exist_ok=True)
+    for name in os.listdir(source_dir):
+        os.replace(os.path.join(source_dir, name), os.path.join(target_dir, name))
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while every worker and queue slot is taken."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g. PermissionError: the process exists but belongs to someone else
+        return True
+    return True
+
+
+class ReportJobQueue:
+    """
+    Runs report jobs on a bounded pool of background threads.
+
+    `submit` returns immediately with a job id; the job then waits for one of
+    `workers` threads. At most `max_queued` jobs may wait at once, so the
+    load a worker process accepts is predictable. Job rows live in the SQLite
+    session database, so status, queue position and cancellation work from
+    any API worker process. A running job is cancelled cooperatively: the job
+    function calls `check_cancelled` between workflow nodes.
+
+    Args:
+        run_job (Callable): `run_job(job_id, session_id, **job_kwargs)`; returns
+            the report path. It runs on a pool thread.
+        db_path (str): SQLite database holding the job rows.
+        workers (int): Jobs run in parallel by this process.
+        max_queued (int): Jobs allowed to wait for a worker.
+    """
+
+    def __init__(self, run_job: Callable[..., Optional[str]], db_path: str = SESSION_DB_PATH,
+                 workers: int = REPORT_WORKERS, max_queued: int = REPORT_QUEUE_MAX):
+        self.run_job = run_job
+        self.db_path = db_path
+        self.workers = workers
+        self.max_queued = max_queued
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE report_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+        if "status" in fields:
+            self.add_event(job_id, {"event": "status", "status": fields["status"], "error": fields.get("error")})
+
+    def _row(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM report_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def submit(self, session_id: str, **job_kwargs: Any) -> Dict[str, Any]:
+        """
+        Enqueues a report job for `session_id`.
+
+        Raises:
+            QueueFullError: If `workers + max_queued` jobs are already pending here.
+        """
+        job_id = str(uuid.uuid4())
+
+        with self._lock:
+            pending = sum(1 for future in self._futures.values() if not future.done())
+            if pending >= self.workers + self.max_queued:
+                raise QueueFullError(
+                    f"{pending} report jobs are already queued or running; try again later."
+                )
+
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO report_jobs (job_id, session_id, status, worker_pid, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (job_id, session_id, QUEUED, os.getpid(), time.time()),
+                )
+            self.add_event(job_id, {"event": "status", "status": QUEUED, "error": None})
+            future = self._executor.submit(self._run, job_id, session_id, job_kwargs)
+            self._futures[job_id] = future
+            future.add_done_callback(lambda _, job_id=job_id: self._forget(job_id))
+
+        return self.get(job_id)
+
+    def _forget(self, job_id: str) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _run(self, job_id: str, session_id: str, job_kwargs: Dict[str, Any]) -> None:
+        if self.is_cancel_requested(job_id):
+            self._update(job_id, status=CANCELLED, finished_at=time.time())
+            return
+
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            report_path = self.run_job(job_id, session_id, **job_kwargs)
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            print(f"Report job {job_id} failed: {e}")
+            self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        else:
+            self._update(job_id, status=SUCCEEDED, report_path=report_path, finished_at=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job row plus its `queue_position` (0 once it is running)."""
+        job = self._row(job_id)
+        if job is None:
+            return None
+
+        if job["status"] not in FINISHED_STATUSES and not _pid_alive(job["worker_pid"]):
+            # The worker process that owned the job exited before finishing it
+            self._update(job_id, status=FAILED, error="The worker running this job exited.",
+                         finished_at=time.time())
+            job = self._row(job_id)
+
+        job["queue_position"] = None
+        if job["status"] == QUEUED:
+            with self._connect() as conn:
+                ahead = conn.execute(
+                    "SELECT COUNT(*) FROM report_jobs WHERE status = ? AND worker_pid = ? AND created_at < ?",
+                    (QUEUED, job["worker_pid"], job["created_at"]),
+                ).fetchone()[0]
+            job["queue_position"] = ahead + 1
+        elif job["status"] == RUNNING:
+            job["queue_position"] = 0
+
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Requests cancellation. A queued job is dropped before it starts; a
+        running job stops at its next workflow node boundary.
+        """
+        job = self._row(job_id)
+        if job is None:
+            return None
+        if job["status"] in FINISHED_STATUSES:
+            return self.get(job_id)
+
+        self._update(job_id, cancel_requested=1)
+
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            self._update(job_id, status=CANCELLED, finished_at=time.time())
+
+        return self.get(job_id)
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM report_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def check_cancelled(self, job_id: str) -> None:
+        """Raises JobCancelled if cancellation was requested for `job_id`."""
+        if self.is_cancel_requested(job_id):
+            raise JobCancelled(job_id)
+
+    def set_current_node(self, job_id: str, node: str) -> None:
+        self._update(job_id, current_node=node)
+
+    def add_event(self, job_id: str, event: Dict[str, Any]) -> None:
+        """Appends a progress event to the job's event log."""
+        payload = json.dumps(event, default=str)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO report_job_events (job_id, seq, created_at, payload) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM report_job_events WHERE job_id = ?",
+                (job_id, time.time(), payload, job_id),
+            )
+
+    def events(self, job_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """
+        Returns the job's events with a sequence number above `after_seq`, in
+        order. Each event carries its `seq`, so clients can resume from the
+        last one they saw.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, payload FROM report_job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq),
+            ).fetchall()
+        return [{"seq": seq, **json.loads(payload)} for seq, payload in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            futures = list(self._futures.values())
+        running = sum(1 for future in futures if future.running())
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "running": running,
+            "queued": sum(1 for future in futures if not future.done()) - running,
+        }
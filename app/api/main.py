@@ -1,15 +1,36 @@
 import os
+import json
 import uuid
+import asyncio
 import shutil
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional
+from fastapi import FastAPI, Request, Response, UploadFile, File, Header, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from app.core.utils.load_llm import LLMLoader
-from app.api.models import ReportRequest, SessionResponse, ChatRequest, ChatResponse
-from app.core.utils.load_data import load_data, Table
-from app.core.utils.preprocess_data import preprocess_tables
-from app.core.workflow import build_report_workflow, build_chat_workflow
+from app.api.models import (
+    AnalyticsPlan, AnalyticsPlanResponse, ReportJobResponse, SessionResponse, ChatRequest, ChatResponse
+)
+from app.api.jobs import ReportJobQueue, QueueFullError, SUCCEEDED, FINISHED_STATUSES, job_work_path, promote_files
+from app.core.utils.load_data import load_data
+from app.core.utils.preprocess_data import (
+    preprocess_tables, schema_to_arrow_convert_options, table_memory_footprint, peak_rss_bytes
+)
+from app.core.utils.columnar_store import (
+    COLUMNAR_DIR, SESSION_DATA_TYPE, save_session_tables, read_columnar
+)
+from app.core.utils.profile_data import profile_tables, save_profile
+from app.core.utils.schema_context import build_schema_context, save_schema_context
+from app.core.utils.join_keys import JOIN_KEY_DETECTION_ENABLED, detect_join_keys, save_join_keys, save_key_indexes
+from app.core.llm_tools.schema_selection import build_schema_index
+from app.core.utils.section_store import delete_analytics_plan, load_analytics_plan, save_analytics_plan
+from app.core.utils.chat_memory import chat_session_lock, clear_chat_memory, load_chat_memory
+from app.core.utils.session_store import SESSIONS_ROOT, get_session_store
+from app.core.utils.ingest import ingest_csv_stream, ingested_file_name, ingested_file_path
 from app.core.state import ReportState, ChatState
 
 # Load environment variables
@@ -26,14 +47,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- In-memory Session Storage ---
-SESSIONS: dict[str, dict] = {}
+# "staged" runs each workflow stage for all analytics before the next one starts;
+# "pipelined" runs every analytic through its own generate -> execute -> plot -> narrate branch.
+REPORT_WORKFLOW_MODE = os.getenv("REPORT_WORKFLOW_MODE", "staged").strip().lower()
+
+# How often the progress stream checks for new job events, and how long it
+# may stay silent before sending a keep-alive comment.
+SSE_POLL_SECONDS = 0.5
+SSE_KEEPALIVE_SECONDS = 15
+
+# Import the workflow stack and compile the graphs in the background right after
+# startup, so the server accepts requests at once and the first report does not pay for it.
+WARM_START = os.getenv("WARM_START", "true").strip().lower() not in {"0", "false", "no"}
+
+# One loader for the app; the models it hands out share pooled clients and rate limits
+llm_loader = LLMLoader(google_api_key=os.getenv("GOOGLE_API_KEY"))
+
+def warm_start() -> None:
+    """Imports the heavy modules and compiles the workflows once, off the request path."""
+    try:
+        from app.core.workflow import build_report_workflow, build_chat_workflow
+
+        build_report_workflow(pipelined=REPORT_WORKFLOW_MODE == "pipelined")
+        build_chat_workflow()
+        llm_loader.load_google_model_flash(temperature=0)
+    except Exception as e:
+        print(f"Warm start failed: {e}")
+
+
+@app.on_event("startup")
+async def schedule_warm_start():
+    if WARM_START:
+        threading.Thread(target=warm_start, name="warm-start", daemon=True).start()
+
+# --- Session Storage ---
+# Metadata in SQLite (shared across workers), hot tables in a bounded in-memory LRU,
+# cold tables reloaded from the session's columnar files on demand.
+session_store = get_session_store()
+
+
+def get_session(session_id: str) -> dict | None:
+    """Returns the session for `session_id`, reloading its tables if they are not in memory."""
+    return session_store.get(session_id)
+
+
+def pair_upload_files(data_files: List[UploadFile], schema_files: List[UploadFile]) -> List[tuple]:
+    """
+    Pairs every uploaded data file with its schema file: the schema named
+    `<table>_schema.csv` if there is one, otherwise the schema at the same
+    position in the upload.
+
+    Returns:
+        list: (table name, data upload, schema name, schema upload) per table.
+    """
+    if len(data_files) != len(schema_files):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Upload one schema file per data file ({len(data_files)} data, {len(schema_files)} schema files)."
+        )
+
+    table_names = [ingested_file_name(one.filename, f"data_{i}.csv" if i else "data.csv")
+                   for i, one in enumerate(data_files)]
+    schema_names = [ingested_file_name(one.filename, f"schema_{i}.csv" if i else "schema.csv")
+                    for i, one in enumerate(schema_files)]
+    for kind, names in (("data", table_names), ("schema", schema_names)):
+        if len(set(names)) != len(names):
+            raise HTTPException(status_code=400, detail=f"The {kind} files must have distinct names.")
+
+    by_name = {name: i for i, name in enumerate(schema_names)}
+    named = {i: by_name[f"{name}_schema"] for i, name in enumerate(table_names) if f"{name}_schema" in by_name}
+    unnamed = iter(i for i in range(len(schema_files)) if i not in named.values())
+    order = [named[i] if i in named else next(unnamed) for i in range(len(data_files))]
+
+    return [
+        (table_names[i], data_files[i], schema_names[j], schema_files[j])
+        for i, j in enumerate(order)
+    ]
 
 
 @app.post("/session", response_model=SessionResponse)
-async def create_session(data_file: UploadFile = File(...), schema_file: UploadFile = File(...)):
+async def create_session(data_file: List[UploadFile] = File(...), schema_file: List[UploadFile] = File(...)):
+    """
+    Creates a session from one or more data files, each with its schema file
+    (repeat the `data_file` and `schema_file` fields to upload several tables).
+    The join keys between the tables are detected once, here.
+    """
+    uploads = pair_upload_files(data_file, schema_file)
+
     session_id = str(uuid.uuid4())
-    session_path = f"app/data_storage/{session_id}"
+    session_path = os.path.join(SESSIONS_ROOT, session_id)
     os.makedirs(session_path, exist_ok=True)
 
     data_path = os.path.join(session_path, "df")
@@ -42,27 +144,61 @@ async def create_session(data_file: UploadFile = File(...), schema_file: UploadF
     os.makedirs(schema_path, exist_ok=True)
 
     try:
-        data_filepath = os.path.join(data_path, data_file.filename or "data.csv")
-        with open(data_filepath, "wb") as buffer:
-            shutil.copyfileobj(data_file.file, buffer)
-
-        schema_filepath = os.path.join(schema_path, schema_file.filename or "schema.csv")
-        with open(schema_filepath, "wb") as buffer:
-            shutil.copyfileobj(schema_file.file, buffer)
-
-        input_files = [(data_file.filename or "data.csv").replace(".csv", "")]
-        schema_files = [(schema_file.filename or "schema.csv").replace(".csv", "")]
-
-        tables = load_data(input_files, schema_files, data_path, schema_path)
+        input_files, schema_files, ingest_stats = [], [], {}
+        for table_name, data_upload, schema_name, schema_upload in uploads:
+            # Parse the spooled uploads block by block into columnar files, off
+            # the event loop. The schema goes first so the data is typed while parsing.
+            schema_filepath = ingested_file_path(schema_path, schema_name)
+            await run_in_threadpool(ingest_csv_stream, schema_upload.file, schema_filepath)
+            schema = read_columnar(schema_filepath)
+
+            table_stats = await run_in_threadpool(
+                ingest_csv_stream,
+                data_upload.file,
+                ingested_file_path(data_path, table_name),
+                [
+                    schema_to_arrow_convert_options(schema),
+                    schema_to_arrow_convert_options(schema, parse_datetimes=False),
+                ]
+            )
+            print(f"Ingested {table_name}: {table_stats.to_dict()}")
+            input_files.append(table_name)
+            schema_files.append(schema_name)
+            ingest_stats[table_name] = table_stats.to_dict()
+
+        tables = load_data(input_files, schema_files, data_path, schema_path, data_type=SESSION_DATA_TYPE)
+        memory_before = table_memory_footprint(tables)
         processed_tables = preprocess_tables(tables)
-
-        SESSIONS[session_id] = {
-            "processed_tables": processed_tables,
-            "session_path": session_path,
-            "report_path": None,
-            "plots_path": os.path.join(session_path, "plots")
+        memory_stats = {
+            # Peak of the whole API process so far, not of this load
+            "process_peak_rss_bytes": peak_rss_bytes(),
+            "tables": {
+                name: {"parsed_bytes": memory_before[name], "processed_bytes": footprint}
+                for name, footprint in table_memory_footprint(processed_tables).items()
+            },
         }
-        os.makedirs(SESSIONS[session_id]["plots_path"], exist_ok=True)
+        print(f"Memory footprint: {memory_stats}")
+
+        # Persist the typed tables once; later loads memory-map them
+        columnar_path = os.path.join(session_path, COLUMNAR_DIR)
+        save_session_tables(processed_tables, columnar_path)
+
+        # Column statistics are computed once and reused by every prompt
+        data_profile = profile_tables(processed_tables)
+        save_profile(data_profile, session_path)
+        # ...and so are the join keys between the tables, with the sorted
+        # row order of every key column for the executors' keyed tables
+        join_keys = detect_join_keys(processed_tables) if JOIN_KEY_DETECTION_ENABLED else []
+        save_join_keys(join_keys, session_path)
+        save_key_indexes(processed_tables, join_keys, session_path)
+        print(f"Join keys: {join_keys}")
+        # ...and the compact schema context the prompts are built from
+        schema_context = build_schema_context(processed_tables, data_profile, join_keys)
+        save_schema_context(schema_context, session_path)
+        # ...and the column index chat and code generation select schema columns with
+        build_schema_index(schema_context, session_path)
+
+        session_store.create(session_id, session_path, processed_tables, data_profile, schema_context)
 
     except Exception as e:
         shutil.rmtree(session_path)
@@ -70,97 +206,325 @@ async def create_session(data_file: UploadFile = File(...), schema_file: UploadF
             status_code=500, detail=f"Failed to create session: {str(e)}"
         ) from e
 
-    return SessionResponse(session_id=session_id, message="Session created successfully.")
+    return SessionResponse(
+        session_id=session_id,
+        message="Session created successfully.",
+        # Keyed by table name when several tables were uploaded
+        ingest_stats=next(iter(ingest_stats.values())) if len(ingest_stats) == 1 else ingest_stats,
+        memory_stats=memory_stats,
+        join_keys=join_keys
+    )
+
+
+def run_report_job(job_id: str, session_id: str, use_cache: bool = True) -> str:
+    """
+    Runs the report workflow for one queued job on a report worker thread.
+    Node completions and the per-analytic events the nodes publish are
+    appended to the job's event log; cancellation is checked after every
+    workflow node. Sections whose inputs did not change since the session's
+    previous report are reused unless `use_cache` is False.
+
+    The job writes its plots and report images to its own folder, so other
+    jobs of the session cannot delete or overwrite them mid-render. Once the
+    report is written, its plots replace those in the session's `plots/`
+    folder and the job folder is removed.
+
+    Returns:
+        str: Path of the generated PDF.
+    """
+    from app.core.workflow import build_report_workflow
+
+    session_data = get_session(session_id)
+    if session_data is None:
+        raise ValueError("Session not found.")
+
+    llm = llm_loader.load_google_model_flash(temperature=0, use_cache=use_cache)
+    job_path = job_work_path(session_data["session_path"], job_id)
+
+    input_context = {
+        "llm_model": llm,
+        "processed_tables": session_data["processed_tables"],
+        "plots_path": session_data["plots_path"],
+        "job_path": job_path,
+        "data_profile": session_data.get("data_profile", {}),
+        "schema_context": session_data.get("schema_context", {}),
+        "reuse_sections": use_cache,
+        "pdf_path": None, # Will be populated by the workflow
+    }
+
+    # State
+    state = ReportState(input_context)
+    state = state.to_dict()
+
+    try:
+        # Build the workflow
+        graph = build_report_workflow(state, pipelined=REPORT_WORKFLOW_MODE == "pipelined")
+    except Exception as e:
+        print(f"Error building workflow: {e}")
+        raise RuntimeError(f"Failed to build workflow: {str(e)}") from e
+
+    # Run the workflow node by node so the job can report progress and be cancelled
+    try:
+        final_state = state
+        for mode, chunk in graph.stream(state, stream_mode=["updates", "values", "custom"]):
+            if mode == "values":
+                final_state = chunk
+                continue
+            if mode == "custom":
+                if chunk.get("event") == "section_completed" and chunk.get("plot_path"):
+                    plot_name = os.path.basename(chunk['plot_path'])
+                    chunk = {**chunk, "plot_url": f"/sessions/{session_id}/plots/{plot_name}?job_id={job_id}"}
+                report_jobs.add_event(job_id, {k: v for k, v in chunk.items() if k != "plot_path"})
+                continue
+            for node_name in chunk:
+                report_jobs.set_current_node(job_id, node_name)
+                report_jobs.add_event(job_id, {"event": "node_completed", "node": node_name})
+            report_jobs.check_cancelled(job_id)
+
+        # The final PDF path is returned by the workflow
+        final_report_path = final_state.get('pdf_path')
+        if not final_report_path or not os.path.exists(final_report_path):
+            raise RuntimeError("Report generation failed to produce a file.")
+
+        promote_files(os.path.join(job_path, "plots"), session_data["plots_path"])
+    finally:
+        shutil.rmtree(job_path, ignore_errors=True)
+
+    session_store.set_report_path(session_id, final_report_path)
+    return final_report_path
+
+
+report_jobs = ReportJobQueue(run_report_job)
+
 
+def _job_response(job: dict) -> ReportJobResponse:
+    job = dict(job)
+    if job["status"] == SUCCEEDED:
+        job["report_path"] = f"/report/download/{job['session_id']}"
+    return ReportJobResponse(**{name: job.get(name) for name in ReportJobResponse.model_fields})
 
-@app.post("/report", response_model=ReportRequest)
-async def generate_report(session_id: str):
-    if session_id not in SESSIONS:
+
+@app.post("/report", response_model=ReportJobResponse, status_code=202)
+async def generate_report(session_id: str, use_cache: bool = True):
+    """Queues a report job and returns its id; poll `GET /report/jobs/{job_id}` for its status."""
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None:
         raise HTTPException(status_code=404, detail="Session not found.")
 
     try:
-        session_data = SESSIONS[session_id]
+        job = await run_in_threadpool(report_jobs.submit, session_id, use_cache=use_cache)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e)) from e
+
+    return _job_response(job)
+
+
+@app.get("/report/jobs/{job_id}", response_model=ReportJobResponse)
+async def report_job_status(job_id: str):
+    job = await run_in_threadpool(report_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return _job_response(job)
+
+
+@app.delete("/report/jobs/{job_id}", response_model=ReportJobResponse)
+async def cancel_report_job(job_id: str):
+    job = await run_in_threadpool(report_jobs.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return _job_response(job)
+
+
+@app.get("/report/jobs/{job_id}/events")
+async def report_job_events(job_id: str, last_event_id: Optional[int] = Header(default=None)):
+    """
+    Streams the job's progress events as Server-Sent Events until the job
+    finishes. Reconnecting clients resume after the `Last-Event-ID` they sent.
+    """
+    job = await run_in_threadpool(report_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        last_seq = last_event_id or 0
+        idle_polls = 0
+        while True:
+            events = await run_in_threadpool(report_jobs.events, job_id, last_seq)
+            for event in events:
+                last_seq = event["seq"]
+                yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            if any(event["event"] == "status" and event["status"] in FINISHED_STATUSES for event in events):
+                return
+
+            idle_polls = 0 if events else idle_polls + 1
+            if idle_polls and idle_polls % int(SSE_KEEPALIVE_SECONDS / SSE_POLL_SECONDS) == 0:
+                job = await run_in_threadpool(report_jobs.get, job_id)
+                if job is None or job["status"] in FINISHED_STATUSES:
+                    return
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(SSE_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/sessions/{session_id}/analytics-plan", response_model=AnalyticsPlanResponse)
+async def get_analytics_plan(session_id: str):
+    """Returns the analytics plan of the session's latest report, or the plan set through PUT."""
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
 
-        loader = LLMLoader(google_api_key=os.getenv("GOOGLE_API_KEY"))
-        llm = loader.load_google_model_flash(temperature=0)
+    saved_plan = load_analytics_plan(session_data["session_path"])
+    if saved_plan is None:
+        raise HTTPException(status_code=404, detail="No analytics plan yet; generate a report first.")
+    return AnalyticsPlanResponse(session_id=session_id, edited=saved_plan["edited"], analytics_plan=saved_plan["plan"])
 
-        input_context = {
-            "llm_model": llm,
-            "processed_tables": session_data["processed_tables"],
-            "plots_path": session_data["plots_path"],
-            "pdf_path": None, # Will be populated by the workflow
-        }
 
-        # State
-        state = ReportState(input_context)
-        state = state.to_dict()
+@app.put("/sessions/{session_id}/analytics-plan", response_model=AnalyticsPlanResponse)
+async def put_analytics_plan(session_id: str, analytics_plan: AnalyticsPlan):
+    """
+    Replaces the session's analytics plan. Later reports use this plan instead
+    of generating one, and only recompute the analytics that changed.
+    """
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
 
+    unknown = sorted({one.table_name for one in analytics_plan.analytics_suggested} - set(session_data["table_names"]))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables in the analytics plan: {', '.join(unknown)}.")
 
-        try:
-            # Build the workflow
-            graph = build_report_workflow(state)
-        except Exception as e:
-            print(f"Error building workflow: {e}")
-            raise HTTPException(
-                status_code=500, detail=f"Failed to build workflow: {str(e)}"
-            ) from e
+    save_analytics_plan(session_data["session_path"], analytics_plan.model_dump(), edited=True)
+    return AnalyticsPlanResponse(session_id=session_id, edited=True, analytics_plan=analytics_plan)
 
 
-        try:
-            # Run the workflow
-            final_state = graph.invoke(state)
-        except Exception as e:
-            print(f"Error running workflow: {e}")
-            raise HTTPException(
-                status_code=500, detail=f"Failed at Graph invoke: {str(e)}"
-            ) from e
+@app.delete("/sessions/{session_id}/analytics-plan", status_code=204)
+async def delete_session_analytics_plan(session_id: str):
+    """Drops the session's analytics plan; the next report generates a new one."""
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    delete_analytics_plan(session_data["session_path"])
+
+
+@app.get("/sessions/{session_id}/plots/{plot_name}")
+async def download_plot(session_id: str, plot_name: str, job_id: Optional[str] = None):
+    """
+    Serves a plot of a report section as soon as the section is completed:
+    from the folder of the running `job_id`, or once that job is finished,
+    the session's latest plots.
+    """
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
 
-        # The final PDF path is returned by the workflow
-        final_report_path = final_state.get('pdf_path')
-        if not final_report_path or not os.path.exists(final_report_path):
-            raise HTTPException(status_code=500, detail="Report generation failed to produce a file.")
+    plot_name = os.path.basename(plot_name)
+    plot_path = os.path.join(session_data["plots_path"], plot_name)
+    if job_id:
+        job_plot_path = os.path.join(job_work_path(session_data["session_path"], job_id), "plots", plot_name)
+        plot_path = job_plot_path if os.path.exists(job_plot_path) else plot_path
+    if not plot_name.endswith(".png") or not os.path.exists(plot_path):
+        raise HTTPException(status_code=404, detail="Plot not found.")
 
-        SESSIONS[session_id]["report_path"] = final_report_path
+    return FileResponse(path=plot_path, media_type="image/png")
+
+
+def report_validators(stat_result: os.stat_result) -> dict:
+    """ETag and Last-Modified headers of a report file, derived from its modification time and size."""
+    return {
+        "ETag": f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"',
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        # Clients may keep the report but must revalidate it before reuse
+        "Cache-Control": "private, no-cache",
+    }
 
-        return ReportRequest(
-            session_id=session_id,
-            message="Report generated successfully.",
-            report_path=f"/report/download/{session_id}"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to generate report: {str(e)}"
-        ) from e
 
+def is_not_modified(request: Request, validators: dict, stat_result: os.stat_result) -> bool:
+    """Evaluates If-None-Match (preferred) or If-Modified-Since against the report's validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or validators["ETag"] in tags
 
-@app.get("/report/download/{session_id}")
-async def download_report(session_id: str):
-    if session_id not in SESSIONS or not SESSIONS[session_id].get("report_path"):
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@app.api_route("/report/download/{session_id}", methods=["GET", "HEAD"])
+async def download_report(session_id: str, request: Request):
+    """
+    Serves the session's PDF report. Responses carry an ETag and
+    Last-Modified; conditional requests for an unchanged report get `304`,
+    and `Range` requests get the requested bytes (`206`).
+    """
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None or not session_data.get("report_path"):
         raise HTTPException(status_code=404, detail="Report not found.")
     
-    report_path = SESSIONS[session_id]["report_path"]
-    return FileResponse(path=report_path, media_type='application/pdf', filename="financial_analysis_report.pdf")
+    report_path = session_data["report_path"]
+    try:
+        stat_result = await run_in_threadpool(os.stat, report_path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail="Report not found.") from e
+
+    validators = report_validators(stat_result)
+    if is_not_modified(request, validators, stat_result):
+        return Response(status_code=304, headers=validators)
+
+    return FileResponse(
+        path=report_path, media_type='application/pdf', filename="financial_analysis_report.pdf",
+        headers=validators
+    )
+
+
+@app.delete("/sessions/{session_id}/chat-memory", status_code=204)
+async def delete_session_chat_memory(session_id: str):
+    """Forgets the session's conversation; the next chat message starts a new one."""
+    session_data = await run_in_threadpool(get_session, session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    await run_in_threadpool(clear_chat_memory, session_data["session_path"])
+
+
+def run_chat_turn(graph, state):
+    """
+    Runs one chat turn against the session's stored conversation memory. Turns
+    of the same session run one at a time, so each sees the previous one.
+    """
+    with chat_session_lock(state["session_path"]):
+        memory = load_chat_memory(state["session_path"])
+        state["chat_summary"] = memory["summary"]
+        state["chat_history"] = memory["turns"]
+        return graph.invoke(state)
 
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_agent(request: ChatRequest):
-    if request.session_id not in SESSIONS:
+    session_data = await run_in_threadpool(get_session, request.session_id)
+    if session_data is None:
         raise HTTPException(status_code=404, detail="Session not found.")
 
-    # For now, we'll just echo the message back.
-    # Later, you can add your chat logic here.
-    response_message = f"Received your message: '{request.message}'"
+    response_message = ""
 
     try:
-        session_data = SESSIONS[request.session_id]
-
-        loader = LLMLoader(google_api_key=os.getenv("GOOGLE_API_KEY"))
-        llm = loader.load_google_model_flash(temperature=0)
+        llm = llm_loader.load_google_model_flash(temperature=0, use_cache=request.use_cache)
 
         input_context = {
             "llm_model": llm,
-            "chat_history": session_data.get("chat_history", []),
-            "user_message": session_data.get("user_message", request.message),
+            "processed_tables": session_data["processed_tables"],
+            "session_path": session_data["session_path"],
+            "data_profile": session_data["data_profile"],
+            "schema_context": session_data["schema_context"],
+            "user_message": request.message,
             "agent_response": None, # Will be populated by the workflow
         }
 
@@ -171,6 +535,7 @@ async def chat_with_agent(request: ChatRequest):
 
         try:
             # Build the workflow
+            from app.core.workflow import build_chat_workflow
             graph = build_chat_workflow(state)
         except Exception as e:
             print(f"Error building chat workflow: {e}")
@@ -182,8 +547,8 @@ async def chat_with_agent(request: ChatRequest):
 
         try:
             # Run the workflow
-            updated_chat_state = graph.invoke(state)
-            response_message = updated_chat_state.get("agent_response", response_message)
+            updated_chat_state = await run_in_threadpool(run_chat_turn, graph, state)
+            response_message = updated_chat_state.get("agent_response") or response_message
             
         except Exception as e:
             print(f"Error running chat workflow: {e}")
@@ -192,9 +557,45 @@ async def chat_with_agent(request: ChatRequest):
                 detail=f"Failed at Chat Graph invoke: {str(e)}",
             ) from e
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Failed to generate report: {str(e)}"
+            status_code=500, detail=f"Failed to answer the chat message: {str(e)}"
         ) from e
 
-    return ChatResponse(response=response_message)
\ No newline at end of file
+    return ChatResponse(response=response_message)
+
+
+@app.get("/llm-cache/stats")
+async def llm_cache_stats():
+    from app.core.utils.llm_cache import get_llm_cache
+
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/llm-pool/stats")
+async def llm_pool_statistics():
+    from app.core.utils.llm_pool import llm_pool_stats
+
+    return llm_pool_stats()
+
+
+@app.get("/code-validation/stats")
+async def code_validation_statistics():
+    from app.core.utils.code_validation import code_validation_stats
+
+    return code_validation_stats()
+
+
+@app.get("/sessions/stats")
+async def session_store_stats():
+    return await run_in_threadpool(session_store.stats)
+
+
+@app.get("/report/queue")
+async def report_queue_stats():
+    return report_jobs.stats()
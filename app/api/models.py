@@ -1,18 +1,46 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class SessionResponse(BaseModel):
     session_id: str
     message: str
+    ingest_stats: Optional[Dict[str, Any]] = None
+    memory_stats: Optional[Dict[str, Any]] = None
+    join_keys: Optional[List[Dict[str, Any]]] = None
 
-class ReportRequest(BaseModel):
+class ReportJobResponse(BaseModel):
+    job_id: str
     session_id: str
-    message: str
+    status: str
+    queue_position: Optional[int] = None
+    current_node: Optional[str] = None
+    cancel_requested: bool = False
+    error: Optional[str] = None
     report_path: Optional[str] = None
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class PlannedAnalytic(BaseModel):
+    analysis_name: Any
+    table_name: str
+    description: Any
+    analysis_type: Any = ["pandas_query"]
+    column_names: List[str] = []
+
+class AnalyticsPlan(BaseModel):
+    chain_of_thought: str = ""
+    analytics_suggested: List[PlannedAnalytic]
+
+class AnalyticsPlanResponse(BaseModel):
+    session_id: str
+    edited: bool
+    analytics_plan: AnalyticsPlan
 
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    use_cache: bool = True
 
 class ChatResponse(BaseModel):
     response: str
\ No newline at end of file
@@ -0,0 +1,106 @@
+from ..state import ReportState, report_work_path
+from ..utils.code_executor import get_code_executor
+from ..utils.code_validation import get_code_validator
+from ..utils.progress import emit_progress
+from ..utils.section_store import get_section_store, section_content_key
+from .plan_analytics import build_code_generation_chain, generate_analytic_code, plan_analytic_code
+from .code_execution_agent import (
+    build_correction_chain, execute_analytic, emit_analytic_executed, reuse_analytic_result, save_analytic_result
+)
+from .content_planning_agent import (
+    build_plotting_chain, build_interpretation_chain, plan_section_content, emit_section_completed
+)
+import os
+
+def analytic_pipeline_node(payload: dict) -> dict:
+    """
+    Runs one suggested analytic end to end: generate code -> execute (with
+    correction) -> plot -> narrate.
+
+    This node is fanned out once per analytic with LangGraph `Send`, so each
+    section proceeds as soon as its own inputs are ready instead of waiting
+    for every other analytic at each stage. Stages whose inputs did not
+    change since an earlier report of the session reuse their stored artifacts.
+
+    Args:
+        payload (dict): The branch input built by `dispatch_analytics` with keys
+            `idx`, `analytic`, `schema_context`, `llm_model`,
+            `processed_tables`, `plots_path`, `job_path`, `reuse_sections` and `section_key`.
+
+    Returns:
+        dict: A state update holding this analytic's section.
+    """
+    idx = payload['idx']
+    one_analytic = payload['analytic']
+    llm_model = payload['llm_model']
+
+    print(f"\n>>> Pipeline started for analytic #{idx}: {one_analytic['analysis_name']}")
+
+    session_path = os.path.dirname(payload['plots_path'])
+    section_store = get_section_store(session_path, payload.get('reuse_sections', True))
+    outcome = reuse_analytic_result(section_store, payload.get('section_key'))
+
+    if outcome is not None:
+        analytic_code = {"analysis_name": one_analytic['analysis_name'], "code": outcome['code'],
+                         "from_cache": False, "reused": True}
+        emit_progress("code_generated", idx=idx, analysis_name=one_analytic['analysis_name'],
+                      from_cache=False, reused=True)
+    else:
+        code_generation_chain = build_code_generation_chain(llm_model)
+
+        analytic_code = plan_analytic_code(
+            code_generation_chain, payload['schema_context'], one_analytic, payload['processed_tables']
+        )
+        emit_progress("code_generated", idx=idx, analysis_name=one_analytic['analysis_name'],
+                      from_cache=analytic_code.get('from_cache', False), reused=False)
+
+        executor = get_code_executor(payload['processed_tables'], session_path)
+        outcome = execute_analytic(
+            build_correction_chain(llm_model), analytic_code, one_analytic['table_name'], executor,
+            regenerate_code=lambda: generate_analytic_code(
+                code_generation_chain, payload['schema_context'], one_analytic
+            )['code'],
+            validator=get_code_validator(payload['processed_tables'], executor)
+        )
+        analytic_code['code'] = outcome['code']
+        save_analytic_result(section_store, payload.get('section_key'), outcome)
+    emit_analytic_executed(idx, outcome)
+
+    content, reused = plan_section_content(
+        build_plotting_chain(llm_model),
+        build_interpretation_chain(llm_model),
+        outcome['query_result'],
+        os.path.join(report_work_path(payload), "plots", f"plot_{idx}.png"),
+        section_store,
+        section_content_key(outcome['query_result'], llm_model) if section_store is not None else None
+    )
+    emit_section_completed(idx, content, reused)
+
+    print(f">>> Pipeline finished for analytic #{idx}: {one_analytic['analysis_name']}")
+
+    return {
+        "sections": [{
+            "idx": idx,
+            "analytics_code": analytic_code,
+            "query_result": outcome['query_result'],
+            "report_content": content
+        }]
+    }
+
+def assemble_sections_node(state: ReportState) -> dict:
+    """
+    Joins the per-analytic branches back into the staged state layout
+    (`analytics_code`, `query_results`, `report_content`) in plan order, so
+    `report_generation_node` works unchanged.
+    """
+    print("\n==========================================")
+    print("I am in the assemble sections node ... ")
+    print("============================================")
+
+    sections = sorted(state.get('sections', []), key=lambda one: one['idx'])
+
+    return {
+        "analytics_code": [one['analytics_code'] for one in sections],
+        "query_results": [one['query_result'] for one in sections],
+        "report_content": [one['report_content'] for one in sections],
+    }
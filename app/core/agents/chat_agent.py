@@ -0,0 +1,143 @@
+from ..utils.chat_memory import (
+    CHAT_SUMMARY_MAX_WORDS, append_turn, render_conversation, render_turns, save_chat_memory, turns_to_summarize
+)
+from ..utils.code_executor import CODE_LANGUAGE, get_code_executor
+from ..utils.code_validation import get_code_validator
+from ..utils.concurrency import invoke_with_limit
+from ..utils.prompts import load_prompt
+from .code_execution_agent import build_correction_chain, execute_analytic
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.utils.json import parse_json_markdown
+import pandas as pd
+import os
+
+# Rows of a DataFrame result shown to the LLM when it phrases the answer
+CHAT_RESULT_MAX_ROWS = max(1, int(os.getenv("CHAT_RESULT_MAX_ROWS", "20")))
+
+_CHAT_QUERY_PROMPTS = {
+    "python": "chat_query_prompt_template.txt",
+    "sql": "chat_sql_query_prompt_template.txt",
+}
+
+def format_chat_result(result) -> str:
+    """Renders a query result for the answer prompt, clipping large tables."""
+    if isinstance(result, pd.Series):
+        result = result.to_frame()
+    if isinstance(result, pd.DataFrame):
+        shown = result.head(CHAT_RESULT_MAX_ROWS).to_string()
+        if len(result) > CHAT_RESULT_MAX_ROWS:
+            shown += f"\n... ({len(result)} rows in total, the first {CHAT_RESULT_MAX_ROWS} shown)"
+        return shown
+    return str(result)
+
+def chat_query_node(state: dict) -> dict:
+    """
+    Writes the code (or SQL, with the duckdb executor) answering the latest
+    question against the session's tables and runs it on the configured
+    executor backend, correcting it on failure like a report analytic.
+    """
+    print("\n==========================================")
+    print(">>> In Chat Query Node")
+    print("============================================")
+
+    llm_model = state['llm_model']
+    processed_tables = state['processed_tables']
+
+    query_prompt = PromptTemplate(
+        input_variables=["input_table_schema", "conversation", "question"],
+        template=load_prompt(_CHAT_QUERY_PROMPTS[CODE_LANGUAGE])
+    )
+    query_chain = query_prompt | llm_model | StrOutputParser()
+    response = invoke_with_limit(query_chain, {
+        "input_table_schema": state['input_table_schema'],
+        "conversation": render_conversation({"summary": state['chat_summary'], "turns": state['chat_history']}),
+        "question": state['user_message'],
+    })
+
+    try:
+        query = parse_json_markdown(response)
+    except Exception:
+        print("Chat query response is not valid JSON; answering without the data.")
+        query = {}
+    code = query.get('code') if isinstance(query, dict) else None
+
+    state['chat_code'] = None
+    state['chat_result'] = None
+    if not code:
+        print("The question does not need the data.")
+        return state
+
+    table_name = query.get('table_name')
+    if table_name not in processed_tables and len(processed_tables) == 1:
+        table_name = next(iter(processed_tables))
+    if table_name not in processed_tables and CODE_LANGUAGE == "python":
+        state['chat_result'] = f"Unknown table {table_name!r}; the tables are: {', '.join(processed_tables)}."
+        return state
+
+    executor = get_code_executor(processed_tables, state['session_path'])
+    outcome = execute_analytic(
+        build_correction_chain(llm_model), {"analysis_name": state['user_message'][:80], "code": code},
+        table_name, executor, validator=get_code_validator(processed_tables, executor)
+    )
+    state['chat_code'] = outcome['code']
+    state['chat_result'] = format_chat_result(outcome['query_result']['result'])
+    return state
+
+def chat_answer_node(state: dict) -> dict:
+    """Phrases the answer to the latest question from the query result and the conversation."""
+    print("\n==========================================")
+    print(">>> In Chat Answer Node")
+    print("============================================")
+
+    answer_prompt = PromptTemplate(
+        input_variables=["conversation", "question", "analysis_result"],
+        template=load_prompt("chat_answer_prompt_template.txt")
+    )
+    answer_chain = answer_prompt | state['llm_model'] | StrOutputParser()
+    state['agent_response'] = invoke_with_limit(answer_chain, {
+        "conversation": render_conversation({"summary": state['chat_summary'], "turns": state['chat_history']}),
+        "question": state['user_message'],
+        "analysis_result": state['chat_result'] if state.get('chat_result') is not None
+        else "No data was queried for this question.",
+    }).strip()
+    return state
+
+def chat_memory_node(state: dict) -> dict:
+    """
+    Appends the exchange to the session's chat memory and, once enough turns
+    have piled up past the recent window, rolls the oldest into the running
+    summary, so the conversation block of the prompts stays the same size.
+    """
+    print("\n==========================================")
+    print(">>> In Chat Memory Node")
+    print("============================================")
+
+    memory = append_turn(
+        {"summary": state['chat_summary'], "turns": state['chat_history']},
+        state['user_message'], state['agent_response']
+    )
+
+    overflow = turns_to_summarize(memory)
+    if overflow:
+        summary_prompt = PromptTemplate(
+            input_variables=["summary", "turns", "max_words"],
+            template=load_prompt("chat_summary_prompt_template.txt")
+        )
+        summary_chain = summary_prompt | state['llm_model'] | StrOutputParser()
+        try:
+            summary = invoke_with_limit(summary_chain, {
+                "summary": memory['summary'] or "None yet.",
+                "turns": render_turns(memory['turns'][:overflow]),
+                "max_words": CHAT_SUMMARY_MAX_WORDS,
+            }).strip()
+            memory = {"summary": summary, "turns": memory['turns'][overflow:]}
+            print(f"Rolled {overflow // 2} exchanges into the chat summary.")
+        except Exception as e:
+            # Keep the turns; they are rolled up on the next message
+            print(f"Could not update the chat summary: {e}")
+
+    save_chat_memory(state['session_path'], memory)
+    state['chat_summary'] = memory['summary']
+    state['chat_history'] = memory['turns']
+    return state
@@ -1,27 +1,196 @@
 from ..state import ReportState
-from langchain.prompts import PromptTemplate
+from ..utils.concurrency import invoke_with_limit, run_concurrently
+from ..utils.code_cache import get_code_cache
+from ..utils.code_executor import CODE_LANGUAGE, get_code_executor
+from ..utils.code_validation import (
+    CodeDiagnostic, error_type, format_diagnostics, get_code_validator, record_analytic, trim_traceback
+)
+from ..utils.schema_context import get_schema_context
+from ..utils.section_store import get_section_store
+from ..utils.progress import emit_progress
+from ..utils.prompts import load_prompt
+from .plan_analytics import build_code_generation_chain, generate_analytic_code
+from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+import os
 import re
 
-with open("prompts/code_correction_prompt_template.txt", "r") as f:
-        code_correction_prompt_template = f.read()
+MAX_RETRIES = 4
+
+_CODE_CORRECTION_PROMPTS = {
+    "python": "code_correction_prompt_template.txt",
+    "sql": "sql_correction_prompt_template.txt",
+}
 
 def clean_python_code(code_string: str) -> str:
     """
     Cleans a string to ensure it's valid Python code by removing markdown fences
     and other non-code text.
     """
-    # Remove markdown code blocks
-    code_string = re.sub(r'```python\n', '', code_string)
+    # Remove markdown code blocks (```python, or ```sql for the duckdb executor)
+    code_string = re.sub(r'```(?:python|sql)?\n', '', code_string)
     code_string = re.sub(r'```', '', code_string)
     
     # Strip leading/trailing whitespace
     return code_string.strip()
 
+def build_correction_chain(llm_model):
+    """
+    Builds the prompt | llm | parser chain used to repair failing code.
+    """
+    code_correction_prompt = PromptTemplate(
+        input_variables=["code", "error", "traceback"],
+        template=load_prompt(_CODE_CORRECTION_PROMPTS[CODE_LANGUAGE])
+    )
+
+    return code_correction_prompt | llm_model | StrOutputParser()
+
+def execute_analytic(correction_chain, analytic: dict, table_name: str, executor,
+                     max_retries: int = MAX_RETRIES, regenerate_code=None, validator=None) -> dict:
+    """
+    Executes the code of a single analytic, asking the LLM to correct it on failure.
+
+    Each attempt is first checked by `validator` (syntax, signature, column
+    names and a trial run on a few rows); code it rejects goes straight to
+    correction without a full run. The correction prompt receives the
+    diagnostics and the traceback of the failure.
+
+    Code served from the known-good code cache is tried first; if it fails,
+    fresh code from `regenerate_code` replaces it before any correction round
+    trip. Code that executes successfully is written back to the cache.
+
+    Args:
+        correction_chain: The chain returned by `build_correction_chain`.
+        analytic (dict): An `analytics_code` entry ({"analysis_name", "code"}).
+        table_name (str): The table the analytic runs against.
+        executor: The code executor backend returned by `get_code_executor`.
+        max_retries (int): Total number of execution attempts.
+        regenerate_code (Callable, optional): Returns freshly generated code for
+            the analytic; used when cached code no longer works.
+        validator (CodeValidator, optional): Returned by `get_code_validator`.
+
+    Returns:
+        dict: {"query_result": {...}, "code": <last code executed>,
+        "round_trips": <LLM calls made to fix the code>, "ok": <whether it ran>}
+    """
+    # Clean the initial code before the first attempt
+    code_to_execute = clean_python_code(analytic['code'])
+    analysis_name = analytic['analysis_name']
+    from_cache = analytic.get('from_cache', False)
+    round_trips = 0
+    executions = 0
+
+    for attempt in range(max_retries):
+        print(f"Executing code for '{analysis_name}' (Attempt {attempt + 1}/{max_retries})")
+
+        diagnostics, error_traceback = validator.validate(code_to_execute, table_name) if validator else ([], None)
+
+        if diagnostics:
+            print(f"Code for '{analysis_name}' failed validation")
+        else:
+            # Run the function definition and call it against the table
+            outcome = executor.run(code_to_execute, table_name)
+            executions += 1
+
+            if outcome.error is None:
+                print(f"Successfully executed code for: {analysis_name}")
+
+                code_cache = get_code_cache()
+                if code_cache is not None and analytic.get('cache_key') and not from_cache:
+                    code_cache.put(analytic['cache_key'], code_to_execute, analysis_name)
+
+                record_analytic(round_trips=round_trips, executions=executions)
+                return {
+                    "query_result": {"analysis_name": analysis_name, "result": outcome.result},
+                    "code": code_to_execute,
+                    "round_trips": round_trips,
+                    "ok": True
+                }
+
+            diagnostics = [CodeDiagnostic("execution", f"{error_type(outcome.traceback) or 'Error'}: {outcome.error}")]
+            error_traceback = outcome.traceback
+
+        error_message = format_diagnostics(diagnostics)
+        print(f"Error executing code for {analysis_name}:\n{error_message}")
+
+        if from_cache and regenerate_code is not None:
+            # The cached code no longer fits this data; start over from fresh code
+            print("Cached code failed, generating fresh code...")
+            code_to_execute = clean_python_code(regenerate_code())
+            from_cache = False
+            round_trips += 1
+        elif attempt < max_retries - 1:
+            print("Attempting to correct the code...")
+            corrected_code_raw = invoke_with_limit(correction_chain, {
+                "code": code_to_execute,
+                "error": error_message,
+                "traceback": trim_traceback(error_traceback)
+            })
+            round_trips += 1
+            # Clean the corrected code before the next attempt
+            code_to_execute = clean_python_code(corrected_code_raw)
+            print("Corrected Code:")
+            print(code_to_execute)
+        else:
+            print(f"All {max_retries} attempts failed for {analysis_name}.")
+
+    record_analytic(round_trips=round_trips, executions=executions, failed_analytics=1)
+    return {
+        "query_result": {
+            "analysis_name": analysis_name,
+            "result": f"Error after {max_retries} attempts: {error_message}"
+        },
+        "code": code_to_execute,
+        "round_trips": round_trips,
+        "ok": False
+    }
+
+def reuse_analytic_result(section_store, section_key: str):
+    """
+    Returns the stored outcome of an analytic whose inputs did not change
+    since an earlier report, in the shape `execute_analytic` returns, or None.
+    """
+    stored = section_store.get(section_key) if section_store is not None and section_key else None
+    if stored is None:
+        return None
+
+    print(f"Reusing the stored code and result of: {stored['analysis_name']}")
+    return {
+        "query_result": {"analysis_name": stored['analysis_name'], "result": stored['result']},
+        "code": stored['code'],
+        "round_trips": 0,
+        "ok": True,
+        "reused": True
+    }
+
+def save_analytic_result(section_store, section_key: str, outcome: dict) -> None:
+    """Stores the code and result of an analytic that ran successfully under its section key."""
+    if section_store is None or not section_key or not outcome['ok'] or outcome.get('reused'):
+        return
+    section_store.put(section_key, {
+        "analysis_name": outcome['query_result']['analysis_name'],
+        "code": outcome['code'],
+        "result": outcome['query_result']['result'],
+    })
+
+def emit_analytic_executed(idx: int, outcome: dict) -> None:
+    """Publishes an "analytic_executed" progress event for one analytic."""
+    emit_progress(
+        "analytic_executed",
+        idx=idx,
+        analysis_name=outcome['query_result']['analysis_name'],
+        ok=outcome['ok'],
+        round_trips=outcome.get('round_trips', 0),
+        reused=outcome.get('reused', False),
+    )
+
 def code_execution_node(state: ReportState) -> dict:
     """
     Executes the generated python code for each analytic.
     If an error occurs, it attempts to correct the code and rerun it.
+    Analytics are executed (and corrected) concurrently on the configured executor
+    backend; results keep the plan order. Analytics whose inputs did not change
+    since an earlier report of the session reuse their stored result.
     """
     print("\n==========================================")
     print("I am in the code execution node ... ")
@@ -30,90 +199,44 @@ def code_execution_node(state: ReportState) -> dict:
     llm_model = state['llm_model']
     analytics_code = state['analytics_code']
     processed_tables = state['processed_tables']
-    query_results = []
-    
-    # # Prompt template for code correction
-    # code_correction_prompt_template = """
-    # You are an expert python programmer. The following python code, designed for data analysis with pandas, resulted in an error.
-    
-    # Original Code:
-    # ```python
-    # {code}
-    # ```
-    
-    # Error Message:
-    # {error}
-    
-    # Please correct the code to fix the error. The corrected code should be a single Python function.
-    # - The function must be named `analyze_data`.
-    # - It must take a pandas DataFrame `df` as input.
-    # - It should return the result of the analysis (e.g., a string, a number, a DataFrame, or a plot file path).
-    # - If you create a plot, save it to a file (e.g., 'plot.png') and return the filename. Use matplotlib for plotting.
+    analytics_suggested = state['analytics_plan']['analytics_suggested']
     
-    # Provide only the corrected Python code, without any explanations or markdown formatting.
-    # """
-    
-    code_correction_prompt = PromptTemplate(
-        input_variables=["code", "error"],
-        template=code_correction_prompt_template
-    )
-    
-    correction_chain = code_correction_prompt | llm_model | StrOutputParser()
-    
-    max_retries = 4
-    for idx, analytic in enumerate(analytics_code):
-        # Clean the initial code before the first attempt
-        code_to_execute = clean_python_code(analytic['code'])
-        analysis_name = analytic['analysis_name']
-        
-        for attempt in range(max_retries):
-            print(f"Executing code for '{analysis_name}' (Attempt {attempt + 1}/{max_retries})")
-
-            try:
-                # Get the dataframe for the analysis
-                # Assuming the table name is consistent across analytics for now
-                table_name = state['analytics_plan']['analytics_suggested'][idx]['table_name']
-                df = processed_tables[table_name].df.copy()
-
-                # Prepare a dictionary for the execution context
-                local_scope = {'df': df}
-
-                # Execute the function definition
-                exec(code_to_execute, globals(), local_scope)
-
-                # Call the function
-                result = local_scope['analyze_data'](df)
-                
-                query_results.append({
-                    "analysis_name": analysis_name,
-                    "result": result
-                })
-                print(f"Successfully executed code for: {analysis_name}")
-                break # Exit retry loop on success
-
-            except Exception as e:
-                error_message = str(e)
-                print(f"Error executing code for {analysis_name}: {error_message}")
-                
-                if attempt < max_retries - 1:
-                    print("Attempting to correct the code...")
-                    corrected_code_raw = correction_chain.invoke({
-                        "code": code_to_execute,
-                        "error": error_message
-                    })
-                    # Clean the corrected code before the next attempt
-                    code_to_execute = clean_python_code(corrected_code_raw)
-                    # Update the code in the state for the next attempt
-                    state['analytics_code'][idx]['code'] = code_to_execute
-                    print("Corrected Code:")
-                    print(code_to_execute)
-                else:
-                    print(f"All {max_retries} attempts failed for {analysis_name}.")
-                    query_results.append({
-                        "analysis_name": analysis_name,
-                        "result": f"Error after {max_retries} attempts: {error_message}"
-                    })
+    correction_chain = build_correction_chain(llm_model)
+    code_generation_chain = build_code_generation_chain(llm_model)
+    schema_context = get_schema_context(state)
+    executor = get_code_executor(processed_tables, os.path.dirname(state['plots_path']))
+    validator = get_code_validator(processed_tables, executor)
+    section_store = get_section_store(os.path.dirname(state['plots_path']), state.get('reuse_sections', True))
+
+    def run_one(idx):
+        section_key = analytics_code[idx].get('section_key')
+        outcome = reuse_analytic_result(section_store, section_key) if analytics_code[idx].get('reused') else None
+
+        if outcome is None:
+            # Assuming the table name is consistent across analytics for now
+            table_name = analytics_suggested[idx]['table_name']
+            outcome = execute_analytic(
+                correction_chain, analytics_code[idx], table_name, executor,
+                regenerate_code=lambda: generate_analytic_code(
+                    code_generation_chain, schema_context, analytics_suggested[idx]
+                )['code'],
+                validator=validator
+            )
+            save_analytic_result(section_store, section_key, outcome)
+        emit_analytic_executed(idx, outcome)
+        return outcome
+
+    outcomes = run_concurrently(run_one, range(len(analytics_code)))
+
+    query_results = []
+    for idx, outcome in enumerate(outcomes):
+        # Keep the (possibly corrected) code in the state
+        state['analytics_code'][idx]['code'] = outcome['code']
+        query_results.append(outcome['query_result'])
 
     state['query_results'] = query_results
 
+    round_trips = [outcome['round_trips'] for outcome in outcomes]
+    print(f"Correction round trips: {sum(round_trips)} for {len(outcomes)} analytics (per analytic: {round_trips})")
+
     return state
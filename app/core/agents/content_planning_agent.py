@@ -1,18 +1,16 @@
-from ..state import ReportState
-from langchain.prompts import PromptTemplate
+from ..state import ReportState, report_work_path
+from ..utils.concurrency import invoke_with_limit, run_concurrently
+from ..utils.profile_data import profile_column, format_column_profile
+from ..utils.plot_renderer import execute_plot_code
+from ..utils.section_store import get_section_store, section_content_key
+from ..utils.progress import emit_progress
+from ..utils.prompts import load_prompt
+from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
 import re
 
-with open("prompts/plotting_prompt_template.txt", "r") as f:
-        plotting_prompt_template = f.read()
-        
-with open("prompts/interpretation_prompt_template.txt", "r") as f:
-        interpretation_prompt_template = f.read()
-        
-
 def clean_python_code(code_string: str) -> str:
     """
     Cleans a string to ensure it's valid Python code by removing markdown fences
@@ -25,25 +23,159 @@ def clean_python_code(code_string: str) -> str:
     # Strip leading/trailing whitespace
     return code_string.strip()
 
-def execute_plot_code(code: str, df: pd.DataFrame, file_path: str):
+def build_plotting_chain(llm_model):
+    """
+    Builds the prompt | llm | parser chain that writes matplotlib code for a result.
+    """
+    plotting_prompt = PromptTemplate(
+        input_variables=["analysis_name", "df_columns", "df_head", "df_profile"],
+        template=load_prompt("plotting_prompt_template.txt")
+    )
+    return plotting_prompt | llm_model | StrOutputParser()
+
+def build_interpretation_chain(llm_model):
+    """
+    Builds the prompt | llm | parser chain that narrates a result.
     """
-    Executes plotting code in a controlled environment.
+    interpretation_prompt = PromptTemplate(
+        input_variables=["analysis_name", "analysis_result"],
+        template=load_prompt("interpretation_prompt_template.txt")
+    )
+    return interpretation_prompt | llm_model | StrOutputParser()
+
+def plan_result_content(plotting_chain, interpretation_chain, result: dict, plot_file_path: str) -> dict:
+    """
+    Plots (for DataFrame results) and narrates a single query result.
+
+    Args:
+        plotting_chain: The chain returned by `build_plotting_chain`.
+        interpretation_chain: The chain returned by `build_interpretation_chain`.
+        result (dict): A `query_results` entry ({"analysis_name", "result"}).
+        plot_file_path (str): Where to save the plot if one is generated.
+
+    Returns:
+        dict: A `report_content` entry.
     """
-    try:
-        # The generated code expects 'df' and 'plt' to be available.
-        local_scope = {'df': df, 'plt': plt}
-        exec(code, globals(), local_scope)
-        plt.savefig(file_path)
-        plt.close() # Close the plot to free up memory
-        print(f"Plot saved to {file_path}")
-        return file_path
-    except Exception as e:
-        print(f"Error executing plot code: {e}")
+    analysis_name = result['analysis_name']
+    analysis_result = result['result']
+
+    narrative_input = ""
+    final_result_for_report = analysis_result
+
+    if isinstance(analysis_result, pd.DataFrame):
+        print(f"Result for '{analysis_name}' is a DataFrame. Generating plot...")
+
+        # Generate plotting code
+        plot_code_raw = invoke_with_limit(plotting_chain, {
+            "analysis_name": analysis_name,
+            "df_columns": list(analysis_result.columns),
+            "df_head": analysis_result.head().to_string(),
+            "df_profile": "\n".join(
+                f"- {col}: {format_column_profile(profile_column(analysis_result.iloc[:, pos]))}"
+                for pos, col in enumerate(analysis_result.columns)
+            )
+        })
+        plot_code = clean_python_code(plot_code_raw)
+
+        # A plot left by an earlier report must not stand in for one that fails to render
+        if os.path.exists(plot_file_path):
+            os.remove(plot_file_path)
+
+        # Execute plotting code
+        execute_plot_code(plot_code, analysis_result, plot_file_path)
+
+        # The result for the report is now the plot file path
+        final_result_for_report = plot_file_path
+        narrative_input = f"The analysis produced a plot saved at '{plot_file_path}'. The plot visualizes the results of the analysis titled: '{analysis_name}'. Your task is to explain what this plot shows."
+
+    else:
+        narrative_input = str(analysis_result)
+
+    print(f"Generating summary for: {analysis_name}")
+    narrative = invoke_with_limit(interpretation_chain, {
+        "analysis_name": analysis_name,
+        "analysis_result": narrative_input
+    })
+
+    print(f"Generated Narrative for '{analysis_name}':\n{narrative}")
+    print("-----------------------------------")
+
+    return {
+        "analysis_name": analysis_name,
+        "narrative": narrative,
+        "original_result": final_result_for_report
+    }
+
+def reuse_section_content(section_store, content_key: str, plot_file_path: str):
+    """
+    Returns the stored `report_content` entry of a result that did not change
+    since an earlier report, restoring its plot to `plot_file_path`, or None.
+    """
+    stored = section_store.get(content_key) if section_store is not None else None
+    if stored is None or (stored['has_plot'] and not section_store.restore_plot(content_key, plot_file_path)):
         return None
 
+    print(f"Reusing the stored plot and narrative of: {stored['analysis_name']}")
+    return {
+        "analysis_name": stored['analysis_name'],
+        "narrative": stored['narrative'],
+        "original_result": plot_file_path if stored['has_plot'] else stored['original_result']
+    }
+
+def save_section_content(section_store, content_key: str, content: dict, plot_file_path: str) -> None:
+    """Stores a section's narrative and plot; sections whose plot failed to render are not stored."""
+    if section_store is None:
+        return
+
+    has_plot = content['original_result'] == plot_file_path
+    if has_plot:
+        if not os.path.exists(plot_file_path):
+            return
+        section_store.save_plot(content_key, plot_file_path)
+
+    section_store.put(content_key, {
+        "analysis_name": content['analysis_name'],
+        "narrative": content['narrative'],
+        "original_result": None if has_plot else content['original_result'],
+        "has_plot": has_plot
+    })
+
+def plan_section_content(plotting_chain, interpretation_chain, result: dict, plot_file_path: str,
+                         section_store=None, content_key: str = None):
+    """
+    `plan_result_content`, reusing the stored plot and narrative when
+    `section_store` holds them under `content_key`.
+
+    Returns:
+        tuple: (`report_content` entry, whether it was reused).
+    """
+    content = reuse_section_content(section_store, content_key, plot_file_path)
+    if content is not None:
+        return content, True
+
+    content = plan_result_content(plotting_chain, interpretation_chain, result, plot_file_path)
+    save_section_content(section_store, content_key, content, plot_file_path)
+    return content, False
+
+def emit_section_completed(idx: int, content: dict, reused: bool = False) -> None:
+    """Publishes a "section_completed" progress event carrying the section's narrative and plot."""
+    plot_path = content['original_result']
+    emit_progress(
+        "section_completed",
+        idx=idx,
+        analysis_name=content['analysis_name'],
+        narrative=content['narrative'],
+        plot_path=plot_path if isinstance(plot_path, str) and plot_path.endswith(".png") and os.path.exists(plot_path) else None,
+        reused=reused,
+    )
+
 def content_planning_node(state: ReportState) -> dict:
     """
     Generates plots from DataFrames and creates narrative summaries for all results.
+    The plotting and interpretation LLM calls run concurrently across results;
+    the report content keeps the order of the query results. Results that did
+    not change since an earlier report of the session reuse their stored plot
+    and narrative.
     """
     print("\n==========================================")
     print("I am in the content planning node ... ")
@@ -51,66 +183,24 @@ def content_planning_node(state: ReportState) -> dict:
     
     llm_model = state['llm_model']
     query_results = state['query_results']
-    
-    # Make sure the 'plots' directory exists
-    os.makedirs("plots", exist_ok=True)
+    # Plots are written to the report job's own folder
+    plots_path = os.path.join(report_work_path(state), "plots")
+    os.makedirs(plots_path, exist_ok=True)
 
-    plotting_prompt = PromptTemplate(
-        input_variables=["analysis_name", "df_columns", "df_head"],
-        template=plotting_prompt_template
-    )
-    plotting_chain = plotting_prompt | llm_model | StrOutputParser()
+    plotting_chain = build_plotting_chain(llm_model)
+    interpretation_chain = build_interpretation_chain(llm_model)
+    section_store = get_section_store(os.path.dirname(state['plots_path']), state.get('reuse_sections', True))
 
-    interpretation_prompt = PromptTemplate(
-        input_variables=["analysis_name", "analysis_result"],
-        template=interpretation_prompt_template
-    )
-    interpretation_chain = interpretation_prompt | llm_model | StrOutputParser()
-
-    report_content = []
-
-    for idx, result in enumerate(query_results):
-        analysis_name = result['analysis_name']
-        analysis_result = result['result']
-        
-        narrative_input = ""
-        final_result_for_report = analysis_result
-
-        if isinstance(analysis_result, pd.DataFrame):
-            print(f"Result for '{analysis_name}' is a DataFrame. Generating plot...")
-            
-            # Generate plotting code
-            plot_code_raw = plotting_chain.invoke({
-                "analysis_name": analysis_name,
-                "df_columns": list(analysis_result.columns),
-                "df_head": analysis_result.head().to_string()
-            })
-            plot_code = clean_python_code(plot_code_raw)
-            
-            # Execute plotting code
-            plot_file_path = f"plots/plot_{idx}.png"
-            execute_plot_code(plot_code, analysis_result, plot_file_path)
-            
-            # The result for the report is now the plot file path
-            final_result_for_report = plot_file_path
-            narrative_input = f"The analysis produced a plot saved at '{plot_file_path}'. The plot visualizes the results of the analysis titled: '{analysis_name}'. Your task is to explain what this plot shows."
-
-        else:
-            narrative_input = str(analysis_result)
-
-        print(f"Generating summary for: {analysis_name}")
-        narrative = interpretation_chain.invoke({
-            "analysis_name": analysis_name,
-            "analysis_result": narrative_input
-        })
-        
-        report_content.append({
-            "analysis_name": analysis_name,
-            "narrative": narrative,
-            "original_result": final_result_for_report
-        })
-        print(f"Generated Narrative:\n{narrative}")
-        print("-----------------------------------")
+    def plan_one(item):
+        idx, result = item
+        content, reused = plan_section_content(
+            plotting_chain, interpretation_chain, result, os.path.join(plots_path, f"plot_{idx}.png"),
+            section_store, section_content_key(result, llm_model) if section_store is not None else None
+        )
+        emit_section_completed(idx, content, reused)
+        return content
+
+    report_content = run_concurrently(plan_one, list(enumerate(query_results)))
 
     state['report_content'] = report_content
     return state
@@ -1,14 +1,223 @@
 from ..state import ReportState
-from langchain.prompts import PromptTemplate
+from ..utils.concurrency import invoke_with_limit, run_concurrently
+from ..utils.code_cache import get_code_cache, schema_fingerprint, code_cache_key
+from ..utils.code_executor import CODE_LANGUAGE
+from ..utils.schema_context import (
+    analytic_scope, batch_scope, estimate_tokens, get_schema_context, render_schema_context,
+    scoped_input_table_schema
+)
+from ..utils.section_store import analytic_result_keys, get_section_store
+from ..llm_tools.schema_selection import get_schema_index
+from ..utils.progress import emit_progress
+from ..utils.prompts import load_prompt
+from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-import pandas as pd
+from langchain_core.utils.json import parse_json_markdown
+from typing import Dict, Iterable, List
+import json
+import os
 
-with open("prompts/code_generation_prompt_template.txt", "r") as f:
-        code_generation_prompt_template = f.read()
+# "individual" asks the LLM for each analytic's code separately; "batched"
+# asks for all of them in one structured response (see generate_batched_code)
+CODE_GENERATION_MODE = os.getenv("CODE_GENERATION_MODE", "individual").strip().lower()
+# Analytics per batched call; larger plans are split into several batches
+CODE_GENERATION_BATCH_SIZE = max(1, int(os.getenv("CODE_GENERATION_BATCH_SIZE", "8")))
+
+# Prompt templates per code language (CODE_LANGUAGE follows the executor backend)
+_CODE_GENERATION_PROMPTS = {
+    "python": "code_generation_prompt_template.txt",
+    "sql": "sql_generation_prompt_template.txt",
+}
+_BATCH_CODE_GENERATION_PROMPTS = {
+    "python": "batch_code_generation_prompt_template.txt",
+    "sql": "batch_sql_generation_prompt_template.txt",
+}
+
+def build_code_generation_chain(llm_model):
+    """
+    Builds the prompt | llm | parser chain used to generate `analyze_data`
+    code, or a SQL query with the duckdb executor.
+    """
+    code_generation_prompt = PromptTemplate(
+        input_variables=["input_table_schema", "analytic_description"],
+        template=load_prompt(_CODE_GENERATION_PROMPTS[CODE_LANGUAGE])
+    )
+
+    return code_generation_prompt | llm_model | StrOutputParser()
+
+def generate_analytic_code(code_generation_chain, schema_context: dict, one_analytic: dict) -> dict:
+    """
+    Generates the python code for a single suggested analytic. The prompt only
+    carries the table and columns the analytic references (or, when the plan
+    names none, those the schema index finds closest to its description).
+
+    Args:
+        code_generation_chain: The chain returned by `build_code_generation_chain`.
+        schema_context (dict): The session's schema context (`build_schema_context`).
+        one_analytic (dict): One entry of `analytics_plan['analytics_suggested']`.
+
+    Returns:
+        dict: An `analytics_code` entry with the analysis name and generated code.
+    """
+    print(f"Generating code for: {one_analytic['analysis_name']}")
+
+    code = invoke_with_limit(code_generation_chain, {
+        "input_table_schema": scoped_input_table_schema(schema_context, one_analytic,
+                                                        get_schema_index(schema_context)),
+        "analytic_description": one_analytic['description']
+    })
+
+    return {
+        "analysis_name": one_analytic['analysis_name'],
+        "code": code
+    }
+
+def analytic_code_cache_key(one_analytic: dict, processed_tables: dict):
+    """
+    Returns the known-good code cache key of an analytic, or None when the
+    cache is disabled or the analytic's table is unknown.
+    """
+    table = processed_tables.get(one_analytic.get('table_name'))
+    if get_code_cache() is None or table is None:
+        return None
+
+    return code_cache_key(schema_fingerprint(table.df), one_analytic['description'], CODE_LANGUAGE)
+
+def cached_analytic_code(one_analytic: dict, processed_tables: dict) -> dict:
+    """
+    Looks an analytic up in the known-good code cache.
+
+    Returns:
+        dict: An `analytics_code` entry with `cache_key` and `from_cache` set;
+        its `code` is None on a cache miss.
+    """
+    cache_key = analytic_code_cache_key(one_analytic, processed_tables)
+    cached_code = get_code_cache().get(cache_key) if cache_key else None
+
+    if cached_code is not None:
+        print(f"Using known-good cached code for: {one_analytic['analysis_name']}")
+
+    return {
+        "analysis_name": one_analytic['analysis_name'],
+        "code": cached_code,
+        "cache_key": cache_key,
+        "from_cache": cached_code is not None
+    }
+
+def plan_analytic_code(code_generation_chain, schema_context: dict, one_analytic: dict,
+                       processed_tables: dict) -> dict:
+    """
+    Returns the code for a single analytic, preferring code that already ran
+    successfully on a table with the same schema and only calling the LLM on a
+    cache miss.
+
+    Returns:
+        dict: An `analytics_code` entry, with `cache_key` and `from_cache` set.
+    """
+    analytic_code = cached_analytic_code(one_analytic, processed_tables)
+
+    if not analytic_code['from_cache']:
+        analytic_code['code'] = generate_analytic_code(code_generation_chain, schema_context, one_analytic)['code']
+    return analytic_code
+
+def build_batch_code_generation_chain(llm_model):
+    """
+    Builds the prompt | llm | parser chain that generates the code of several
+    analytics in a single call.
+    """
+    batch_code_generation_prompt = PromptTemplate(
+        input_variables=["input_table_schema", "analytics_descriptions"],
+        template=load_prompt(_BATCH_CODE_GENERATION_PROMPTS[CODE_LANGUAGE])
+    )
+
+    return batch_code_generation_prompt | llm_model | StrOutputParser()
+
+def _is_code(code: str) -> bool:
+    return "def analyze_data" in code if CODE_LANGUAGE == "python" else bool(code.strip())
+
+def parse_batch_code(response: str, expected: Iterable[int]) -> Dict[int, str]:
+    """
+    Extracts the per-analytic code from a batched code generation response.
+
+    Entries that are missing, malformed, for an unexpected index or that do
+    not define `analyze_data` (or are empty, for SQL) are left out, so the
+    caller can generate just those individually. A response that is not valid
+    JSON yields no entries.
+
+    Returns:
+        dict: Analytic index → code.
+    """
+    try:
+        payload = parse_json_markdown(response)
+    except ValueError:
+        return {}
+
+    entries = payload.get("analytics") if isinstance(payload, dict) else None
+    if not isinstance(entries, list):
+        return {}
+
+    expected = set(expected)
+    code_by_idx = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        idx, code = entry.get("index"), entry.get("code")
+        if isinstance(idx, int) and idx in expected and isinstance(code, str) and _is_code(code):
+            code_by_idx[idx] = code
+
+    return code_by_idx
+
+def generate_batched_code(batch_code_generation_chain, schema_context: dict, analytics_plan: List[dict],
+                          indices: List[int]) -> Dict[int, str]:
+    """
+    Generates the code of the analytics at `indices` with one LLM call. The
+    schema preamble is sent once, scoped to the columns those analytics use.
+
+    Returns:
+        dict: Analytic index → code, for every analytic the response covered.
+    """
+    analytics = [analytics_plan[idx] for idx in indices]
+    schema_index = get_schema_index(schema_context)
+    input_table_schema = render_schema_context(schema_context, batch_scope(schema_context, analytics, schema_index))
+    per_analytic_tokens = sum(
+        estimate_tokens(render_schema_context(schema_context,
+                                              analytic_scope(schema_context, one_analytic, schema_index)))
+        for one_analytic in analytics
+    )
+    print(f"Generating code for {len(indices)} analytics in one call; schema context "
+          f"{estimate_tokens(input_table_schema)} tokens instead of {per_analytic_tokens} (estimated)")
+
+    analytics_descriptions = json.dumps([
+        {
+            "index": idx,
+            "analysis_name": one_analytic['analysis_name'],
+            "table_name": one_analytic.get('table_name'),
+            "description": one_analytic['description'],
+        }
+        for idx, one_analytic in zip(indices, analytics)
+    ], indent=2)
+
+    response = invoke_with_limit(batch_code_generation_chain, {
+        "input_table_schema": input_table_schema,
+        "analytics_descriptions": analytics_descriptions
+    })
+
+    code_by_idx = parse_batch_code(response, indices)
+    missing = [idx for idx in indices if idx not in code_by_idx]
+    if missing:
+        print(f"Batched response has no usable code for analytics {missing}; generating them individually.")
+    return code_by_idx
 
 def analytics_planning_node(state: ReportState) -> dict:
     """
     This node generates Python code for each analytic suggested in the analytics_plan.
+    Known-good code cached for the same schema and analytic is reused as is.
+    In batched mode the remaining analytics are generated with one LLM call per
+    batch, and only the analytics a batch response misses are generated
+    individually. The per-analytic LLM calls are issued concurrently; results
+    keep the plan order. Analytics whose inputs (the analytic as planned and
+    its table's content) did not change since an earlier report of the session
+    reuse their stored code, and later their stored result.
     """
     print("\n==========================================")
     print("I am in the analytics planning node ... ")
@@ -18,63 +227,71 @@ def analytics_planning_node(state: ReportState) -> dict:
     analytics_plan = state['analytics_plan']['analytics_suggested']
     processed_tables = state['processed_tables']
     
-    # For simplicity, we'll assume all analytics are for the first table in the plan.
-    table_name = analytics_plan[0]['table_name']
-    
-    # We need the data to be available for the LLM to understand the context for coding
-    # df_string = processed_tables[table_name].data.head().to_string()
-    
-    tables_list = processed_tables.keys()
+    schema_context = get_schema_context(state)
 
-    input_table_schema = ""
+    code_generation_chain = build_code_generation_chain(llm_model)
 
-    for one_table in tables_list:
+    def print_generated_code(code):
+        print("Generated Code:")
+        print(code)
+        print("-----------------------------------")
 
-        one_table_schema = processed_tables[one_table].schema
+    section_store = get_section_store(os.path.dirname(state['plots_path']), state.get('reuse_sections', True))
+    section_keys = analytic_result_keys(analytics_plan, processed_tables, llm_model) if section_store else []
 
-        input_table_schema += f"Table name: {one_table}\n"
-        input_table_schema += f"Table Description: {one_table_schema['table_description'].unique()[0]}\n\n"
-        input_table_schema += f"Columns description of table {one_table}:\n"
+    planned_code = []
+    for idx, one_analytic in enumerate(analytics_plan):
+        stored = section_store.get(section_keys[idx]) if section_store is not None else None
+        if stored is not None:
+            print(f"Reusing the stored code of: {one_analytic['analysis_name']}")
+            analytic_code = {
+                "analysis_name": one_analytic['analysis_name'],
+                "code": stored['code'],
+                "cache_key": None,
+                "from_cache": False,
+                "reused": True
+            }
+        else:
+            analytic_code = cached_analytic_code(one_analytic, processed_tables)
+        analytic_code['section_key'] = section_keys[idx] if section_keys else None
+        planned_code.append(analytic_code)
 
-        for idx, one_row in one_table_schema.iterrows():
-            input_table_schema += f"Column name: {one_row['column_name']}\n"
-            input_table_schema += f"Column description: {one_row['column_description']}\n"
-            input_table_schema += f"Column type: {one_row['data_type']}\n\n"
+    to_generate = [idx for idx, analytic_code in enumerate(planned_code)
+                   if not (analytic_code['from_cache'] or analytic_code.get('reused'))]
+    reused = sum(1 for analytic_code in planned_code if analytic_code.get('reused'))
 
-        input_table_schema += "\n\n"
+    batched_code: Dict[int, str] = {}
+    batches = []
+    if CODE_GENERATION_MODE == "batched" and len(to_generate) > 1:
+        batch_code_generation_chain = build_batch_code_generation_chain(llm_model)
+        batches = [to_generate[i:i + CODE_GENERATION_BATCH_SIZE]
+                   for i in range(0, len(to_generate), CODE_GENERATION_BATCH_SIZE)]
+        for code_by_idx in run_concurrently(
+            lambda indices: generate_batched_code(batch_code_generation_chain, schema_context, analytics_plan, indices),
+            batches
+        ):
+            batched_code.update(code_by_idx)
 
-    code_generation_prompt = PromptTemplate(
-        input_variables=["input_table_schema", "analytic_description"],
-        template=code_generation_prompt_template
-    )
+    def plan_one(idx):
+        one_analytic = analytics_plan[idx]
+        analytic_code = planned_code[idx]
+        if idx in batched_code:
+            analytic_code['code'] = batched_code[idx]
+        elif not (analytic_code['from_cache'] or analytic_code.get('reused')):
+            analytic_code['code'] = generate_analytic_code(code_generation_chain, schema_context, one_analytic)['code']
+        emit_progress("code_generated", idx=idx, analysis_name=one_analytic['analysis_name'],
+                      from_cache=analytic_code['from_cache'], reused=analytic_code.get('reused', False))
+        return analytic_code
 
-    parser = StrOutputParser()
-    code_generation_chain = code_generation_prompt | llm_model | parser
+    generated_code = run_concurrently(plan_one, range(len(analytics_plan)))
 
-    generated_code = []
-
-    def print_generated_code(code):
-        print("Generated Code:")
-        print(code)
-        print("-----------------------------------")
+    print(f"Code generation: {len(analytics_plan)} analytics, {reused} reused, "
+          f"{len(analytics_plan) - len(to_generate) - reused} from cache, {len(batches)} batched LLM call(s), "
+          f"{len(to_generate) - len(batched_code)} individual LLM call(s)")
 
-    for one_analytic in analytics_plan:
-        print(f"Generating code for: {one_analytic['analysis_name']}")
-        
-        analytic_description = one_analytic['description']
-        
-        # Generate the code
-        code = code_generation_chain.invoke({
-            "input_table_schema": input_table_schema,
-            "analytic_description": analytic_description
-        })
-        
-        generated_code.append({
-            "analysis_name": one_analytic['analysis_name'],
-            "code": code
-        })
-        
-        print_generated_code(code)
+    for one_code in generated_code:
+        print(f"Generated code for: {one_code['analysis_name']}")
+        print_generated_code(one_code['code'])
 
     state['analytics_code'] = generated_code
     
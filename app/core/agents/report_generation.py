@@ -1,42 +1,52 @@
 import os
 import uuid
+import time
+import shutil
 from datetime import datetime
 import re
-import matplotlib
-from fpdf import FPDF
-from app.core.state import ReportState
-
-# Ensure a non-interactive backend is used for matplotlib
-matplotlib.use('Agg')
+from functools import lru_cache
+from typing import Dict
+from app.core.state import ReportState, report_work_path
+from app.core.utils.progress import emit_progress
+from app.core.utils.section_store import get_section_store, report_key
+from app.core.utils.report_images import (
+    REPORT_IMAGE_FORMAT, REPORT_IMAGES_DIR, REPORT_MAX_BYTES, image_sizes, min_image_scale, next_image_scale,
+    optimize_image
+)
 
 def clean_text_for_pdf(text: str) -> str:
     text = text.replace('**', '').replace('*', '')
     return text.strip()
 
-class PDF(FPDF):
-    def header(self):
-        if self.page_no() > 1:
-            self.set_font('Arial', 'B', 12)
-            self.cell(0, 10, 'Data Analysis Report', 0, 0, 'C')
-            self.ln(10)
+@lru_cache(maxsize=None)
+def pdf_class():
+    """Defines the report's FPDF subclass; fpdf is imported on the first report."""
+    from fpdf import FPDF
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+    class PDF(FPDF):
+        def header(self):
+            if self.page_no() > 1:
+                self.set_font('Arial', 'B', 12)
+                self.cell(0, 10, 'Data Analysis Report', 0, 0, 'C')
+                self.ln(10)
 
-def report_generation_node(state: ReportState) -> dict:
-    print("\n==========================================")
-    print(">>> In Report Generation Node")
-    print("============================================")
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
-    report_content = state['report_content']
-    
-    # Use the plots_path to determine the session's base directory for the output
-    session_path = os.path.dirname(state['plots_path'])
-    pdf_path = os.path.join(session_path, "financial_analysis_report.pdf")
+    return PDF
+
+def write_report_pdf(report_content: list, pdf_path: str, images: Dict[int, str]) -> None:
+    """
+    Writes the report PDF.
 
-    pdf = PDF()
+    Args:
+        report_content (list): The `report_content` entries, in order.
+        pdf_path (str): Where to write the PDF.
+        images (dict): Section index → path of the image to embed for it.
+    """
+    pdf = pdf_class()()
     # Title Page
     pdf.add_page()
     pdf.set_font('Arial', 'B', 24)
@@ -46,10 +56,9 @@ def report_generation_node(state: ReportState) -> dict:
     
     pdf.add_page()
 
-    for content in report_content:
+    for idx, content in enumerate(report_content):
         cleaned_analysis_name = clean_text_for_pdf(content.get('analysis_name', 'Unnamed Analysis'))
         cleaned_narrative = clean_text_for_pdf(content.get('narrative', 'No narrative provided.'))
-        original_result = content.get('original_result')
 
         pdf.set_font("Arial", 'B', size=16)
         pdf.multi_cell(0, 10, txt=cleaned_analysis_name, align='L')
@@ -59,19 +68,111 @@ def report_generation_node(state: ReportState) -> dict:
         pdf.multi_cell(0, 8, txt=cleaned_narrative)
         pdf.ln(5)
 
-        if isinstance(original_result, str) and original_result.lower().endswith('.png') and os.path.exists(original_result):
+        if idx in images:
             page_width = pdf.w - 2 * pdf.l_margin
             img_width = page_width * 0.9
             x_pos = (pdf.w - img_width) / 2
-            pdf.image(original_result, x=x_pos, w=img_width)
+            pdf.image(images[idx], x=x_pos, w=img_width)
             pdf.ln(5)
         
         pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 190, pdf.get_y())
         pdf.ln(10)
 
-    pdf.output(pdf_path)
+    # Replace the previous report atomically, so downloads in progress keep reading a complete file.
+    # The temp name is unique, since two report jobs of the same session may write at once.
+    tmp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        pdf.output(tmp_path)
+        os.replace(tmp_path, pdf_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def render_report(report_content: list, plots: Dict[int, str], pdf_path: str, images_path: str) -> dict:
+    """
+    Writes the PDF with optimized copies of the plots, downscaling them until
+    the PDF fits REPORT_MAX_BYTES.
+
+    Returns:
+        dict: The report's size and image stats.
+    """
+    # Drop the images of a previous run in this folder
+    shutil.rmtree(images_path, ignore_errors=True)
+
+    scale = 1.0
+    images = {idx: optimize_image(plot_path, images_path, scale) for idx, plot_path in plots.items()}
+    write_report_pdf(report_content, pdf_path, images)
+    pdf_bytes, image_bytes = os.path.getsize(pdf_path), image_sizes(images)
+
+    min_scale = min_image_scale(plots.values())
+    while REPORT_MAX_BYTES and pdf_bytes > REPORT_MAX_BYTES and REPORT_IMAGE_FORMAT != "original":
+        next_scale = next_image_scale(scale, pdf_bytes, image_bytes, REPORT_MAX_BYTES)
+        if next_scale is None or scale <= min_scale:
+            print(f"Report is {pdf_bytes} bytes, over the {REPORT_MAX_BYTES} byte budget, "
+                  "but its images are already at their minimum size")
+            break
+
+        scale = max(min_scale, next_scale)
+        print(f"Report is {pdf_bytes} bytes, over the {REPORT_MAX_BYTES} byte budget; "
+              f"downscaling images to {scale:.0%}")
+        images = {idx: optimize_image(plot_path, images_path, scale) for idx, plot_path in plots.items()}
+        write_report_pdf(report_content, pdf_path, images)
+        pdf_bytes, image_bytes = os.path.getsize(pdf_path), image_sizes(images)
+
+    return {
+        "bytes": pdf_bytes,
+        "images": len(images),
+        "image_bytes": image_bytes,
+        "image_scale": round(scale, 3),
+        "max_bytes": REPORT_MAX_BYTES or None,
+        "within_budget": not REPORT_MAX_BYTES or pdf_bytes <= REPORT_MAX_BYTES,
+    }
+
+def report_generation_node(state: ReportState) -> dict:
+    """
+    Writes the PDF report. Plots are embedded as optimized copies (palette PNG
+    or JPEG); if the PDF exceeds REPORT_MAX_BYTES, the images are downscaled
+    and the PDF rebuilt until it fits or the images reach their minimum width.
+    When no section changed since the session's previous report, that PDF is
+    kept as is.
+    """
+    print("\n==========================================")
+    print(">>> In Report Generation Node")
+    print("============================================")
+
+    started = time.perf_counter()
+    report_content = state['report_content']
+    
+    # Use the plots_path to determine the session's base directory for the output
+    session_path = os.path.dirname(state['plots_path'])
+    pdf_path = os.path.join(session_path, "financial_analysis_report.pdf")
+    # Other reports of the session may be rendering at the same time
+    images_path = os.path.join(report_work_path(state), REPORT_IMAGES_DIR)
+
+    plots = {
+        idx: content['original_result']
+        for idx, content in enumerate(report_content)
+        if isinstance(content.get('original_result'), str)
+        and content['original_result'].lower().endswith('.png') and os.path.exists(content['original_result'])
+    }
+
+    section_store = get_section_store(session_path, state.get('reuse_sections', True))
+    key = report_key(report_content, plots) if section_store is not None else None
+    stored_stats = section_store.get(key) if key else None
+
+    if stored_stats is not None and os.path.exists(pdf_path) and os.path.getsize(pdf_path) == stored_stats['bytes']:
+        print("No section changed since the previous report; reusing its PDF.")
+        report_stats = {**stored_stats, "reused": True}
+    else:
+        report_stats = {**render_report(report_content, plots, pdf_path, images_path), "reused": False}
+        if key:
+            section_store.put(key, report_stats)
+    report_stats["render_seconds"] = round(time.perf_counter() - started, 3)
+
     print(f"PDF report generated successfully at: {pdf_path}")
+    print(f"Report stats: {report_stats}")
+    emit_progress("report_generated", **report_stats)
     
     state['pdf_path'] = pdf_path
+    state['report_stats'] = report_stats
     return state
-
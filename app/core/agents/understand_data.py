@@ -1,15 +1,21 @@
 from ..state import ReportState
-from langchain.prompts import PromptTemplate
+from ..utils.schema_context import estimate_tokens, get_schema_context, render_schema_context
+from ..utils.section_store import (
+    SECTION_REUSE_ENABLED, load_analytics_plan, plan_key, save_analytics_plan
+)
+from ..utils.progress import emit_progress
+from ..utils.prompts import load_prompt
+from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-
-with open("prompts/data_understanding_prompt.txt", "r") as f:
-        data_understanding_template = f.read()
+import os
 
 def data_understanding_node(state: ReportState) -> ReportState:
 
     """
     This node is responsible for understanding the data.
     It will load the data, analyze its schema, and prepare it for further processing.
+    The plan is saved with the session and reused while the schema context it
+    was generated from is unchanged; a plan edited through the API is always used.
     """
     
     print("\n==========================================")
@@ -18,46 +24,44 @@ def data_understanding_node(state: ReportState) -> ReportState:
 
     print(state)
     llm_model = state['llm_model']
-    processed_tables = state['processed_tables'] 
-
-    tables_list = processed_tables.keys()
-
-    input_table_schema = ""
-
-    for one_table in tables_list:
 
-        one_table_schema = processed_tables[one_table].schema
-
-        input_table_schema += f"Table name: {one_table}\n"
-        input_table_schema += f"Table Description: {one_table_schema['table_description'].unique()[0]}\n\n"
-        input_table_schema += f"Columns description of table {one_table}:\n"
-
-        for idx, one_row in one_table_schema.iterrows():
-            input_table_schema += f"Column name: {one_row['column_name']}\n"
-            input_table_schema += f"Column description: {one_row['column_description']}\n"
-            input_table_schema += f"Column type: {one_row['data_type']}\n\n"
-
-        input_table_schema += "\n\n"
+    # The data understanding step plans across every table, so it sees the full schema
+    input_table_schema = render_schema_context(get_schema_context(state))
+    print(f"Schema context: {estimate_tokens(input_table_schema)} tokens (estimated)")
 
     # print(input_table_schema)
 
     data_understanding_prompt = PromptTemplate(
         input_variables=["input_table_schema"],
-        template =  data_understanding_template)
-
-    parser = JsonOutputParser()
-    print(data_understanding_prompt.template)
-    print(input_table_schema)
-    analytics_plan_chain = data_understanding_prompt | llm_model | parser
-    analytics_plan_json = analytics_plan_chain.invoke({"input_table_schema": input_table_schema})
+        template =  load_prompt("data_understanding_prompt.txt"))
+
+    session_path = os.path.dirname(state['plots_path'])
+    key = plan_key(input_table_schema, llm_model)
+    saved_plan = load_analytics_plan(session_path)
+    reuse = SECTION_REUSE_ENABLED and state.get('reuse_sections', True)
+
+    if saved_plan is not None and (saved_plan['edited'] or (reuse and saved_plan['key'] == key)):
+        analytics_plan_json = saved_plan['plan']
+        print(f"Reusing the {'edited' if saved_plan['edited'] else 'saved'} analytics plan of the session.")
+    else:
+        parser = JsonOutputParser()
+        print(data_understanding_prompt.template)
+        print(input_table_schema)
+        analytics_plan_chain = data_understanding_prompt | llm_model | parser
+        analytics_plan_json = analytics_plan_chain.invoke({"input_table_schema": input_table_schema})
+        save_analytics_plan(session_path, analytics_plan_json, key)
+        print("Analytics plan generated successfully.")
 
     state["analytics_plan"] = analytics_plan_json 
 
-    print("Analytics plan generated successfully.")
+    emit_progress(
+        "analytics_planned",
+        analyses=[one_plan['analysis_name'] for one_plan in analytics_plan_json['analytics_suggested']]
+    )
 
     # Display the analytics plan
     print("Chain of thought:")
-    print(analytics_plan_json['chain_of_thought'])
+    print(analytics_plan_json.get('chain_of_thought', ''))
 
     for one_plan in analytics_plan_json['analytics_suggested']:
         
@@ -1,12 +1,254 @@
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.schema_context import estimate_tokens, get_schema_context, render_schema_context
+
+# Columns sent with a chat question; sessions with no more columns than this
+# always get the full schema
+SCHEMA_SELECTION_TOP_K = max(1, int(os.getenv("SCHEMA_SELECTION_TOP_K", "12")))
+# Width of the hashed TF-IDF vectors; features beyond it share buckets
+SCHEMA_INDEX_DIM = max(64, int(os.getenv("SCHEMA_INDEX_DIM", "2048")))
+
+SCHEMA_INDEX_FILE_NAME = "schema_index.npz"
+
+# How many times each field of a column counts in its vector: the column name
+# is the strongest signal, the table description the weakest (it is shared by
+# every column of the table)
+_FIELD_WEIGHTS = (("column", 3.0), ("description", 2.0), ("table", 1.0), ("profile", 1.0),
+                  ("table_description", 0.5))
+# Character trigrams let "revenues" match "Revenue" and "cust" match "customer_id"
+_TRIGRAM_WEIGHT = 0.5
+# Cosine similarity below which a column does not count as a match (hash
+# collisions and stray trigrams score below it)
+_MIN_SCORE = 0.1
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "by", "with", "is", "are", "was", "what",
+    "which", "how", "per", "each", "me", "show", "give", "list", "from", "at", "as", "be", "it", "this", "that",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words of `text`, with snake_case and camelCase names split into their parts."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text or ""))
+    return [token for token in re.findall(r"[a-z]+|\d+", text.lower()) if token not in _STOPWORDS]
+
+
+def _features(text: str, weight: float) -> Dict[int, float]:
+    """Hashed word and character-trigram counts of `text`, scaled by `weight`."""
+    counts: Dict[int, float] = {}
+    for token in tokenize(text):
+        grams = [f"w:{token}"] + [f"c:{gram}" for gram in _trigrams(token)]
+        for gram in grams:
+            bucket = zlib.crc32(gram.encode("utf-8")) % SCHEMA_INDEX_DIM
+            counts[bucket] = counts.get(bucket, 0.0) + (weight if gram.startswith("w:") else weight * _TRIGRAM_WEIGHT)
+    return counts
+
+
+def _trigrams(token: str) -> List[str]:
+    padded = f"#{token}#"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)] if len(token) > 2 else []
+
+
+def _vectorize(fields: Iterable[Tuple[str, float]]) -> np.ndarray:
+    vector = np.zeros(SCHEMA_INDEX_DIM, dtype=np.float32)
+    for text, weight in fields:
+        for bucket, count in _features(text, weight).items():
+            vector[bucket] += count
+    # Sublinear term frequency, so a word repeated in a long description does not dominate
+    return np.log1p(vector, out=vector)
+
+
+def schema_context_digest(schema_context: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(schema_context, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SchemaIndex:
+    """
+    Hashed TF-IDF index over the columns of a session's schema context.
+
+    Every column is one document made of its name, description, table name,
+    table description and profile line (top values included), hashed into a
+    SCHEMA_INDEX_DIM-wide vector. Retrieval is one matrix-vector product, so a
+    question or analytic description finds its top-k columns in well under a
+    millisecond even for sessions with hundreds of columns.
+    """
+
+    def __init__(self, tables: np.ndarray, columns: np.ndarray, matrix: np.ndarray, idf: np.ndarray, digest: str):
+        self.tables = tables
+        self.columns = columns
+        self.matrix = matrix
+        self.idf = idf
+        self.digest = digest
+
+    @classmethod
+    def build(cls, schema_context: Dict[str, Any]) -> "SchemaIndex":
+        tables, columns, rows = [], [], []
+        for tbl_name, tbl_context in schema_context.items():
+            for col, column in tbl_context["columns"].items():
+                fields = {
+                    "column": col,
+                    "description": column.get("description", ""),
+                    "table": tbl_name,
+                    "profile": column.get("profile", ""),
+                    "table_description": tbl_context.get("description", ""),
+                }
+                tables.append(tbl_name)
+                columns.append(col)
+                rows.append(_vectorize((fields[name], weight) for name, weight in _FIELD_WEIGHTS))
+
+        matrix = np.vstack(rows) if rows else np.zeros((0, SCHEMA_INDEX_DIM), dtype=np.float32)
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        matrix = matrix * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        return cls(np.array(tables, dtype=str), np.array(columns, dtype=str), matrix.astype(np.float32), idf,
+                   schema_context_digest(schema_context))
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def search(self, query: str, top_k: int = SCHEMA_SELECTION_TOP_K,
+               tables: Optional[Iterable[str]] = None) -> List[Tuple[str, str, float]]:
+        """
+        Returns up to `top_k` (table, column, score) matches for `query`, best
+        first, leaving out columns that barely share a feature with it.
+
+        Args:
+            tables (Iterable[str], optional): Only search the columns of these tables.
+        """
+        query_vector = _vectorize([(query, 1.0)]) * self.idf
+        norm = np.linalg.norm(query_vector)
+        if not len(self) or norm == 0:
+            return []
+
+        scores = self.matrix @ (query_vector / norm)
+        if tables is not None:
+            scores = np.where(np.isin(self.tables, list(tables)), scores, 0.0)
+
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [
+            (str(self.tables[i]), str(self.columns[i]), float(scores[i])) for i in best if scores[i] >= _MIN_SCORE
+        ]
+
+    def select(self, query: str, top_k: int = SCHEMA_SELECTION_TOP_K,
+               tables: Optional[Iterable[str]] = None) -> Optional[Dict[str, List[str]]]:
+        """
+        Returns the `search` hits as a `render_schema_context` scope
+        ({table: [columns]} in schema order), or None if nothing matched.
+        """
+        hits = {(tbl_name, col) for tbl_name, col, _ in self.search(query, top_k, tables)}
+        if not hits:
+            return None
+
+        scope: Dict[str, List[str]] = {}
+        for tbl_name, col in zip(self.tables, self.columns):
+            if (tbl_name, col) in hits:
+                scope.setdefault(str(tbl_name), []).append(str(col))
+        return scope
+
+    def save(self, session_path: str) -> str:
+        index_path = os.path.join(session_path, SCHEMA_INDEX_FILE_NAME)
+        tmp_path = f"{index_path}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, tables=self.tables, columns=self.columns, matrix=self.matrix, idf=self.idf,
+                 digest=np.array(self.digest), dim=np.array(SCHEMA_INDEX_DIM))
+        os.replace(tmp_path, index_path)
+        return index_path
+
+    @classmethod
+    def load(cls, session_path: str) -> Optional["SchemaIndex"]:
+        """Loads a saved index; None if there is none or it was built with another SCHEMA_INDEX_DIM."""
+        try:
+            with np.load(os.path.join(session_path, SCHEMA_INDEX_FILE_NAME), allow_pickle=False) as saved:
+                if int(saved["dim"]) != SCHEMA_INDEX_DIM:
+                    return None
+                return cls(saved["tables"], saved["columns"], saved["matrix"], saved["idf"], str(saved["digest"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Indexes of recently used sessions, keyed by the digest of their schema context
+_INDEXES: "OrderedDict[str, SchemaIndex]" = OrderedDict()
+_INDEX_CACHE_SIZE = 16
+_indexes_lock = threading.Lock()
+
+
+def _remember_index(index: SchemaIndex) -> SchemaIndex:
+    with _indexes_lock:
+        _INDEXES[index.digest] = index
+        _INDEXES.move_to_end(index.digest)
+        while len(_INDEXES) > _INDEX_CACHE_SIZE:
+            _INDEXES.popitem(last=False)
+    return index
+
+
+def build_schema_index(schema_context: Dict[str, Any], session_path: Optional[str] = None) -> SchemaIndex:
+    """Builds a session's schema index (at session creation), saving it in the session folder if given."""
+    index = SchemaIndex.build(schema_context)
+    if session_path:
+        index.save(session_path)
+    return _remember_index(index)
+
+
+def get_schema_index(schema_context: Dict[str, Any], session_path: Optional[str] = None) -> SchemaIndex:
+    """
+    Returns the index of a schema context: from memory, from the session
+    folder, or built on the spot when neither matches the schema context.
+    """
+    digest = schema_context_digest(schema_context)
+    with _indexes_lock:
+        if digest in _INDEXES:
+            _INDEXES.move_to_end(digest)
+            return _INDEXES[digest]
+
+    index = SchemaIndex.load(session_path) if session_path else None
+    if index is not None and index.digest == digest:
+        return _remember_index(index)
+    return build_schema_index(schema_context, session_path)
+
+
 def schema_selection_node(state: dict) -> dict:
     """
-    A placeholder function for the schema selection node in the workflow.
-    This function can be expanded to include logic for selecting or validating schemas.
+    Selects the schema context a chat question is answered against: the
+    SCHEMA_SELECTION_TOP_K columns of the session's schema index closest to
+    the question (and the previous question, for follow-ups), or the full
+    schema for small sessions and questions that match no column.
     """
-    
-    
-    
-    # For now, just return the state as is
-    state["agent_response"] = "Schema selection completed."
-    
-    return state
\ No newline at end of file
+    print("\n==========================================")
+    print(">>> In Schema Selection Node")
+    print("============================================")
+
+    schema_context = get_schema_context(state)
+    full_schema = render_schema_context(schema_context)
+    state["input_table_schema"] = full_schema
+
+    index = get_schema_index(schema_context, state.get("session_path"))
+    if len(index) <= SCHEMA_SELECTION_TOP_K:
+        print(f"Schema context: {estimate_tokens(full_schema)} tokens (estimated), all {len(index)} columns")
+        return state
+
+    previous_questions = [one["content"] for one in state.get("chat_history", []) if one["role"] == "user"][-1:]
+    started = time.perf_counter()
+    scope = index.select(" ".join([state["user_message"]] + previous_questions))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if scope is not None:
+        state["input_table_schema"] = render_schema_context(schema_context, scope)
+    print(f"Schema context: {estimate_tokens(full_schema)} -> {estimate_tokens(state['input_table_schema'])} "
+          f"tokens (estimated), {sum(len(cols) for cols in (scope or {}).values())} of {len(index)} columns "
+          f"selected in {elapsed_ms:.2f} ms")
+
+    return state
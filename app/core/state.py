@@ -1,4 +1,5 @@
-from typing import Dict, Any, List
+import os
+from typing import Dict, Any, List, Optional
 
 class ReportState:
     """
@@ -16,7 +17,14 @@ class ReportState:
         self.llm_model = input_context.get("llm_model")
         self.processed_tables = input_context.get("processed_tables", {})
         self.plots_path = input_context.get("plots_path", "")
+        # The report job's own folder for its plots and report images (see `report_work_path`)
+        self.job_path: str = input_context.get("job_path", "")
         self.pdf_path = input_context.get("pdf_path")
+        self.report_stats: Dict[str, Any] = {}
+        self.data_profile: Dict[str, Any] = input_context.get("data_profile", {})
+        self.schema_context: Dict[str, Any] = input_context.get("schema_context", {})
+        # Reuse the artifacts of sections whose inputs did not change since the last report
+        self.reuse_sections: bool = input_context.get("reuse_sections", True)
         
         # Initialize other state attributes with default empty values
         self.analytics_plan: Dict[str, Any] = {}
@@ -34,10 +42,24 @@ class ReportState:
             "query_results": self.query_results,
             "report_content": self.report_content,
             "plots_path": self.plots_path,
+            "job_path": self.job_path,
             "pdf_path": self.pdf_path,
+            "report_stats": self.report_stats,
+            "data_profile": self.data_profile,
+            "schema_context": self.schema_context,
+            "reuse_sections": self.reuse_sections,
         }
 
 
+def report_work_path(state: Dict[str, Any]) -> str:
+    """
+    Folder a report writes its plots (`plots/`) and PDF images into: the
+    report job's own `job_path`, so that two reports of a session never
+    overwrite each other's files, or the session folder outside a job.
+    """
+    return state.get("job_path") or os.path.dirname(state["plots_path"])
+
+
 class ChatState:
     """
     This class represents the state of the chat process.
@@ -48,15 +70,56 @@ class ChatState:
         Initializes the chat state object from a dictionary.
         """
         self.llm_model = input_context.get("llm_model")
+        self.processed_tables = input_context.get("processed_tables", {})
+        self.session_path: str = input_context.get("session_path", "")
+        self.data_profile: Dict[str, Any] = input_context.get("data_profile", {})
+        self.schema_context: Dict[str, Any] = input_context.get("schema_context", {})
+        # Recent turns ({"role", "content"}) and the running summary of the older ones
         self.chat_history: List[Dict[str, str]] = input_context.get("chat_history", [])
+        self.chat_summary: str = input_context.get("chat_summary", "")
         self.user_message: str = input_context.get("user_message", "")
         self.agent_response: str = input_context.get("agent_response", "")
 
+        # Filled in by the chat workflow
+        self.input_table_schema: str = ""
+        self.chat_code: Optional[str] = None
+        self.chat_result: Optional[str] = None
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert the ChatState instance to a dictionary for the workflow."""
         return {
             "llm_model": self.llm_model,
+            "processed_tables": self.processed_tables,
+            "session_path": self.session_path,
+            "data_profile": self.data_profile,
+            "schema_context": self.schema_context,
             "chat_history": self.chat_history,
+            "chat_summary": self.chat_summary,
             "user_message": self.user_message,
             "agent_response": self.agent_response,
-        }
\ No newline at end of file
+            "input_table_schema": self.input_table_schema,
+            "chat_code": self.chat_code,
+            "chat_result": self.chat_result,
+        }
+
+
+def merge_report_state(current: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reducer for the pipelined report graph, where several per-analytic branches
+    write to the state in the same step.
+
+    Top-level keys are overwritten by the update, except `sections`, which is
+    merged by analytic index so that every branch contributes its own entry and
+    re-emitting the full state does not duplicate them.
+    """
+    merged = dict(current or {})
+
+    for key, value in (update or {}).items():
+        if key == "sections":
+            sections = {one["idx"]: one for one in merged.get("sections", [])}
+            sections.update({one["idx"]: one for one in value})
+            merged["sections"] = [sections[idx] for idx in sorted(sections)]
+        else:
+            merged[key] = value
+
+    return merged
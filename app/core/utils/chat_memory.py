@@ -0,0 +1,115 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Exchanges (a question and its answer) kept verbatim in the chat prompts
+CHAT_MEMORY_RECENT_TURNS = max(1, int(os.getenv("CHAT_MEMORY_RECENT_TURNS", "4")))
+# Older exchanges are rolled into the running summary this many at a time, so
+# the summary is rewritten every few turns rather than on every turn
+CHAT_MEMORY_SUMMARY_BATCH = max(1, int(os.getenv("CHAT_MEMORY_SUMMARY_BATCH", "2")))
+CHAT_SUMMARY_MAX_WORDS = max(20, int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "200")))
+# Messages are clipped to this length when stored, so one long answer cannot grow the prompts
+CHAT_MESSAGE_MAX_CHARS = max(100, int(os.getenv("CHAT_MESSAGE_MAX_CHARS", "2000")))
+
+CHAT_MEMORY_FILE_NAME = "chat_memory.json"
+
+# Session path -> (lock, number of holders and waiters); entries go once nobody uses them
+_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+_locks_lock = threading.Lock()
+
+
+@contextmanager
+def chat_session_lock(session_path: str) -> Iterator[None]:
+    """
+    Holds the lock serializing the chat turns of a session within this
+    process, so two concurrent messages cannot both read the memory and drop
+    each other's turn. It blocks, so async handlers must take it off the event loop.
+    """
+    key = os.path.abspath(session_path)
+    with _locks_lock:
+        lock, users = _locks.get(key, (None, 0))
+        lock = lock or threading.Lock()
+        _locks[key] = (lock, users + 1)
+
+    try:
+        with lock:
+            yield
+    finally:
+        with _locks_lock:
+            users = _locks[key][1] - 1
+            if users:
+                _locks[key] = (lock, users)
+            else:
+                del _locks[key]
+
+
+def empty_chat_memory() -> Dict[str, Any]:
+    return {"summary": "", "turns": []}
+
+
+def load_chat_memory(session_path: str) -> Dict[str, Any]:
+    """
+    Returns the session's chat memory: {"summary": <running summary of the
+    older turns>, "turns": [{"role", "content"}, ...] of the recent ones}.
+    """
+    try:
+        with open(os.path.join(session_path, CHAT_MEMORY_FILE_NAME), "r", encoding="utf-8") as f:
+            memory = json.load(f)
+    except (OSError, ValueError):
+        return empty_chat_memory()
+    return {"summary": memory.get("summary", ""), "turns": memory.get("turns", [])}
+
+
+def save_chat_memory(session_path: str, memory: Dict[str, Any]) -> None:
+    path = os.path.join(session_path, CHAT_MEMORY_FILE_NAME)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(memory, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def clear_chat_memory(session_path: str) -> None:
+    """Forgets the session's conversation, waiting for a chat turn in progress to finish first."""
+    with chat_session_lock(session_path):
+        save_chat_memory(session_path, empty_chat_memory())
+
+
+def clip_message(content: str, max_chars: int = CHAT_MESSAGE_MAX_CHARS) -> str:
+    content = str(content or "").strip()
+    return content if len(content) <= max_chars else content[:max_chars].rstrip() + " [...]"
+
+
+def append_turn(memory: Dict[str, Any], question: str, answer: str) -> Dict[str, Any]:
+    """Returns the memory with one more exchange appended to its recent turns."""
+    return {
+        "summary": memory.get("summary", ""),
+        "turns": memory.get("turns", []) + [
+            {"role": "user", "content": clip_message(question)},
+            {"role": "assistant", "content": clip_message(answer)},
+        ],
+    }
+
+
+def turns_to_summarize(memory: Dict[str, Any]) -> int:
+    """
+    Number of the oldest messages due to be rolled into the summary: none until
+    CHAT_MEMORY_SUMMARY_BATCH exchanges beyond the recent window have piled up.
+    """
+    overflow = len(memory.get("turns", [])) - 2 * CHAT_MEMORY_RECENT_TURNS
+    return overflow if overflow >= 2 * CHAT_MEMORY_SUMMARY_BATCH else 0
+
+
+def render_turns(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{'User' if one['role'] == 'user' else 'Assistant'}: {one['content']}" for one in turns)
+
+
+def render_conversation(memory: Dict[str, Any]) -> str:
+    """Renders the summary and the recent turns as the conversation block of the chat prompts."""
+    parts = []
+    if memory.get("summary"):
+        parts.append(f"Summary of the earlier conversation:\n{memory['summary']}")
+    if memory.get("turns"):
+        parts.append(f"Recent messages:\n{render_turns(memory['turns'])}")
+    return "\n\n".join(parts) or "This is the start of the conversation."
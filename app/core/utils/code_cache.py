@@ -0,0 +1,110 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+CODE_CACHE_ENABLED = os.getenv("CODE_CACHE_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+CODE_CACHE_DIR = os.getenv("CODE_CACHE_DIR", "app/data_storage/.code_cache")
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Fingerprints a processed table by its column names and dtypes, so daily
+    extracts with the same schema map to the same fingerprint.
+    """
+    columns = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(columns).encode("utf-8")).hexdigest()
+
+
+def code_cache_key(fingerprint: str, analytic_description: Any, language: str = "python") -> str:
+    """
+    Builds the cache key for an analytic from the schema fingerprint and its
+    description (case and whitespace insensitive). Code in another language
+    than Python (SQL for the duckdb executor) gets keys of its own.
+    """
+    if not isinstance(analytic_description, str):
+        analytic_description = json.dumps(analytic_description, sort_keys=True)
+    normalized = re.sub(r"\s+", " ", analytic_description).strip().lower()
+
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalized.encode("utf-8"))
+    if language != "python":
+        digest.update(b"\x00")
+        digest.update(language.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CodeCache:
+    """
+    Persistent store of generated `analyze_data` code that executed successfully,
+    one JSON file per key.
+    """
+
+    def __init__(self, cache_dir: str = CODE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the known-good code for `key`, or None."""
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry["code"]
+
+    def put(self, key: str, code: str, analysis_name: str = "") -> None:
+        """Records `code` as known-good for `key`."""
+        path = self._entry_path(key)
+        payload = json.dumps({
+            "analysis_name": analysis_name,
+            "code": code,
+            "updated_at": time.time(),
+        })
+
+        with self._lock:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            self.writes += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+_code_cache: Optional[CodeCache] = None
+_code_cache_lock = threading.Lock()
+
+
+def get_code_cache() -> Optional[CodeCache]:
+    """Returns the process-wide known-good code cache, or None if it is disabled."""
+    global _code_cache
+
+    if not CODE_CACHE_ENABLED:
+        return None
+
+    with _code_cache_lock:
+        if _code_cache is None:
+            _code_cache = CodeCache()
+        return _code_cache
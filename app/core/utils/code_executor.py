@@ -0,0 +1,371 @@
+import os
+import pickle
+import signal
+import inspect
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .columnar_store import COLUMNAR_DIR, SESSION_DATA_TYPE, publish_table, read_columnar
+from .join_keys import KEY_INDEX_DIR, SessionTables, make_keyed
+from .worker_pool import SharedProcessPool
+
+# "process" runs generated code in a pool of worker processes with a timeout and
+# memory limit; "inprocess" runs it inside the API process (no limits);
+# "duckdb" has the analytics written as SQL and runs them on an embedded DuckDB database.
+CODE_EXECUTOR_BACKEND = os.getenv("CODE_EXECUTOR_BACKEND", "process").strip().lower()
+CODE_EXECUTOR_WORKERS = max(1, int(os.getenv("CODE_EXECUTOR_WORKERS", str(os.cpu_count() or 2))))
+CODE_EXECUTION_TIMEOUT_SECONDS = float(os.getenv("CODE_EXECUTION_TIMEOUT_SECONDS", "60"))
+CODE_EXECUTION_MEMORY_LIMIT_MB = int(os.getenv("CODE_EXECUTION_MEMORY_LIMIT_MB", "2048"))
+# Threads each DuckDB query may use
+DUCKDB_THREADS = max(1, int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 2))))
+
+# The language code generation writes analytics in for the configured backend
+CODE_LANGUAGE = "sql" if CODE_EXECUTOR_BACKEND == "duckdb" else "python"
+
+# Extra time the API process waits past the in-worker timeout before it
+# declares the worker hung and retires the pool.
+_HARD_TIMEOUT_GRACE_SECONDS = 10
+
+
+class ExecutionOutcome(NamedTuple):
+    result: Any
+    error: Optional[str]
+    traceback: Optional[str]
+
+
+def _takes_tables(func) -> bool:
+    """True if `analyze_data` accepts the session tables after `df` (as `tables` or a second positional)."""
+    try:
+        params = list(inspect.signature(func).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    positional = [one for one in params if one.kind in (one.POSITIONAL_ONLY, one.POSITIONAL_OR_KEYWORD)]
+    return len(positional) >= 2 or any(one.kind == one.VAR_POSITIONAL or one.name == "tables" for one in params)
+
+
+def _execute_code(code: str, df: pd.DataFrame, tables: Optional[SessionTables] = None,
+                  key_index_dir: Optional[str] = None) -> Any:
+    """
+    Defines `analyze_data` from `code` in a fresh namespace and calls it on
+    `df`, and on every session table as `tables` when it accepts them. The
+    code can call `keyed(table_name, column)` for a table indexed by a join key.
+    """
+    tables = tables if tables is not None else SessionTables([], lambda name: df)
+    scope: Dict[str, Any] = {
+        "__builtins__": __builtins__, "pd": pd, "np": np, "keyed": make_keyed(tables, key_index_dir)
+    }
+    exec(code, scope)
+    analyze_data = scope['analyze_data']
+    return analyze_data(df, tables) if _takes_tables(analyze_data) else analyze_data(df)
+
+
+class InProcessExecutor:
+    """
+    Runs generated code inside the API process, as the original executor did.
+    There is no timeout or memory limit; use it for debugging.
+    """
+
+    language = "python"
+
+    def __init__(self, processed_tables: Dict[str, Any], key_index_dir: Optional[str] = None):
+        self.processed_tables = processed_tables
+        self.key_index_dir = key_index_dir
+
+    def run(self, code: str, table_name: str, sample_rows: Optional[int] = None) -> ExecutionOutcome:
+        def load(name):
+            df = self.processed_tables[name].df
+            return df.head(sample_rows).copy() if sample_rows else df.copy()
+
+        try:
+            df = load(table_name)
+            tables = SessionTables(self.processed_tables, load, {table_name: df})
+            key_index_dir = None if sample_rows else self.key_index_dir
+            return ExecutionOutcome(_execute_code(code, df, tables, key_index_dir), None, None)
+        except Exception as e:
+            return ExecutionOutcome(None, str(e), traceback.format_exc())
+
+
+# --- Worker process side ---
+
+# Tables memory-mapped by this worker, keyed by (path, mtime)
+_WORKER_TABLES: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_WORKER_TABLE_CACHE_SIZE = 8
+
+
+def _init_worker(memory_limit_mb: int) -> None:
+    """Applies the per-worker memory limit and copy-on-write semantics."""
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        # RLIMIT_DATA caps heap/anonymous memory without counting the
+        # memory-mapped table files; fall back to RLIMIT_AS elsewhere.
+        which = getattr(resource, "RLIMIT_DATA", resource.RLIMIT_AS)
+        resource.setrlimit(which, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    try:
+        # Lets every attempt get a cheap shallow copy of the shared table
+        pd.set_option("mode.copy_on_write", True)
+    except Exception:
+        pass
+
+
+def _load_worker_table(table_path: str) -> pd.DataFrame:
+    key = (table_path, os.path.getmtime(table_path))
+    if key in _WORKER_TABLES:
+        _WORKER_TABLES.move_to_end(key)
+        return _WORKER_TABLES[key]
+
+    df = read_columnar(table_path, SESSION_DATA_TYPE)
+
+    _WORKER_TABLES[key] = df
+    while len(_WORKER_TABLES) > _WORKER_TABLE_CACHE_SIZE:
+        _WORKER_TABLES.popitem(last=False)
+    return df
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError("Code execution exceeded the time limit.")
+
+
+def _run_in_worker(code: str, table_path: str, timeout: float, sample_rows: Optional[int] = None,
+                   table_paths: Optional[Dict[str, str]] = None, key_index_dir: Optional[str] = None) -> ExecutionOutcome:
+    """
+    Entry point executed inside a pool worker for one attempt (on the first
+    `sample_rows` rows of every table if given). `table_paths` maps every
+    session table to its Arrow file, for code that reads several tables.
+    """
+    use_alarm = hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    def load(path):
+        df = _load_worker_table(path)
+        return df.head(sample_rows).copy() if sample_rows else df.copy(deep=False)
+
+    try:
+        df = load(table_path)
+        table_paths = table_paths or {}
+        loaded = {name: df for name, path in table_paths.items() if path == table_path}
+        tables = SessionTables(table_paths, lambda name: load(table_paths[name]), loaded)
+        result = _execute_code(code, df, tables, None if sample_rows else key_index_dir)
+    except BaseException as e:
+        return ExecutionOutcome(None, str(e) or type(e).__name__, traceback.format_exc())
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    try:
+        pickle.dumps(result)
+    except Exception:
+        # Results must travel back to the API process; fall back to their text form
+        result = str(result)
+    return ExecutionOutcome(result, None, None)
+
+
+# --- API process side ---
+
+def _session_table_path(processed_tables: Dict[str, Any], table_dir: str, table_name: str) -> str:
+    """Path of a session table's Arrow file, written from `processed_tables` if the session has none yet."""
+    table_path = os.path.join(table_dir, f"{table_name}.{SESSION_DATA_TYPE}")
+    if os.path.exists(table_path):
+        return table_path
+    return publish_table(processed_tables[table_name].df, table_path)
+
+
+# Shared by every session; a stuck or crashed task retires it without failing the others
+_pool = SharedProcessPool(CODE_EXECUTOR_WORKERS, _init_worker, (CODE_EXECUTION_MEMORY_LIMIT_MB,))
+
+
+class ProcessPoolExecutorBackend:
+    """
+    Runs generated code in a shared pool of worker processes.
+
+    Each attempt gets a wall-clock timeout and the workers run under a memory
+    limit, so a runaway analytic cannot stall or OOM the API process. Tables
+    reach the workers as the session's memory-mapped Arrow files (written
+    here if the session has none yet), and independent analytics
+    submitted from different threads run in parallel across cores. A worker
+    maps the other session tables, and their precomputed key indexes, only
+    when the code reads them.
+    """
+
+    language = "python"
+
+    def __init__(self, processed_tables: Dict[str, Any], table_dir: str,
+                 timeout: float = CODE_EXECUTION_TIMEOUT_SECONDS, key_index_dir: Optional[str] = None):
+        self.processed_tables = processed_tables
+        self.table_dir = table_dir
+        self.timeout = timeout
+        self.key_index_dir = key_index_dir
+
+    def run(self, code: str, table_name: str, sample_rows: Optional[int] = None) -> ExecutionOutcome:
+        try:
+            table_paths = {
+                name: _session_table_path(self.processed_tables, self.table_dir, name)
+                for name in self.processed_tables
+            }
+            table_path = table_paths[table_name]
+        except Exception as e:
+            return ExecutionOutcome(None, str(e), traceback.format_exc())
+
+        try:
+            return _pool.run(_run_in_worker, code, table_path, self.timeout, sample_rows, table_paths,
+                             self.key_index_dir, timeout=self.timeout + _HARD_TIMEOUT_GRACE_SECONDS)
+        except FutureTimeoutError:
+            return ExecutionOutcome(None, f"Code execution exceeded the time limit of {self.timeout}s.", None)
+        except Exception as e:
+            # e.g. BrokenProcessPool when the code got its worker killed for exceeding its memory
+            return ExecutionOutcome(None, f"Execution worker failed: {e!r}", traceback.format_exc())
+
+
+# --- DuckDB backend ---
+
+# Arrow tables memory-mapped by this process, keyed by (path, mtime)
+_ARROW_TABLES: "OrderedDict[tuple, Any]" = OrderedDict()
+_ARROW_TABLE_CACHE_SIZE = 8
+_arrow_tables_lock = threading.Lock()
+
+
+def _load_arrow_table(table_path: str):
+    """Memory-maps a session's Arrow file; the table is shared by every query and never copied."""
+    import pyarrow as pa
+
+    key = (table_path, os.path.getmtime(table_path))
+    with _arrow_tables_lock:
+        if key in _ARROW_TABLES:
+            _ARROW_TABLES.move_to_end(key)
+            return _ARROW_TABLES[key]
+
+    table = pa.ipc.open_file(pa.memory_map(table_path, "r")).read_all()
+
+    with _arrow_tables_lock:
+        _ARROW_TABLES[key] = table
+        while len(_ARROW_TABLES) > _ARROW_TABLE_CACHE_SIZE:
+            _ARROW_TABLES.popitem(last=False)
+    return table
+
+
+def _sql_traceback(error: BaseException) -> str:
+    """DuckDB errors carry no useful Python traceback; their class and message are the diagnosis."""
+    return f"{type(error).__module__}.{type(error).__name__}: {error}"
+
+
+def check_single_select(sql: str) -> None:
+    """Raises ValueError unless `sql` is exactly one SELECT (or WITH ... SELECT) statement."""
+    import duckdb
+
+    statements = duckdb.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError(f"Expected a single SELECT statement, got {len(statements)} statement(s): "
+                         + ", ".join(one.type.name for one in statements))
+
+
+class DuckDBExecutor:
+    """
+    Runs generated SQL on an embedded DuckDB database instead of pandas code.
+
+    Every session table is registered zero-copy under its own name from the
+    session's memory-mapped Arrow file, so a query can read any of them.
+    Queries run multithreaded within the memory limit, spill to the session
+    folder beyond it, and are interrupted at the timeout. File system access
+    from SQL is disabled and only a single SELECT statement is accepted.
+    Results come back as DataFrames.
+    """
+
+    language = "sql"
+
+    def __init__(self, processed_tables: Dict[str, Any], table_dir: str,
+                 timeout: float = CODE_EXECUTION_TIMEOUT_SECONDS, threads: int = DUCKDB_THREADS,
+                 memory_limit_mb: int = CODE_EXECUTION_MEMORY_LIMIT_MB):
+        self.processed_tables = processed_tables
+        self.table_dir = table_dir
+        self.timeout = timeout
+        self.threads = threads
+        self.memory_limit_mb = memory_limit_mb
+
+    def _connect(self, sample_rows: Optional[int] = None):
+        import duckdb
+
+        connection = duckdb.connect(config={
+            "threads": self.threads,
+            "memory_limit": f"{self.memory_limit_mb}MB",
+            "temp_directory": os.path.join(os.path.dirname(self.table_dir), "duckdb_tmp"),
+        })
+        for table_name in self.processed_tables:
+            table = _load_arrow_table(_session_table_path(self.processed_tables, self.table_dir, table_name))
+            connection.register(table_name, table.slice(0, sample_rows) if sample_rows else table)
+
+        # Generated SQL may only query the registered tables
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+        return connection
+
+    def check(self, sql: str) -> Optional[ExecutionOutcome]:
+        """
+        Parses and binds `sql` against the session tables without running it.
+
+        Returns:
+            ExecutionOutcome or None: The error, or None if the query is valid.
+        """
+        try:
+            check_single_select(sql)
+            connection = self._connect()
+            try:
+                connection.sql(sql)
+            finally:
+                connection.close()
+        except Exception as e:
+            return ExecutionOutcome(None, str(e), _sql_traceback(e))
+        return None
+
+    def run(self, code: str, table_name: str, sample_rows: Optional[int] = None) -> ExecutionOutcome:
+        """Runs the query `code` (on the first `sample_rows` rows of every table if given)."""
+        import duckdb
+
+        try:
+            check_single_select(code)
+            connection = self._connect(sample_rows)
+        except Exception as e:
+            return ExecutionOutcome(None, str(e), _sql_traceback(e))
+
+        timer = threading.Timer(self.timeout, connection.interrupt)
+        timer.start()
+        try:
+            return ExecutionOutcome(connection.execute(code).df(), None, None)
+        except duckdb.InterruptException:
+            return ExecutionOutcome(None, f"Code execution exceeded the time limit of {self.timeout}s.", None)
+        except Exception as e:
+            return ExecutionOutcome(None, str(e), _sql_traceback(e))
+        finally:
+            timer.cancel()
+            connection.close()
+
+
+def get_code_executor(processed_tables: Dict[str, Any], session_path: str):
+    """
+    Returns the configured executor backend for a session.
+
+    Args:
+        processed_tables (dict): Mapping of table name to Table(df, schema).
+        session_path (str): The session directory; the process and duckdb
+            backends read the session's columnar table files from it, and the
+            python backends its precomputed join key indexes.
+    """
+    key_index_dir = os.path.join(session_path, KEY_INDEX_DIR)
+    if CODE_EXECUTOR_BACKEND == "inprocess":
+        return InProcessExecutor(processed_tables, key_index_dir)
+    if CODE_EXECUTOR_BACKEND == "process":
+        return ProcessPoolExecutorBackend(processed_tables, os.path.join(session_path, COLUMNAR_DIR),
+                                          key_index_dir=key_index_dir)
+    if CODE_EXECUTOR_BACKEND == "duckdb":
+        return DuckDBExecutor(processed_tables, os.path.join(session_path, COLUMNAR_DIR))
+    raise ValueError(f"Unsupported code executor backend: {CODE_EXECUTOR_BACKEND!r}")
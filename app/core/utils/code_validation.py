@@ -0,0 +1,363 @@
+import os
+import ast
+import difflib
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+CODE_VALIDATION_ENABLED = os.getenv("CODE_VALIDATION_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+# Rows of the table used for the trial run; 0 disables the trial run
+CODE_VALIDATION_SAMPLE_ROWS = max(0, int(os.getenv("CODE_VALIDATION_SAMPLE_ROWS", "50")))
+
+ENTRY_POINT = "analyze_data"
+
+# Errors raised on the sample that would be raised on the full table too.
+# Others (KeyError, IndexError, ValueError, ...) can be caused by the sample
+# lacking some rows or values, so the code still gets its full run.
+_DETERMINISTIC_ERRORS = {
+    "NameError", "AttributeError", "TypeError", "ImportError",
+    "ModuleNotFoundError", "UnboundLocalError", "SyntaxError",
+}
+
+# Tracebacks passed to the correction prompt keep only their last lines
+_TRACEBACK_MAX_LINES = 25
+
+
+class CodeDiagnostic(NamedTuple):
+    check: str
+    message: str
+    line: Optional[int] = None
+
+
+def format_diagnostics(diagnostics: List[CodeDiagnostic]) -> str:
+    """Renders diagnostics as the bullet list shown in the correction prompt."""
+    return "\n".join(
+        f"- [{one.check}]" + (f" line {one.line}" if one.line else "") + f": {one.message}"
+        for one in diagnostics
+    )
+
+
+def trim_traceback(tb: Optional[str]) -> str:
+    if not tb:
+        return "Not available."
+    return "\n".join(tb.strip().splitlines()[-_TRACEBACK_MAX_LINES:])
+
+
+def check_syntax(code: str):
+    """
+    Parses `code`.
+
+    Returns:
+        tuple: (ast.Module or None, list of CodeDiagnostic).
+    """
+    try:
+        return ast.parse(code), []
+    except SyntaxError as e:
+        return None, [CodeDiagnostic("syntax", f"{e.msg}: {(e.text or '').strip()}", e.lineno)]
+
+
+def check_signature(tree: ast.Module) -> List[CodeDiagnostic]:
+    """
+    Checks for a top-level `analyze_data` function callable with the table
+    and, optionally, the mapping of every session table as `tables`.
+    """
+    functions = [node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    entry = next((node for node in functions if node.name == ENTRY_POINT), None)
+
+    if entry is None:
+        defined = ", ".join(node.name for node in functions) or "none"
+        return [CodeDiagnostic("signature", f"No top-level function named `{ENTRY_POINT}` (functions defined: {defined}).")]
+    if isinstance(entry, ast.AsyncFunctionDef):
+        return [CodeDiagnostic("signature", f"`{ENTRY_POINT}` must be a regular function, not async.", entry.lineno)]
+
+    args = entry.args
+    positional = args.posonlyargs + args.args
+    required = len(positional) - len(args.defaults)
+    required_kwonly = [arg.arg for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is None]
+
+    if not positional and args.vararg is None:
+        return [CodeDiagnostic("signature", f"`{ENTRY_POINT}` must take the DataFrame `df` as its argument.", entry.lineno)]
+    if required > 2 or required_kwonly:
+        return [CodeDiagnostic(
+            "signature",
+            f"`{ENTRY_POINT}` is called with the DataFrame `df` and the session tables `tables` only, "
+            f"but requires more arguments.",
+            entry.lineno,
+        )]
+    return []
+
+
+def _string_constants(node: ast.AST) -> List[ast.Constant]:
+    """String literals of a subscript key: 'a', ['a', 'b'] or ('a', 'b')."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [one for one in node.elts if isinstance(one, ast.Constant) and isinstance(one.value, str)]
+    return []
+
+
+def _created_names(tree: ast.Module) -> Set[str]:
+    """
+    Names the code itself introduces and may later look up: assigned
+    subscripts (df['new'] = ...), keyword names (assign(new=...),
+    agg(total=...)), `name=`/`columns=` values and dict literal keys or values.
+    """
+    created: Set[str] = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store):
+            created.update(one.value for one in _string_constants(node.slice))
+        elif isinstance(node, ast.keyword):
+            if node.arg:
+                created.add(node.arg)
+            if node.arg in {"name", "names", "columns", "new_column"}:
+                created.update(one.value for one in _string_constants(node.value))
+        elif isinstance(node, ast.Dict):
+            for key_or_value in node.keys + node.values:
+                if key_or_value is not None:
+                    created.update(one.value for one in _string_constants(key_or_value))
+
+    return created
+
+
+def _entry_function(tree: ast.Module) -> Optional[ast.FunctionDef]:
+    return next((node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == ENTRY_POINT), None)
+
+
+def _table_argument(tree: ast.Module) -> Optional[str]:
+    """Name of the parameter `analyze_data` receives the table in."""
+    entry = _entry_function(tree)
+    if entry is None:
+        return None
+    positional = entry.args.posonlyargs + entry.args.args
+    return positional[0].arg if positional else None
+
+
+def _rebinds(node: ast.AST, name: str) -> bool:
+    """True for `name = ...` (or any other store or del) and `name.method(..., inplace=True)`."""
+    if isinstance(node, ast.Name):
+        return node.id == name and isinstance(node.ctx, (ast.Store, ast.Del))
+    return (
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+        and isinstance(node.func.value, ast.Name) and node.func.value.id == name
+        and any(kw.arg == "inplace" and isinstance(kw.value, ast.Constant) and kw.value.value is True
+                for kw in node.keywords)
+    )
+
+
+def _table_rebound_at(tree: ast.Module, table_argument: str) -> Optional[tuple]:
+    """
+    Position (line, column) in `analyze_data` from which the table argument
+    may no longer hold the table: the end of the first statement rebinding it
+    (df = df.reset_index(), df.rename(..., inplace=True)), or the start of the
+    loop such a statement is in. None if it is never rebound.
+    """
+    entry = _entry_function(tree)
+    positions = []
+    for node in ast.walk(entry) if entry is not None else []:
+        if not isinstance(node, ast.stmt) or node is entry:
+            continue
+        if not any(_rebinds(one, table_argument) for one in ast.walk(node)):
+            continue
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            positions.append((node.lineno, node.col_offset))
+        else:
+            positions.append((node.end_lineno, node.end_col_offset))
+    return min(positions, default=None)
+
+
+def _reads_other_tables(tree: ast.Module) -> bool:
+    """True if the code can join other session tables: `analyze_data` takes `tables`, or it calls `keyed`."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name == ENTRY_POINT:
+            if len(node.args.posonlyargs + node.args.args) > 1 or node.args.vararg is not None:
+                return True
+        elif isinstance(node, ast.Name) and node.id == "keyed":
+            return True
+    return False
+
+
+def _column_lookups(node: ast.Subscript, table_argument: str) -> List[ast.Constant]:
+    """Column literals of df['x'], df[['x', 'y']] and df.loc[rows, 'x']."""
+    base = node.value
+    if isinstance(base, ast.Name) and base.id == table_argument:
+        return _string_constants(node.slice)
+    if (isinstance(base, ast.Attribute) and base.attr == "loc" and isinstance(base.value, ast.Name)
+            and base.value.id == table_argument and isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2):
+        return _string_constants(node.slice.elts[1])
+    return []
+
+
+def check_column_literals(tree: ast.Module, columns: List[str], table_name: str,
+                          joined_columns: Optional[List[str]] = None) -> List[CodeDiagnostic]:
+    """
+    Flags string literals looked up as columns of the table argument
+    (df['x'], df[['x', 'y']], df.loc[:, 'x']) that are neither a column of
+    the table nor created by the code itself. Lookups on derived objects
+    (group results, Series, dicts) are not checked, and neither are lookups
+    after the code rebinds the table argument (df = df.melt(...)), whose
+    columns are unknown. `joined_columns` (the columns of the other session
+    tables) also count when the code reads other tables.
+    """
+    table_argument = _table_argument(tree)
+    if table_argument is None:
+        return []
+    rebound_at = _table_rebound_at(tree, table_argument)
+
+    where = f"table {table_name!r}"
+    if joined_columns and _reads_other_tables(tree):
+        columns = list(columns) + [col for col in joined_columns if col not in columns]
+        where += " or the tables it joins"
+    known = set(columns) | _created_names(tree)
+    diagnostics = []
+    reported: Set[str] = set()
+
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load)):
+            continue
+        for literal in _column_lookups(node, table_argument):
+            name = literal.value
+            if name in known or name in reported:
+                continue
+            if rebound_at is not None and (literal.lineno, literal.col_offset) >= rebound_at:
+                continue
+            reported.add(name)
+            close = difflib.get_close_matches(name, columns, n=3, cutoff=0.6)
+            hint = f" Did you mean {', '.join(repr(one) for one in close)}?" if close else ""
+            diagnostics.append(CodeDiagnostic(
+                "columns",
+                f"Column {name!r} is not in {where}.{hint} "
+                f"Available columns: {', '.join(map(str, columns))}.",
+                literal.lineno,
+            ))
+
+    return diagnostics
+
+
+def validate_code_statically(code: str, columns: List[str], table_name: str,
+                             joined_columns: Optional[List[str]] = None) -> List[CodeDiagnostic]:
+    """Runs the syntax, signature and column checks; stops at the first failing stage."""
+    tree, diagnostics = check_syntax(code)
+    if tree is None:
+        return diagnostics
+
+    diagnostics = check_signature(tree)
+    if diagnostics:
+        return diagnostics
+
+    return check_column_literals(tree, columns, table_name, joined_columns)
+
+
+def error_type(tb: Optional[str]) -> str:
+    """Exception class name from the last line of a formatted traceback."""
+    last_line = (tb or "").strip().splitlines()[-1:] or [""]
+    return last_line[0].split(":", 1)[0].rsplit(".", 1)[-1].strip()
+
+
+class CodeValidationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.analytics = 0
+        self.executions = 0
+        self.round_trips = 0
+        self.static_rejections = 0
+        self.sample_rejections = 0
+        self.failed_analytics = 0
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "analytics": self.analytics,
+                "executions": self.executions,
+                "round_trips": self.round_trips,
+                "round_trips_per_analytic": round(self.round_trips / self.analytics, 3) if self.analytics else 0.0,
+                "static_rejections": self.static_rejections,
+                "sample_rejections": self.sample_rejections,
+                "failed_analytics": self.failed_analytics,
+            }
+
+
+_stats = CodeValidationStats()
+
+
+def record_analytic(**deltas: int) -> None:
+    """Adds one analytic's counters (round_trips, executions, ...) to the process-wide metrics."""
+    _stats.add(analytics=1, **deltas)
+
+
+def code_validation_stats() -> Dict[str, Any]:
+    return {"enabled": CODE_VALIDATION_ENABLED, "sample_rows": CODE_VALIDATION_SAMPLE_ROWS, **_stats.to_dict()}
+
+
+class CodeValidator:
+    """
+    Checks generated code before its full run: `ast` syntax and entry point
+    signature checks, subscripted column names against the table, then a
+    trial run on the first rows of the table through the session's executor.
+    SQL for the duckdb executor is instead parsed and bound against the
+    session tables, which reports unknown tables and columns without running it.
+
+    Args:
+        processed_tables (dict): Mapping of table name to Table(df, schema).
+        executor: The backend returned by `get_code_executor`.
+        sample_rows (int): Rows of the trial run; tables no larger than this
+            skip it, since the full run is just as cheap.
+    """
+
+    def __init__(self, processed_tables: Dict[str, Any], executor, sample_rows: int = CODE_VALIDATION_SAMPLE_ROWS):
+        self.processed_tables = processed_tables
+        self.executor = executor
+        self.sample_rows = sample_rows
+
+    def validate(self, code: str, table_name: str):
+        """
+        Returns:
+            tuple: (list of CodeDiagnostic, traceback text or None). An empty
+            list means the code may run on the full table.
+        """
+        if getattr(self.executor, "language", "python") == "sql":
+            outcome = self.executor.check(code)
+            if outcome is None:
+                return [], None
+            _stats.add(static_rejections=1)
+            return [CodeDiagnostic("sql", outcome.error)], outcome.traceback
+
+        table = self.processed_tables.get(table_name)
+        if table is None:
+            # Let the executor report the unknown table
+            return [], None
+
+        columns = [str(col) for col in table.df.columns]
+        joined_columns = [
+            str(col) for name, other in self.processed_tables.items() if name != table_name for col in other.df.columns
+        ]
+        diagnostics = validate_code_statically(code, columns, table_name, joined_columns)
+        if diagnostics:
+            _stats.add(static_rejections=1)
+            return diagnostics, None
+
+        if not self.sample_rows or len(table.df) <= self.sample_rows:
+            return [], None
+
+        outcome = self.executor.run(code, table_name, sample_rows=self.sample_rows)
+        _stats.add(executions=1)
+        if outcome.error is None or error_type(outcome.traceback) not in _DETERMINISTIC_ERRORS:
+            return [], None
+
+        _stats.add(sample_rejections=1)
+        return [CodeDiagnostic(
+            "sample_run",
+            f"Running `{ENTRY_POINT}` on the first {self.sample_rows} rows raised "
+            f"{error_type(outcome.traceback)}: {outcome.error}",
+        )], outcome.traceback
+
+
+def get_code_validator(processed_tables: Dict[str, Any], executor) -> Optional[CodeValidator]:
+    """Returns a validator for the session's tables, or None if validation is disabled."""
+    if not CODE_VALIDATION_ENABLED:
+        return None
+    return CodeValidator(processed_tables, executor)
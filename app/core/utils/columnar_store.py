@@ -0,0 +1,130 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .load_data import Table
+
+# Extensions load_data accepts for columnar tables. "arrow" and "feather" are
+# the (uncompressed) Arrow IPC file format and can be memory-mapped zero-copy.
+COLUMNAR_DATA_TYPES = ("arrow", "feather", "parquet")
+
+# Columnar session tables are written under <session_path>/<COLUMNAR_DIR>
+COLUMNAR_DIR = "arrow"
+SESSION_DATA_TYPE = "arrow"
+
+_write_lock = threading.Lock()
+
+
+def schema_file_name(table_name: str) -> str:
+    """Base name of the columnar copy of a table's schema."""
+    return f"{table_name}_schema"
+
+
+def write_columnar(df: pd.DataFrame, file_path: str, data_type: str = SESSION_DATA_TYPE) -> str:
+    """
+    Writes a DataFrame in a columnar format, atomically.
+
+    Args:
+        df (pd.DataFrame): The table to write; its index is not stored.
+        file_path (str): Destination path, including the extension.
+        data_type (str): One of COLUMNAR_DATA_TYPES.
+
+    Returns:
+        str: `file_path`.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+
+    if data_type in {"arrow", "feather"}:
+        # Uncompressed IPC file so readers can memory-map it without decoding
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    elif data_type == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_path)
+    else:
+        raise ValueError(f"Unsupported columnar file type: {data_type!r}")
+
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def _nullable_pandas_type(arrow_type):
+    """Maps Arrow integer/boolean types onto pandas' nullable dtypes."""
+    import pyarrow as pa
+
+    if pa.types.is_integer(arrow_type):
+        return pd.api.types.pandas_dtype(str(arrow_type).replace("int", "Int").replace("uInt", "UInt"))
+    if pa.types.is_boolean(arrow_type):
+        return pd.BooleanDtype()
+    return None
+
+
+def read_columnar(file_path: str, data_type: str = SESSION_DATA_TYPE) -> pd.DataFrame:
+    """
+    Reads a columnar file into a DataFrame. Arrow/Feather files are memory-mapped,
+    so float and datetime columns without nulls are not copied. Integer and
+    boolean columns come back as pandas' nullable dtypes, which copies them.
+    """
+    import pyarrow as pa
+
+    if data_type in {"arrow", "feather"}:
+        source = pa.memory_map(file_path, "r")
+        table = pa.ipc.open_file(source).read_all()
+    elif data_type == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(file_path, memory_map=True)
+    else:
+        raise ValueError(f"Unsupported columnar file type: {data_type!r}")
+
+    # split_blocks avoids consolidating columns into 2D blocks, which would copy them
+    return table.to_pandas(split_blocks=True, types_mapper=_nullable_pandas_type)
+
+
+def save_session_tables(tables: Dict[str, "Table"], columnar_path: str,
+                        data_type: str = SESSION_DATA_TYPE) -> List[str]:
+    """
+    Persists preprocessed tables (and their schemas) once in a columnar format,
+    so later loads can memory-map them instead of re-parsing the CSV and
+    re-running preprocessing.
+
+    Returns:
+        List[str]: The saved table names, in order.
+    """
+    os.makedirs(columnar_path, exist_ok=True)
+
+    with _write_lock:
+        for table_name, table in tables.items():
+            write_columnar(table.df, os.path.join(columnar_path, f"{table_name}.{data_type}"), data_type)
+            write_columnar(table.schema, os.path.join(columnar_path, f"{schema_file_name(table_name)}.{data_type}"), data_type)
+
+    return list(tables.keys())
+
+
+def load_session_tables(columnar_path: str, table_names: List[str],
+                        data_type: str = SESSION_DATA_TYPE) -> Dict[str, "Table"]:
+    """Loads tables saved by `save_session_tables`."""
+    from .load_data import load_data
+
+    return load_data(
+        table_names,
+        [schema_file_name(name) for name in table_names],
+        columnar_path,
+        columnar_path,
+        data_type=data_type,
+    )
+
+
+def publish_table(df: pd.DataFrame, file_path: str, data_type: str = SESSION_DATA_TYPE) -> str:
+    """Writes `df` to `file_path` unless the file already exists."""
+    with _write_lock:
+        if not os.path.exists(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            write_columnar(df, file_path, data_type)
+    return file_path
@@ -0,0 +1,58 @@
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# One process-wide cap on in-flight LLM calls, shared by every report stage
+# and every concurrent request. Configure with the LLM_MAX_CONCURRENCY env var.
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+
+_llm_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+def invoke_with_limit(chain, inputs: Dict[str, Any]) -> Any:
+    """
+    Invokes a LangChain runnable while holding a slot of the global LLM
+    concurrency limit.
+
+    Args:
+        chain: Any runnable exposing `invoke` (e.g. `prompt | llm | parser`).
+        inputs (dict): The prompt variables for the chain.
+
+    Returns:
+        The chain output.
+    """
+    with _llm_semaphore:
+        return chain.invoke(inputs)
+
+
+def run_concurrently(func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+    """
+    Applies `func` to every item on a thread pool and returns the results in
+    the same order as `items`, so downstream output stays deterministic.
+
+    The pool is sized to the global LLM concurrency limit; the actual number of
+    simultaneous LLM calls is still bounded by `invoke_with_limit`. Each item
+    runs in a copy of the caller's context, so graph-scoped helpers such as
+    `emit_progress` keep working on the pool threads.
+
+    Args:
+        func (Callable): The per-item work, typically one analytic.
+        items (Iterable): The inputs to fan out over.
+
+    Returns:
+        List: One result per item, in input order.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+
+    # One context copy per item: a Context cannot be entered by two threads at once
+    contexts = [contextvars.copy_context() for _ in items]
+
+    with ThreadPoolExecutor(max_workers=min(LLM_MAX_CONCURRENCY, len(items))) as executor:
+        return list(executor.map(lambda ctx, item: ctx.run(func, item), contexts, items))
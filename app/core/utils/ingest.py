@@ -0,0 +1,130 @@
+import os
+import time
+from typing import Any, BinaryIO, Dict, NamedTuple, Optional
+
+from .columnar_store import SESSION_DATA_TYPE
+
+# Bytes parsed per block; also the unit of multithreaded parsing and the size
+# of the record batches spooled to disk.
+INGEST_BLOCK_SIZE = int(os.getenv("INGEST_BLOCK_SIZE", str(16 * 1024 * 1024)))
+
+
+class IngestStats(NamedTuple):
+    bytes_read: int
+    rows: int
+    seconds: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        seconds = max(self.seconds, 1e-9)
+        return {
+            "bytes_read": self.bytes_read,
+            "rows": self.rows,
+            "seconds": round(self.seconds, 4),
+            "mb_per_s": round(self.bytes_read / (1024 * 1024) / seconds, 2),
+            "rows_per_s": round(self.rows / seconds, 1),
+        }
+
+
+class _CountingReader:
+    """Wraps a binary stream and counts the bytes pulled from it."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.bytes_read = 0
+        self.closed = False
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _spool_csv(stream: BinaryIO, out_path: str, convert_options) -> IngestStats:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    started = time.perf_counter()
+    counting_stream = _CountingReader(stream)
+    reader = pa_csv.open_csv(
+        counting_stream,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=INGEST_BLOCK_SIZE),
+        convert_options=convert_options,
+    )
+
+    rows = 0
+    tmp_path = f"{out_path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    os.replace(tmp_path, out_path)
+
+    return IngestStats(counting_stream.bytes_read, rows, time.perf_counter() - started)
+
+
+def ingest_csv_stream(stream: BinaryIO, out_path: str, convert_options: Optional[Any] = None) -> IngestStats:
+    """
+    Parses a CSV upload stream block by block with pyarrow's multithreaded
+    reader and writes every record batch to an Arrow IPC file as it is parsed,
+    so the CSV is never loaded into memory whole or parsed twice (by pandas
+    and again for typing).
+
+    Uploads reach the handler as Starlette's `UploadFile`, which has already
+    received the whole request body into a temporary file (in memory up to
+    1 MB, on disk beyond). The CSV is therefore parsed from that spooled copy
+    once the upload has finished, not as it arrives. The spooled copy is also
+    what lets a failed typed parse rewind and retry.
+
+    Column types are inferred from the first block unless `convert_options`
+    pins them. If the data does not fit the types (e.g. a later block breaks
+    the inferred types), the stream is rewound and ingested again with the
+    next candidate options, and finally with every column read as text,
+    leaving type conversion to `preprocess_tables`.
+
+    Args:
+        stream (BinaryIO): The upload stream (e.g. `UploadFile.file`), positioned at the start.
+        out_path (str): Destination Arrow file (loadable with data_type="arrow").
+        convert_options (pyarrow.csv.ConvertOptions or list, optional):
+            Reader-level type options, or candidates to try in order.
+
+    Returns:
+        IngestStats: Bytes read, rows and elapsed time of the ingest.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    candidates = convert_options if isinstance(convert_options, list) else [convert_options]
+    for attempt, one_options in enumerate(candidates):
+        if attempt:
+            stream.seek(0)
+        try:
+            return _spool_csv(stream, out_path, one_options)
+        except pa.ArrowInvalid as e:
+            if not hasattr(stream, "seek"):
+                raise
+            print(f"Typed CSV parsing failed ({e}); retrying with looser types.")
+
+    stream.seek(0)
+    header = pa_csv.open_csv(stream, read_options=pa_csv.ReadOptions(block_size=INGEST_BLOCK_SIZE)).schema.names
+    stream.seek(0)
+
+    return _spool_csv(stream, out_path, pa_csv.ConvertOptions(column_types={name: pa.string() for name in header}))
+
+
+def ingested_file_name(upload_name: Optional[str], default: str) -> str:
+    """Base table name for an uploaded CSV (its file name without `.csv`)."""
+    return os.path.basename(upload_name or default).replace(".csv", "")
+
+
+def ingested_file_path(directory: str, table_name: str) -> str:
+    """Path of the spooled columnar file for `table_name` in `directory`."""
+    return os.path.join(directory, f"{table_name}.{SESSION_DATA_TYPE}")
@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+JOIN_KEY_DETECTION_ENABLED = os.getenv("JOIN_KEY_DETECTION_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+# Rows sampled from each column to measure value overlap
+JOIN_KEY_SAMPLE_ROWS = max(100, int(os.getenv("JOIN_KEY_SAMPLE_ROWS", "10000")))
+# Share of a column's sampled distinct values that must exist in the key column
+JOIN_KEY_MIN_OVERLAP = float(os.getenv("JOIN_KEY_MIN_OVERLAP", "0.9"))
+# Share of distinct values among non-null values for a column to identify rows
+JOIN_KEY_MIN_UNIQUE_RATIO = float(os.getenv("JOIN_KEY_MIN_UNIQUE_RATIO", "0.99"))
+
+JOIN_KEYS_FILE_NAME = "join_keys.json"
+# Sorted row order of every join key column, under <session_path>/<KEY_INDEX_DIR>
+KEY_INDEX_DIR = "key_indexes"
+
+# Name parts that say nothing about which entity a key refers to
+_GENERIC_NAME_PARTS = {"id", "key", "code", "no", "num", "number", "ref", "fk", "pk", "uid", "uuid"}
+
+
+def _key_kind(series: pd.Series) -> Optional[str]:
+    """Value family of a column that can hold keys; None for floats, booleans and the like."""
+    if pd.api.types.is_bool_dtype(series):
+        return None
+    if pd.api.types.is_integer_dtype(series):
+        return "integer"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if (pd.api.types.is_string_dtype(series) or pd.api.types.is_object_dtype(series)
+            or isinstance(series.dtype, pd.CategoricalDtype)):
+        return "string"
+    return None
+
+
+def _name_parts(name: str) -> set:
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(name))
+    parts = set()
+    for part in re.findall(r"[a-z0-9]+", name.lower()):
+        parts.add(part)
+        if len(part) > 3 and part.endswith("s"):
+            parts.add(part[:-1])
+    return parts
+
+
+def _names_related(column: str, ref_table: str, ref_column: str) -> bool:
+    """
+    True if a column's name points at a key: same name, or a shared
+    non-generic part (customer_id -> customers.id, CustomerID -> customer_id).
+    """
+    if column.lower() == ref_column.lower():
+        return True
+    specific = _name_parts(column) - _GENERIC_NAME_PARTS
+    return bool(specific & ((_name_parts(ref_column) | _name_parts(ref_table)) - _GENERIC_NAME_PARTS))
+
+
+def _sample(series: pd.Series, sample_rows: int) -> pd.Series:
+    non_null = series.dropna()
+    if len(non_null) > sample_rows:
+        non_null = non_null.sample(sample_rows, random_state=0)
+    return non_null
+
+
+def _comparable(values: pd.Series, kind: str) -> pd.Series:
+    # Categoricals and string dtypes compare by their text
+    return values.astype(str) if kind == "string" else values
+
+
+def _needs_related_names(kind: str, sample: pd.Series) -> bool:
+    """Numbers, dates and numeric text (ids read as strings) overlap by chance, so their names must match too."""
+    return kind != "string" or bool(sample.str.fullmatch(r"[-+]?\d+(\.\d+)?").all())
+
+
+def detect_join_keys(processed_tables: Dict[str, Any], sample_rows: int = JOIN_KEY_SAMPLE_ROWS,
+                     min_overlap: float = JOIN_KEY_MIN_OVERLAP,
+                     min_unique_ratio: float = JOIN_KEY_MIN_UNIQUE_RATIO) -> List[Dict[str, Any]]:
+    """
+    Finds candidate join keys between the tables of a session.
+
+    A column of one table joins a key column of another when the key column
+    identifies its rows (distinct values among non-null ones, at least
+    `min_unique_ratio`) and at least `min_overlap` of the column's sampled
+    distinct values exist in the key column. Integer and date columns must
+    also have related names, and so must text columns holding numbers,
+    since small numeric ranges overlap by chance.
+
+    Args:
+        processed_tables (dict): Mapping of table name to Table(df, schema).
+
+    Returns:
+        list: {"table", "column", "ref_table", "ref_column", "relationship"
+        ("many_to_one" or "one_to_one"), "overlap"} per candidate, best first.
+    """
+    if len(processed_tables) < 2:
+        return []
+
+    # Key columns: unique on a sample first, then confirmed on the full column
+    candidates: Dict[Tuple[str, str], Tuple[str, pd.Series, bool]] = {}
+    keys: Dict[Tuple[str, str], pd.Index] = {}
+    for tbl_name, tbl in processed_tables.items():
+        for col in tbl.df.columns:
+            series = tbl.df[col]
+            kind = _key_kind(series)
+            if kind is None:
+                continue
+            sample = _comparable(_sample(series, sample_rows), kind)
+            if sample.nunique() < 2:
+                continue
+            candidates[(tbl_name, str(col))] = (kind, sample, _needs_related_names(kind, sample))
+
+            if sample.nunique() >= min_unique_ratio * len(sample):
+                non_null = _comparable(series.dropna(), kind)
+                distinct = pd.Index(non_null.unique())
+                if len(distinct) >= min_unique_ratio * len(non_null):
+                    keys[(tbl_name, str(col))] = distinct
+
+    join_keys = []
+    for (ref_table, ref_column), key_values in keys.items():
+        ref_kind = candidates[(ref_table, ref_column)][0]
+        for (tbl_name, col), (kind, sample, needs_related_names) in candidates.items():
+            if tbl_name == ref_table or kind != ref_kind:
+                continue
+            if needs_related_names and not _names_related(col, ref_table, ref_column):
+                continue
+            # A one-to-one pair is reported once, from the first table to the second
+            if (tbl_name, col) in keys and (tbl_name, col) > (ref_table, ref_column):
+                continue
+
+            distinct = pd.Series(sample.unique())
+            overlap = float(distinct.isin(key_values).mean())
+            if overlap < min_overlap:
+                continue
+            join_keys.append({
+                "table": tbl_name,
+                "column": col,
+                "ref_table": ref_table,
+                "ref_column": ref_column,
+                "relationship": "one_to_one" if (tbl_name, col) in keys else "many_to_one",
+                "overlap": round(overlap, 3),
+            })
+
+    join_keys.sort(key=lambda one: (-one["overlap"], one["table"], one["column"]))
+    return join_keys
+
+
+def join_key_columns(join_keys: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """(table, column) of both sides of every join key, without duplicates."""
+    columns: Dict[Tuple[str, str], None] = {}
+    for one in join_keys:
+        columns[(one["table"], one["column"])] = None
+        columns[(one["ref_table"], one["ref_column"])] = None
+    return list(columns)
+
+
+def save_join_keys(join_keys: List[Dict[str, Any]], session_path: str) -> str:
+    path = os.path.join(session_path, JOIN_KEYS_FILE_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(join_keys, f, indent=2)
+    return path
+
+
+def load_join_keys(session_path: str) -> List[Dict[str, Any]]:
+    """Loads a session's detected join keys; empty if there are none."""
+    try:
+        with open(os.path.join(session_path, JOIN_KEYS_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+# --- Key indexes ---
+
+def key_index_path(key_index_dir: str, table_name: str, column: str) -> str:
+    return os.path.join(key_index_dir, f"{table_name}.{quote(column, safe='')}.npy")
+
+
+def sorted_order(series: pd.Series) -> np.ndarray:
+    """Row positions of `series` in ascending key order (nulls last)."""
+    return np.asarray(series.reset_index(drop=True).sort_values(kind="stable", na_position="last").index,
+                      dtype=np.int64)
+
+
+def save_key_indexes(processed_tables: Dict[str, Any], join_keys: List[Dict[str, Any]], session_path: str) -> List[str]:
+    """
+    Precomputes the sorted row order of every join key column once, so each
+    executor process builds a key-indexed table without sorting it again.
+    """
+    key_index_dir = os.path.join(session_path, KEY_INDEX_DIR)
+    os.makedirs(key_index_dir, exist_ok=True)
+
+    paths = []
+    for tbl_name, col in join_key_columns(join_keys):
+        path = key_index_path(key_index_dir, tbl_name, col)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp_path, sorted_order(processed_tables[tbl_name].df[col]))
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+# Key-indexed tables built by this process, keyed by (key index path, mtime, rows)
+_KEYED_TABLES: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_KEYED_TABLE_CACHE_SIZE = 8
+_keyed_tables_lock = threading.Lock()
+
+
+def keyed_table(df: pd.DataFrame, table_name: str, column: str, key_index_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Returns `df` indexed by `column`, in key order. The index is sorted (and
+    unique for the key side of a join), so joins and lookups on it use
+    pandas' binary-search and monotonic-merge paths.
+
+    The precomputed order from `key_index_dir` is used when it exists and
+    matches the table; the result is then cached for the process. Otherwise
+    the table is sorted on the spot (e.g. for trial runs on sampled rows).
+    Callers get a shallow copy, so code changing it in place (new columns,
+    `reset_index(inplace=True)`) leaves the cached table intact.
+    """
+    path = key_index_path(key_index_dir, table_name, column) if key_index_dir else None
+    cache_key = None
+    if path and os.path.exists(path):
+        cache_key = (path, os.path.getmtime(path), len(df))
+        with _keyed_tables_lock:
+            if cache_key in _KEYED_TABLES:
+                _KEYED_TABLES.move_to_end(cache_key)
+                return _KEYED_TABLES[cache_key].copy(deep=False)
+        order = np.load(path, mmap_mode="r")
+        if len(order) != len(df):
+            order, cache_key = sorted_order(df[column]), None
+    else:
+        order = sorted_order(df[column])
+
+    keyed = df.take(np.asarray(order)).set_index(column)
+
+    if cache_key is not None:
+        with _keyed_tables_lock:
+            _KEYED_TABLES[cache_key] = keyed
+            while len(_KEYED_TABLES) > _KEYED_TABLE_CACHE_SIZE:
+                _KEYED_TABLES.popitem(last=False)
+    return keyed.copy(deep=False)
+
+
+class SessionTables(Mapping):
+    """
+    Read-only mapping of every session table name to its DataFrame, handed to
+    generated code as `tables`. Each table is loaded on first access, so code
+    that only reads its own table pays for no other.
+    """
+
+    def __init__(self, table_names: Iterable[str], load: Callable[[str], pd.DataFrame],
+                 loaded: Optional[Dict[str, pd.DataFrame]] = None):
+        self._table_names = list(table_names)
+        self._load = load
+        self._loaded: Dict[str, pd.DataFrame] = dict(loaded or {})
+
+    def __getitem__(self, table_name: str) -> pd.DataFrame:
+        if table_name not in self._table_names:
+            raise KeyError(f"Unknown table {table_name!r}; the session tables are: {', '.join(self._table_names)}")
+        if table_name not in self._loaded:
+            self._loaded[table_name] = self._load(table_name)
+        return self._loaded[table_name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table_names)
+
+    def __len__(self) -> int:
+        return len(self._table_names)
+
+
+def make_keyed(tables: Mapping[str, pd.DataFrame], key_index_dir: Optional[str]) -> Callable[[str, str], pd.DataFrame]:
+    """The `keyed(table_name, column)` helper generated code calls to join on a key."""
+    def keyed(table_name: str, column: str) -> pd.DataFrame:
+        return keyed_table(tables[table_name], table_name, column, key_index_dir)
+    return keyed
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "app/data_storage/.llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class DiskLLMCache(BaseCache):
+    """
+    Content-addressed, disk-backed response cache for LangChain chat models.
+
+    Entries are keyed by the SHA-256 of the model configuration string (which
+    carries the model name and temperature) and the rendered prompt, and are
+    stored one JSON file per entry. Reading an entry refreshes its mtime, so
+    eviction by oldest mtime is least-recently-used. Entries older than the TTL
+    are treated as misses and removed.
+
+    Because the cache sits on the model, every `prompt | llm | parser` chain
+    (JsonOutputParser or StrOutputParser) benefits without changes.
+    """
+
+    def __init__(self, cache_dir: str = LLM_CACHE_DIR, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.expirations = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Hashes the (model configuration, rendered prompt) pair into a cache key."""
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _iter_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def _current_size(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(os.path.getsize(path) for path in self._iter_entries())
+        return self._total_bytes
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        if self._total_bytes is not None:
+            self._total_bytes -= size
+
+    def _evict(self) -> None:
+        """Drops least-recently-used entries until the cache is under its size limit."""
+        if self._current_size() <= self.max_bytes:
+            return
+
+        entries = sorted(self._iter_entries(), key=lambda path: os.path.getmtime(path))
+        # Evict down to 90% of the limit so we don't rescan on every write
+        target = int(self.max_bytes * 0.9)
+        for path in entries:
+            if self._current_size() <= target:
+                break
+            self._remove(path)
+            self.evictions += 1
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        path = self._entry_path(self.make_key(prompt, llm_string))
+
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            if self.ttl_seconds > 0 and time.time() - entry["created_at"] > self.ttl_seconds:
+                self._remove(path)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            # Touch the entry so LRU eviction sees it as recently used
+            os.utime(path, None)
+            self.hits += 1
+
+        return [loads(one) for one in entry["generations"]]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        path = self._entry_path(self.make_key(prompt, llm_string))
+        payload = json.dumps({
+            "created_at": time.time(),
+            "generations": [dumps(one) for one in return_val],
+        })
+
+        with self._lock:
+            # Sized before the entry is written, so a first scan does not count it twice
+            self._current_size()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                self._remove(path)
+
+            # Write to a temp file first so readers never see a partial entry
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+            self._total_bytes += os.path.getsize(path)
+            self.writes += 1
+            self._evict()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            for path in list(self._iter_entries()):
+                self._remove(path)
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current on-disk footprint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size_bytes": self._current_size(),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+_llm_cache: Optional[DiskLLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[DiskLLMCache]:
+    """Returns the process-wide LLM response cache, or None if caching is disabled."""
+    global _llm_cache
+
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = DiskLLMCache()
+        return _llm_cache
@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import random
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict, Field
+
+from .llm_cache import get_llm_cache
+
+# "google" calls Gemini; "fake" answers locally (see FakeChatModel) so the
+# whole pool, limiter and retry path can be exercised offline.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "google").strip().lower()
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "1"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "30"))
+
+FAKE_LLM_RESPONSES = os.getenv("FAKE_LLM_RESPONSES", "")
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0"))
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+
+# Rough prompt size estimate used for the tokens-per-minute budget
+_CHARS_PER_TOKEN = 4
+
+# Exception class names (anywhere in the MRO) worth retrying: timeouts,
+# throttling and transient server or network errors.
+_RETRYABLE_ERROR_NAMES = (
+    "Timeout", "DeadlineExceeded", "ResourceExhausted", "TooManyRequests", "RateLimit",
+    "ServiceUnavailable", "InternalServerError", "ServerError", "Unavailable", "ConnectionError",
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute / 60` tokens
+    per second, holding at most `per_minute` tokens.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Blocks until `amount` tokens are available and takes them.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def charge(self, amount: float) -> None:
+        """Takes `amount` tokens without waiting; the balance may go negative."""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class LLMPoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def add(self, **deltas: float) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+
+_request_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+_token_bucket = TokenBucket(LLM_TOKENS_PER_MINUTE)
+_stats = LLMPoolStats()
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    names = [cls.__name__ for cls in type(error).__mro__]
+    return any(marker in name for name in names for marker in _RETRYABLE_ERROR_NAMES)
+
+
+def backoff_delay(attempt: int, base: float = LLM_RETRY_BASE_DELAY_SECONDS,
+                  cap: float = LLM_RETRY_MAX_DELAY_SECONDS) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _estimate_tokens(messages: List[BaseMessage]) -> int:
+    return max(1, sum(len(str(message.content)) for message in messages) // _CHARS_PER_TOKEN)
+
+
+class PooledChatModel(BaseChatModel):
+    """
+    Chat model shared by every request that uses the same backend, model and
+    temperature.
+
+    Each call waits for the process-wide requests-per-minute and
+    tokens-per-minute budgets, and runs on the wrapped client with its
+    per-call timeout. Retryable failures (timeouts, throttling, transient
+    server errors) are retried with jittered exponential backoff. The wrapped
+    client is created once, so its HTTP connections are reused across calls.
+    Response caching happens on this model, so cache hits skip the budgets.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    client: BaseChatModel
+    model_name: str
+    temperature: float = 0.0
+    backend: str = LLM_BACKEND
+    max_attempts: int = Field(default=LLM_MAX_RETRIES + 1)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"pooled-{self.backend}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "model": self.model_name, "temperature": self.temperature}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        estimated_tokens = _estimate_tokens(messages)
+
+        attempt = 0
+        while True:
+            throttled = _request_bucket.acquire(1) + _token_bucket.acquire(estimated_tokens)
+            _stats.add(calls=1, throttled_seconds=throttled)
+
+            try:
+                result = self.client._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not is_retryable_error(e):
+                    _stats.add(failures=1)
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                print(f"LLM call failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_attempts})")
+                _stats.add(retries=1)
+                time.sleep(delay)
+                continue
+
+            # Bill the output (and any estimate shortfall) against the token budget
+            usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+            if usage and usage.get("total_tokens"):
+                _token_bucket.charge(max(0, usage["total_tokens"] - estimated_tokens))
+            return result
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for the Gemini client.
+
+    Replies come from the JSON file named by FAKE_LLM_RESPONSES: a list of
+    {"match": <substring of the prompt>, "response": <reply>} rules, where
+    the first matching rule wins and a rule without "match" is the default.
+    FAKE_LLM_LATENCY_SECONDS adds latency per call (bounded by the call
+    timeout), and FAKE_LLM_FAILURE_RATE makes that share of calls fail with a
+    retryable error.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: str = "fake"
+    timeout: Optional[float] = None
+    latency: float = FAKE_LLM_LATENCY_SECONDS
+    failure_rate: float = FAKE_LLM_FAILURE_RATE
+    rules: List[Dict[str, str]] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @classmethod
+    def from_env(cls, model: str, timeout: Optional[float]) -> "FakeChatModel":
+        rules = []
+        if FAKE_LLM_RESPONSES:
+            with open(FAKE_LLM_RESPONSES, "r", encoding="utf-8") as f:
+                rules = json.load(f)
+        return cls(model=model, timeout=timeout, rules=rules)
+
+    def _reply(self, prompt: str) -> str:
+        for rule in self.rules:
+            if rule.get("match") is None or rule["match"] in prompt:
+                return rule["response"]
+        return f"[{self.model}] {prompt[-200:]}"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.timeout is not None and self.latency > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"Fake LLM call exceeded the {self.timeout}s timeout.")
+        time.sleep(self.latency)
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise ConnectionError("Simulated transient LLM failure.")
+
+        prompt = str(messages[-1].content) if messages else ""
+        reply = self._reply(prompt)
+        usage = {
+            "input_tokens": _estimate_tokens(messages),
+            "output_tokens": max(1, len(reply) // _CHARS_PER_TOKEN),
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        message = AIMessage(content=reply, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _build_client(model_name: str, temperature: float, google_api_key: Optional[str]) -> BaseChatModel:
+    if LLM_BACKEND == "fake":
+        return FakeChatModel.from_env(model_name, LLM_TIMEOUT_SECONDS)
+    if LLM_BACKEND == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            temperature=temperature,
+            max_tokens=None,
+            timeout=LLM_TIMEOUT_SECONDS,
+            # Retries are done by PooledChatModel, with jitter and the rate limits applied
+            max_retries=0,
+            google_api_key=google_api_key,
+            cache=False
+        )
+    raise ValueError(f"Unsupported LLM backend: {LLM_BACKEND!r}")
+
+
+_pool: Dict[Tuple[str, float, bool], PooledChatModel] = {}
+_pool_lock = threading.Lock()
+
+
+def get_chat_model(model_name: str, temperature: float = 0, google_api_key: Optional[str] = None,
+                   use_cache: bool = True) -> PooledChatModel:
+    """
+    Returns the application-scoped chat model for `model_name`, creating its
+    client on first use.
+
+    Args:
+        model_name (str): The backend model name, e.g. "models/gemini-2.0-flash".
+        temperature (float): Sampling temperature.
+        google_api_key (str, optional): API key for the Google backend.
+        use_cache (bool): Serve repeated prompts from the LLM response cache.
+    """
+    key = (model_name, float(temperature), use_cache)
+
+    with _pool_lock:
+        model = _pool.get(key)
+        if model is None:
+            # Cached and uncached variants share one client (and its connections)
+            client = next(
+                (one.client for (name, temp, _), one in _pool.items() if (name, temp) == key[:2]),
+                None
+            ) or _build_client(model_name, temperature, google_api_key)
+
+            cache = get_llm_cache() if use_cache else None
+            model = PooledChatModel(
+                client=client,
+                model_name=model_name,
+                temperature=temperature,
+                # `cache=False` explicitly disables LangChain caching for the model
+                cache=cache if cache is not None else False,
+            )
+            _pool[key] = model
+        return model
+
+
+def llm_pool_stats() -> Dict[str, Any]:
+    """Returns call, retry and throttling counters for the shared LLM clients."""
+    return {
+        "backend": LLM_BACKEND,
+        "clients": len({id(model.client) for model in list(_pool.values())}),
+        "requests_per_minute": LLM_REQUESTS_PER_MINUTE,
+        "tokens_per_minute": LLM_TOKENS_PER_MINUTE,
+        "timeout_seconds": LLM_TIMEOUT_SECONDS,
+        "max_retries": LLM_MAX_RETRIES,
+        **_stats.to_dict(),
+    }
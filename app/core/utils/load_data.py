@@ -1,6 +1,8 @@
 import os
 import pandas as pd
 from typing import Dict, NamedTuple
+from .columnar_store import COLUMNAR_DATA_TYPES, read_columnar
+from .preprocess_data import schema_to_read_csv_kwargs
 
 class Table(NamedTuple):
     df: pd.DataFrame
@@ -30,7 +32,8 @@ def load_data(
         schema_path (str):
             Directory where schema files reside.
         data_type (str, optional):
-            File type/extension to load (“csv” or “json”). Defaults to "csv".
+            File type/extension to load (“csv”, “json”, “parquet”, “feather”
+            or “arrow”). Defaults to "csv". Arrow/Feather files are memory-mapped.
 
     Returns:
         Dict[str, Table]:
@@ -43,11 +46,19 @@ def load_data(
         schema_fp = os.path.join(schema_path, f"{schema_name}.{data_type}")
 
         if data_type == "csv":
-            df     = pd.read_csv(data_fp)
             schema = pd.read_csv(schema_fp)
+            try:
+                # Apply the schema's types while parsing
+                df = pd.read_csv(data_fp, **schema_to_read_csv_kwargs(schema))
+            except (ValueError, TypeError):
+                # Values that don't fit the declared types; let preprocess_tables coerce them
+                df = pd.read_csv(data_fp)
         elif data_type == "json":
             df     = pd.read_json(data_fp)
             schema = pd.read_json(schema_fp)
+        elif data_type in COLUMNAR_DATA_TYPES:
+            df     = read_columnar(data_fp, data_type)
+            schema = read_columnar(schema_fp, data_type)
         else:
             raise ValueError(f"Unsupported file type: {data_type!r}")
 
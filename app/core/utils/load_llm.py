@@ -1,42 +1,58 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Optional
 
 class LLMLoader:
-    def __init__(self, google_api_key: str):
+    def __init__(self, google_api_key: str, use_cache: bool = True):
+        """
+        Args:
+            google_api_key (str): API key for the Google Generative AI models.
+            use_cache (bool, optional): Serve repeated prompts from the disk-backed
+                LLM response cache. Set to False to bypass it for this loader.
+
+        Models come from the application-scoped pool in `llm_pool`, so loaders
+        are cheap and every request shares the same clients, rate limits and
+        retry policy.
+        """
         self.google_api_key = google_api_key
+        self.use_cache = use_cache
 
-    def load_google_model_pro(self, temperature=0):
+    def _use_cache(self, use_cache: Optional[bool]) -> bool:
+        return self.use_cache if use_cache is None else use_cache
+
+    def load_google_model_pro(self, temperature=0, use_cache: Optional[bool] = None):
         """_summary_
 
         Args:
             temperature (int, optional): _description_. Defaults to 0.
+            use_cache (bool, optional): Overrides the loader's `use_cache` for this model.
 
         Returns:
             _type_: _description_
         """
-        return ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro-latest",
+        # Imported on first use: the LangChain model stack is slow to import
+        from .llm_pool import get_chat_model
+
+        return get_chat_model(
+            "gemini-1.5-pro-latest",
             temperature=temperature,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-            google_api_key=self.google_api_key
+            google_api_key=self.google_api_key,
+            use_cache=self._use_cache(use_cache)
         )
 
-    def load_google_model_flash(self, temperature=0):
+    def load_google_model_flash(self, temperature=0, use_cache: Optional[bool] = None):
         """_summary_
 
         Args:
             temperature (int, optional): _description_. Defaults to 0.
+            use_cache (bool, optional): Overrides the loader's `use_cache` for this model.
 
         Returns:
             _type_: _description_
         """
-        
-        return ChatGoogleGenerativeAI(
-            model="models/gemini-2.0-flash",
+        from .llm_pool import get_chat_model
+
+        return get_chat_model(
+            "models/gemini-2.0-flash",
             temperature=temperature,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-            google_api_key=self.google_api_key
-        )
\ No newline at end of file
+            google_api_key=self.google_api_key,
+            use_cache=self._use_cache(use_cache)
+        )
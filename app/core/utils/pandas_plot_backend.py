@@ -0,0 +1,63 @@
+"""
+pandas plotting backend used while generated plot code runs.
+
+It is pandas' own matplotlib backend, except that calls without an explicit
+`ax` draw into the Axes of the figure `plot_renderer.render_plot` is rendering
+on the current thread, instead of a figure in pyplot's global state.
+Outside a render it behaves exactly like the default backend.
+"""
+import importlib
+
+from .plot_renderer import current_axes
+
+MATPLOTLIB_BACKEND = "matplotlib"
+
+
+def _matplotlib_backend():
+    return importlib.import_module("pandas.plotting._matplotlib")
+
+
+def _bind_axes(kwargs: dict) -> dict:
+    ax = current_axes()
+    if kwargs.get("ax") is None and ax is not None and not kwargs.get("subplots"):
+        kwargs["ax"] = ax
+    return kwargs
+
+
+def plot(data, x=None, y=None, kind="line", **kwargs):
+    # Hand back to DataFrame.plot / Series.plot on the default backend, which
+    # resolves x / y and the plot kind exactly as usual
+    kwargs = _bind_axes(kwargs)
+    if x is not None or y is not None:
+        kwargs.update(x=x, y=y)
+    return data.plot(kind=kind, backend=MATPLOTLIB_BACKEND, **kwargs)
+
+
+def hist_series(*args, **kwargs):
+    kwargs = _bind_axes(kwargs)
+    if kwargs.get("ax") is not None and kwargs.get("figure") is None:
+        # Otherwise pandas compares the axes against pyplot's current figure.
+        # (pandas still creates one empty pyplot figure on first use; it is
+        # reused afterwards and never drawn into.)
+        kwargs["figure"] = kwargs["ax"].get_figure()
+    return _matplotlib_backend().hist_series(*args, **kwargs)
+
+
+def hist_frame(*args, **kwargs):
+    return _matplotlib_backend().hist_frame(*args, **_bind_axes(kwargs))
+
+
+def boxplot(*args, **kwargs):
+    return _matplotlib_backend().boxplot(*args, **_bind_axes(kwargs))
+
+
+def boxplot_frame(*args, **kwargs):
+    return _matplotlib_backend().boxplot_frame(*args, **_bind_axes(kwargs))
+
+
+def boxplot_frame_groupby(*args, **kwargs):
+    return _matplotlib_backend().boxplot_frame_groupby(*args, **_bind_axes(kwargs))
+
+
+def __getattr__(name: str):
+    return getattr(_matplotlib_backend(), name)
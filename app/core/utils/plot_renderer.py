@@ -0,0 +1,418 @@
+import os
+import sys
+import builtins
+import threading
+import traceback
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.plotting import PlotAccessor
+
+from .worker_pool import SharedProcessPool
+
+# "thread" renders on the calling thread; "process" renders in a pool of
+# worker processes, so several plots render in parallel across cores.
+PLOT_RENDER_BACKEND = os.getenv("PLOT_RENDER_BACKEND", "thread").strip().lower()
+PLOT_RENDER_WORKERS = max(1, int(os.getenv("PLOT_RENDER_WORKERS", str(min(4, os.cpu_count() or 2)))))
+PLOT_RENDER_TIMEOUT_SECONDS = float(os.getenv("PLOT_RENDER_TIMEOUT_SECONDS", "60"))
+# Default figure size (inches, "<width>x<height>") and resolution of rendered plots
+PLOT_FIGSIZE = tuple(float(one) for one in os.getenv("PLOT_FIGSIZE", "6.4x4.8").lower().split("x"))
+PLOT_DPI = max(10, int(os.getenv("PLOT_DPI", "100")))
+
+PANDAS_PLOT_BACKEND = "app.core.utils.pandas_plot_backend"
+
+# The figure being rendered on each thread, for the pandas plotting backend
+_active = threading.local()
+# Held for the whole of each render: plots that escape the shim (e.g. pandas
+# plots of a plain `value_counts()` Series) draw into pyplot's process-wide
+# current figure, so two renders on different threads would draw into and
+# close each other's figures. Renders in parallel need the "process" backend.
+_render_lock = threading.Lock()
+
+# pyplot functions that act on the current Axes under another name
+_AXES_ALIASES = {
+    "title": "set_title",
+    "xlabel": "set_xlabel",
+    "ylabel": "set_ylabel",
+    "xlim": "set_xlim",
+    "ylim": "set_ylim",
+    "xscale": "set_xscale",
+    "yscale": "set_yscale",
+}
+# pyplot functions that act on the Figure
+_FIGURE_METHODS = {"suptitle", "tight_layout", "subplots_adjust", "colorbar", "add_subplot", "add_axes"}
+# pyplot functions that make no sense for an off-screen figure saved by the renderer,
+# or that change process-wide defaults shared with every other render
+_NO_OPS = {"show", "close", "savefig", "ion", "ioff", "draw", "pause", "switch_backend", "rc", "rcdefaults"}
+
+
+class _Style:
+    """`plt.style` stand-in: style sheets change process-wide defaults, so they are ignored."""
+
+    def use(self, *args, **kwargs) -> None:
+        pass
+
+    def context(self, *args, **kwargs):
+        import contextlib
+        return contextlib.nullcontext()
+
+
+class PyplotShim:
+    """
+    pyplot-like facade bound to a single Figure, handed to generated plot
+    code as `plt`.
+
+    The usual pyplot calls (`plt.bar`, `plt.title`, `plt.subplots`,
+    `plt.xticks`, `plt.figtext`, ...) go to this figure and its current Axes
+    instead of pyplot's process-wide "current figure" (unless the code drew a
+    pyplot figure itself, see `_escaped_figure`). Calls that would change
+    process-wide defaults (`plt.rc`, `plt.style.use`) are ignored, and other
+    pyplot-only functions raise AttributeError.
+    """
+
+    def __init__(self, figure, pyplot_before: frozenset = frozenset()):
+        import matplotlib
+
+        self._figure = figure
+        self._axes = None
+        # pyplot figures that existed before the render, i.e. not drawn by its code
+        self._pyplot_before = pyplot_before
+        self.cm = matplotlib.cm
+        self.colormaps = matplotlib.colormaps
+        self.rcParams = matplotlib.rcParams
+        self.style = _Style()
+
+    def _escaped_figure(self):
+        """
+        pyplot's current figure, if a plot that escaped the shim (e.g.
+        `df['c'].value_counts().plot()`) drew it during this render, so that
+        `plt.title(...)` and the like that follow it apply to it as in pyplot.
+        """
+        if "matplotlib.pyplot" not in sys.modules:
+            return None
+        from matplotlib._pylab_helpers import Gcf
+
+        manager = Gcf.get_active()
+        if manager is None or manager.num in self._pyplot_before or not manager.canvas.figure.get_axes():
+            return None
+        return manager.canvas.figure
+
+    def _reclaim(self) -> None:
+        # Like pyplot, creating a figure makes it current again
+        self._pyplot_before = frozenset(_pyplot_figure_numbers())
+
+    def gcf(self):
+        return self._escaped_figure() or self._figure
+
+    def gca(self):
+        figure = self.gcf()
+        if self._axes is None or self._axes.figure is not figure:
+            self._axes = figure.gca()
+        return self._axes
+
+    def sca(self, ax) -> None:
+        self._axes = ax
+
+    def figure(self, *args, figsize=None, dpi=None, **kwargs):
+        self._reclaim()
+        if figsize is not None:
+            self._figure.set_size_inches(figsize)
+        if dpi is not None:
+            self._figure.set_dpi(dpi)
+        return self._figure
+
+    def subplots(self, nrows: int = 1, ncols: int = 1, figsize=None, dpi=None, **kwargs):
+        self.figure(figsize=figsize, dpi=dpi)
+        self._figure.clear()
+        axes = self._figure.subplots(nrows, ncols, **kwargs)
+        self._axes = np.ravel(axes)[0] if isinstance(axes, np.ndarray) else axes
+        return self._figure, axes
+
+    def subplot(self, *args, **kwargs):
+        self._reclaim()
+        self._axes = self._figure.add_subplot(*args, **kwargs)
+        return self._axes
+
+    def clf(self) -> None:
+        self.gcf().clear()
+        self._axes = None
+
+    def figtext(self, *args, **kwargs):
+        return self.gcf().text(*args, **kwargs)
+
+    def figlegend(self, *args, **kwargs):
+        return self.gcf().legend(*args, **kwargs)
+
+    def setp(self, obj, *args, **kwargs):
+        from matplotlib.artist import setp
+        return setp(obj, *args, **kwargs)
+
+    def rc_context(self, *args, **kwargs):
+        import contextlib
+        return contextlib.nullcontext()
+
+    def get_cmap(self, name=None, lut=None):
+        cmap = self.colormaps[name or self.rcParams["image.cmap"]]
+        return cmap.resampled(lut) if lut is not None else cmap
+
+    def _ticks(self, axis, ticks=None, labels=None, minor=False, **kwargs):
+        if ticks is not None:
+            axis.set_ticks(ticks, minor=minor)
+        if labels is not None:
+            axis.set_ticklabels(labels, minor=minor, **kwargs)
+        elif kwargs:
+            for label in axis.get_ticklabels(minor=minor):
+                label.update(kwargs)
+        return axis.get_ticklocs(minor=minor), axis.get_ticklabels(minor=minor)
+
+    def xticks(self, ticks=None, labels=None, **kwargs):
+        return self._ticks(self.gca().xaxis, ticks, labels, **kwargs)
+
+    def yticks(self, ticks=None, labels=None, **kwargs):
+        return self._ticks(self.gca().yaxis, ticks, labels, **kwargs)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in _NO_OPS:
+            return lambda *args, **kwargs: None
+        if name in _AXES_ALIASES:
+            return getattr(self.gca(), _AXES_ALIASES[name])
+        if name in _FIGURE_METHODS:
+            return getattr(self.gcf(), name)
+        # Everything else (bar, plot, scatter, pie, hist, legend, grid, text, ...) draws on the current Axes
+        axes = self.gca()
+        if not callable(getattr(type(axes), name, None)):
+            raise AttributeError(f"plt.{name} is not supported when rendering plots")
+        return getattr(axes, name)
+
+
+class _MatplotlibModule:
+    """
+    `matplotlib` as seen by generated plot code: the real package, except that
+    its `pyplot` is the render's PyplotShim and `use` cannot switch backends.
+    """
+
+    def __init__(self, shim: PyplotShim):
+        self.pyplot = shim
+
+    def use(self, *args, **kwargs) -> None:
+        pass
+
+    def __getattr__(self, name: str):
+        import matplotlib
+        return getattr(matplotlib, name)
+
+
+def _render_builtins(shim: PyplotShim) -> Dict[str, Any]:
+    """
+    Builtins for generated plot code whose `import` hands out the shim for
+    `matplotlib.pyplot` (`import matplotlib.pyplot as plt`, `from matplotlib
+    import pyplot`), so importing pyplot cannot bypass the render's figure.
+    """
+    matplotlib_module = _MatplotlibModule(shim)
+
+    def _import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or not (name == "matplotlib" or name.startswith("matplotlib.")):
+            return builtins.__import__(name, globals, locals, fromlist, level)
+        if name == "matplotlib.pyplot":
+            return shim if fromlist else matplotlib_module
+        module = builtins.__import__(name, globals, locals, fromlist, level)
+        return module if fromlist and name != "matplotlib" else matplotlib_module
+
+    return {**vars(builtins), "__import__": _import}
+
+
+class _RenderPlotAccessor(PlotAccessor):
+    """`.plot` accessor that draws through PANDAS_PLOT_BACKEND, passed per call."""
+
+    def __call__(self, *args, **kwargs):
+        kwargs.setdefault("backend", PANDAS_PLOT_BACKEND)
+        return super().__call__(*args, **kwargs)
+
+
+class RenderSeries(pd.Series):
+    """Series handed to plot code: its plots draw into the figure being rendered on this thread."""
+
+    @property
+    def _constructor(self):
+        return RenderSeries
+
+    @property
+    def _constructor_expanddim(self):
+        return RenderFrame
+
+    @property
+    def plot(self):
+        return _RenderPlotAccessor(self)
+
+    def hist(self, *args, **kwargs):
+        kwargs.setdefault("backend", PANDAS_PLOT_BACKEND)
+        return super().hist(*args, **kwargs)
+
+
+class RenderFrame(pd.DataFrame):
+    """
+    DataFrame handed to plot code. Its `.plot`, `.hist` and `.boxplot` (and
+    those of the frames and series derived from it) use the pandas backend
+    bound to the render's figure, so pandas' process-wide `plotting.backend`
+    option is left alone.
+    """
+
+    @property
+    def _constructor(self):
+        return RenderFrame
+
+    @property
+    def _constructor_sliced(self):
+        return RenderSeries
+
+    @property
+    def plot(self):
+        return _RenderPlotAccessor(self)
+
+    def hist(self, *args, **kwargs):
+        kwargs.setdefault("backend", PANDAS_PLOT_BACKEND)
+        return super().hist(*args, **kwargs)
+
+    def boxplot(self, *args, **kwargs):
+        kwargs.setdefault("backend", PANDAS_PLOT_BACKEND)
+        return super().boxplot(*args, **kwargs)
+
+
+def _render_data(df):
+    if isinstance(df, pd.DataFrame):
+        return RenderFrame(df)
+    if isinstance(df, pd.Series):
+        return RenderSeries(df)
+    return df
+
+
+def current_axes():
+    """Axes of the figure being rendered on this thread, or None outside `render_plot`."""
+    shim = getattr(_active, "shim", None)
+    return shim.gca() if shim is not None else None
+
+
+def _setup_matplotlib() -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _pyplot_figure_numbers() -> set:
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return set(pyplot.get_fignums()) if pyplot is not None else set()
+
+
+def _close_pyplot_figures(before: set) -> list:
+    """
+    Closes the pyplot figures created since `before` (by plots that escaped
+    the shim, e.g. pandas plots of plain frames such as `value_counts()`), so
+    they never leak, and returns them.
+    """
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is None:
+        return []
+    from matplotlib._pylab_helpers import Gcf
+
+    # Looked up without pyplot.figure(), which would make them current for every thread
+    managers = [Gcf.get_fig_manager(num) for num in pyplot.get_fignums() if num not in before]
+    created = [one.canvas.figure for one in managers if one is not None]
+    for one in created:
+        pyplot.close(one)
+    return created
+
+
+def render_plot(code: str, df: pd.DataFrame, file_path: str) -> Optional[str]:
+    """
+    Executes generated plotting code against its own Agg Figure and saves it.
+
+    The code sees `df`, `plt` (a PyplotShim, also returned by importing
+    pyplot), `pd` and `np`. The figure is never registered with pyplot, and
+    it is cleared once saved, so its memory is released as soon as the call
+    returns. Should the code still draw into pyplot, `plt` follows the pyplot
+    figure it drew, as pyplot would, and the pyplot figures it created are
+    closed; renders in one process therefore run one at a time.
+
+    Returns:
+        str or None: `file_path`, or None if the code failed.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    _setup_matplotlib()
+
+    figure = Figure(figsize=PLOT_FIGSIZE, dpi=PLOT_DPI)
+    FigureCanvasAgg(figure)
+    with _render_lock:
+        return _render_into(figure, code, df, file_path)
+
+
+def _render_into(figure, code: str, df: pd.DataFrame, file_path: str) -> Optional[str]:
+    pyplot_before = _pyplot_figure_numbers()
+    _active.shim = PyplotShim(figure, frozenset(pyplot_before))
+    escaped = []
+
+    try:
+        scope: Dict[str, Any] = {
+            "__builtins__": _render_builtins(_active.shim), "df": _render_data(df), "plt": _active.shim,
+            "pd": pd, "np": np,
+        }
+        exec(code, scope)
+        target = _active.shim.gcf()
+        escaped = _close_pyplot_figures(pyplot_before)
+        target.savefig(file_path, dpi=PLOT_DPI)
+        print(f"Plot saved to {file_path}")
+        return file_path
+    except Exception as e:
+        print(f"Error executing plot code: {e}")
+        return None
+    finally:
+        _active.shim = None
+        figure.clear()
+        for one in escaped or _close_pyplot_figures(pyplot_before):
+            one.clear()
+
+
+# --- Process backend ---
+
+def _init_worker() -> None:
+    _setup_matplotlib()
+
+
+def _render_in_worker(code: str, df: pd.DataFrame, file_path: str) -> Optional[str]:
+    try:
+        return render_plot(code, df, file_path)
+    except BaseException:
+        traceback.print_exc()
+        return None
+
+
+# Shared by every report; a stuck or crashed render retires it without failing the others
+_pool = SharedProcessPool(PLOT_RENDER_WORKERS, _init_worker)
+
+
+def execute_plot_code(code: str, df: pd.DataFrame, file_path: str) -> Optional[str]:
+    """
+    Renders generated plotting code to `file_path` on the configured backend.
+
+    Returns:
+        str or None: `file_path`, or None if the plot could not be rendered.
+    """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+
+    if PLOT_RENDER_BACKEND == "thread":
+        return render_plot(code, df, file_path)
+    if PLOT_RENDER_BACKEND != "process":
+        raise ValueError(f"Unsupported plot render backend: {PLOT_RENDER_BACKEND!r}")
+
+    try:
+        return _pool.run(_render_in_worker, code, df, file_path, timeout=PLOT_RENDER_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        print(f"Plot rendering exceeded the time limit of {PLOT_RENDER_TIMEOUT_SECONDS}s.")
+    except Exception as e:
+        # e.g. BrokenProcessPool, or a result that could not be pickled
+        print(f"Plot render worker failed: {e!r}")
+    return None
@@ -1,18 +1,175 @@
+import sys
 import pandas as pd
-from typing import Dict, NamedTuple
+from typing import Any, Dict, NamedTuple
 
 class Table(NamedTuple):
     df: pd.DataFrame
     schema: pd.DataFrame
 
+# A text column becomes `category` when it has few distinct values: at most
+# this many per row (0.05 → one per twenty rows) and no more than
+# CATEGORY_MAX_UNIQUE in all. Near-unique text takes more memory as a category.
+CATEGORY_MAX_UNIQUE_RATIO = 0.05
+CATEGORY_MAX_UNIQUE = 10_000
+
+# Date formats tried by the reader for Datetime columns, in order.
+DATETIME_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d"]
+
+_TRUE_VALUES = {"true", "t", "yes", "y", "1"}
+_FALSE_VALUES = {"false", "f", "no", "n", "0"}
+
+
+def normalize_schema_type(data_type: Any) -> str:
+    """
+    Maps a schema `data_type` onto one of: "datetime", "float", "integer",
+    "boolean" or "string".
+    """
+    dtype = str(data_type).strip().lower()
+
+    if 'datetime' in dtype:
+        return "datetime"
+    if dtype in {'float', 'double', 'decimal'}:
+        return "float"
+    if dtype in {'integer', 'int', 'long'}:
+        return "integer"
+    if dtype in {'boolean', 'bool'}:
+        return "boolean"
+    # everything else → string
+    return "string"
+
+
+def _schema_types(schema: pd.DataFrame) -> Dict[str, str]:
+    return {
+        str(col): normalize_schema_type(data_type)
+        for col, data_type in zip(schema['column_name'], schema['data_type'])
+    }
+
+
+def schema_to_read_csv_kwargs(schema: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Translates a schema into `pd.read_csv` keyword arguments (`dtype` and
+    `parse_dates`) so types are applied while parsing.
+    """
+    pandas_dtypes = {"float": "float64", "integer": "Int64", "boolean": "boolean"}
+
+    dtype, parse_dates = {}, []
+    for col, kind in _schema_types(schema).items():
+        if kind == "datetime":
+            parse_dates.append(col)
+        elif kind in pandas_dtypes:
+            dtype[col] = pandas_dtypes[kind]
+
+    return {"dtype": dtype, "parse_dates": parse_dates}
+
+
+def schema_to_arrow_convert_options(schema: pd.DataFrame, parse_datetimes: bool = True):
+    """
+    Translates a schema into a `pyarrow.csv.ConvertOptions` so the streaming
+    reader produces typed columns directly.
+
+    Args:
+        schema (pd.DataFrame): The table schema.
+        parse_datetimes (bool): Parse Datetime columns at read time with
+            DATETIME_FORMATS. When False they are read as text and converted by
+            `preprocess_tables`.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    arrow_types = {
+        "datetime": pa.timestamp("ns") if parse_datetimes else pa.string(),
+        "float": pa.float64(),
+        "integer": pa.int64(),
+        "boolean": pa.bool_(),
+        "string": pa.string(),
+    }
+
+    return pa_csv.ConvertOptions(
+        column_types={col: arrow_types[kind] for col, kind in _schema_types(schema).items()},
+        timestamp_parsers=DATETIME_FORMATS + [pa_csv.ISO8601],
+        true_values=sorted(_TRUE_VALUES | {v.capitalize() for v in _TRUE_VALUES} | {"TRUE"}),
+        false_values=sorted(_FALSE_VALUES | {v.capitalize() for v in _FALSE_VALUES} | {"FALSE"}),
+        strings_can_be_null=True,
+    )
+
+
+def _nullable_integer(series: pd.Series) -> pd.Series:
+    """Converts a numeric series to the smallest nullable integer dtype that fits it."""
+    if pd.api.types.is_extension_array_dtype(series.dtype) and pd.api.types.is_integer_dtype(series.dtype):
+        return series
+
+    if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        series = pd.to_numeric(series, errors='coerce')
+
+    non_null = series.dropna()
+    if not non_null.empty and not (non_null == non_null.round()).all():
+        # Fractional values can't be represented as integers; keep them as floats
+        return series
+
+    downcast = pd.to_numeric(non_null, downcast='integer').dtype if not non_null.empty else "int64"
+    return series.astype(str(downcast).replace("int", "Int"))
+
+
+def _nullable_boolean(series: pd.Series) -> pd.Series:
+    if str(series.dtype) == "boolean":
+        return series
+    try:
+        return series.astype('boolean')
+    except (TypeError, ValueError):
+        # Text flags like "yes"/"no"; anything unrecognised becomes NA
+        lowered = series.astype('string').str.strip().str.lower()
+        mapped = lowered.map(lambda v: True if v in _TRUE_VALUES else False if v in _FALSE_VALUES else pd.NA)
+        return mapped.astype('boolean')
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Dictionary-encodes low-cardinality text columns; keeps the rest as strings."""
+    n_rows = len(series)
+    n_unique = series.nunique(dropna=True)
+
+    if n_rows and n_unique <= min(CATEGORY_MAX_UNIQUE, max(1, int(n_rows * CATEGORY_MAX_UNIQUE_RATIO))):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.astype('category')
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.cat.categories.dtype)
+    if pd.api.types.is_string_dtype(series.dtype) and not pd.api.types.is_object_dtype(series.dtype):
+        return series
+    return series.astype('string')
+
+
+def _convert_column(series: pd.Series, kind: str) -> pd.Series:
+    if kind == "datetime":
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return series
+        return pd.to_datetime(series, errors='coerce')
+    if kind == "float":
+        if pd.api.types.is_float_dtype(series.dtype):
+            return series
+        return pd.to_numeric(series, errors='coerce')
+    if kind == "integer":
+        return _nullable_integer(series)
+    if kind == "boolean":
+        return _nullable_boolean(series)
+    return _text(series)
+
+
 def preprocess_tables(
     tables: Dict[str, Table]
 ) -> Dict[str, Table]:
     """
     Cast each DataFrame’s columns according to its schema’s data_type.
 
+    Columns already parsed with the right type (see `schema_to_read_csv_kwargs`
+    and `schema_to_arrow_convert_options`) are left untouched. The others are
+    converted one column at a time on a shallow copy of the loaded DataFrame,
+    so the caller's DataFrame is not modified and unconverted columns are
+    not copied. Integers and booleans use pandas' nullable dtypes, and
+    low-cardinality text columns become `category`.
+
     Args:
-        tables: mapping from table name → Table(df, schema), 
+        tables: mapping from table name → Table(df, schema),
                 where schema is a DataFrame with at least
                 ['column_name', 'data_type'].
 
@@ -24,34 +181,45 @@ def preprocess_tables(
     print("\n===========================")
     print("Preprocessing data...")
     print("===========================")
-    
+
     new_tables: Dict[str, Table] = {}
 
     for tbl_name, tbl in tables.items():
-        df = tbl.df.copy()
-        schema_df = tbl.schema
-
-        for _, row in schema_df.iterrows():
-            col = row['column_name']
-            dtype = str(row['data_type']).strip().lower()
+        df = tbl.df.copy(deep=False)
 
+        for col, kind in _schema_types(tbl.schema).items():
             if col not in df.columns:
                 # skip if the column isn’t present
                 continue
 
-            if 'datetime' in dtype:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-            elif dtype in {'float', 'double', 'decimal'}:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            elif dtype in {'integer', 'int', 'long'}:
-                df[col] = pd.to_numeric(df[col], errors='coerce', downcast='integer')
-            elif dtype in {'boolean', 'bool'}:
-                # pandas BooleanDtype retains NA
-                df[col] = df[col].astype('boolean')
-            else:
-                # everything else → string
-                df[col] = df[col].astype(str)
+            series = df[col]
+            converted = _convert_column(series, kind)
+            if converted is not series:
+                df[col] = converted
 
         new_tables[tbl_name] = Table(df=df, schema=tbl.schema)
 
     return new_tables
+
+
+def table_memory_footprint(tables: Dict[str, Table]) -> Dict[str, int]:
+    """Deep in-memory size, in bytes, of each table's DataFrame."""
+    return {
+        tbl_name: int(tbl.df.memory_usage(index=True, deep=True).sum())
+        for tbl_name, tbl in tables.items()
+    }
+
+
+def peak_rss_bytes() -> int:
+    """
+    Peak resident set size of the current process since it started, in bytes.
+    It covers everything the process ever did, not one load.
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak if sys.platform == "darwin" else peak * 1024)
@@ -0,0 +1,192 @@
+import os
+import json
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "5"))
+PROFILE_HISTOGRAM_BINS = int(os.getenv("PROFILE_HISTOGRAM_BINS", "10"))
+# Above this many rows, cardinality is estimated with a KMV sketch instead of nunique
+PROFILE_EXACT_CARDINALITY_MAX_ROWS = int(os.getenv("PROFILE_EXACT_CARDINALITY_MAX_ROWS", "1000000"))
+
+PROFILE_FILE_NAME = "profile.json"
+
+# Number of minimum hash values kept by the cardinality sketch
+_KMV_K = 1024
+_KMV_CHUNK_SIZE = 65536
+# Longest rendering of a single value kept in the profile
+_MAX_VALUE_CHARS = 40
+
+
+def _to_json_value(value: Any) -> Any:
+    """Converts numpy/pandas scalars into JSON-friendly Python values."""
+    if value is None or (not isinstance(value, (list, tuple, dict)) and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(pd.Timestamp(value))
+    if isinstance(value, (np.integer, int)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return round(float(value), 6)
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    return str(value)[:_MAX_VALUE_CHARS]
+
+
+def approx_distinct(series: pd.Series, k: int = _KMV_K) -> int:
+    """
+    Estimates the number of distinct non-null values with a K-minimum-values
+    sketch over 64-bit hashes of the column, in a single vectorized pass.
+    """
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy(dtype=np.uint64)
+
+    # Keep the k smallest distinct hashes, scanning in chunks; once k are kept,
+    # only values below the current k-th smallest can still qualify.
+    kept = np.empty(0, dtype=np.uint64)
+    for start in range(0, hashes.size, _KMV_CHUNK_SIZE):
+        chunk = hashes[start:start + _KMV_CHUNK_SIZE]
+        if kept.size >= k:
+            chunk = chunk[chunk < kept[-1]]
+        kept = np.unique(np.concatenate([kept, chunk]))[:k]
+
+    if kept.size < k:
+        # Fewer than k distinct values: the sketch is exact
+        return int(kept.size)
+
+    kth = float(kept[k - 1]) / float(np.iinfo(np.uint64).max)
+    return int(round((k - 1) / kth))
+
+
+def profile_column(series: pd.Series, top_k: int = PROFILE_TOP_K,
+                   bins: int = PROFILE_HISTOGRAM_BINS) -> Dict[str, Any]:
+    """
+    Computes vectorized statistics for one column: null count, cardinality,
+    min/max, top-k values and, for numeric columns, a histogram.
+    """
+    n_rows = int(len(series))
+    null_count = int(series.isna().sum())
+    non_null = series.dropna()
+
+    column_profile: Dict[str, Any] = {
+        "dtype": str(series.dtype),
+        "null_count": null_count,
+        "null_fraction": round(null_count / n_rows, 4) if n_rows else 0.0,
+    }
+
+    if n_rows > PROFILE_EXACT_CARDINALITY_MAX_ROWS:
+        column_profile["cardinality"] = approx_distinct(non_null)
+        column_profile["cardinality_approx"] = True
+    else:
+        column_profile["cardinality"] = int(non_null.nunique())
+        column_profile["cardinality_approx"] = False
+
+    if non_null.empty:
+        return column_profile
+
+    is_numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+    is_datetime = pd.api.types.is_datetime64_any_dtype(series.dtype)
+
+    if is_numeric or is_datetime:
+        column_profile["min"] = _to_json_value(non_null.min())
+        column_profile["max"] = _to_json_value(non_null.max())
+
+    if is_numeric:
+        values = non_null.to_numpy(dtype="float64", na_value=np.nan)
+        values = values[np.isfinite(values)]
+        if values.size:
+            counts, edges = np.histogram(values, bins=bins)
+            column_profile["histogram"] = {
+                "edges": [_to_json_value(edge) for edge in edges],
+                "counts": counts.tolist(),
+            }
+
+    # Top values only say something when values repeat
+    if not is_datetime and column_profile["cardinality"] < len(non_null) and (
+        not is_numeric or column_profile["cardinality"] <= top_k
+    ):
+        top_values = non_null.value_counts().head(top_k)
+        column_profile["top_values"] = [[_to_json_value(value), int(count)] for value, count in top_values.items()]
+
+    return column_profile
+
+
+def profile_tables(tables: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Profiles every column of every processed table.
+
+    Returns:
+        Dict: table name → {"row_count": int, "columns": {column → stats}}.
+    """
+    print("\n===========================")
+    print("Profiling data...")
+    print("===========================")
+
+    return {
+        tbl_name: {
+            "row_count": int(len(tbl.df)),
+            "columns": {str(col): profile_column(tbl.df[col]) for col in tbl.df.columns},
+        }
+        for tbl_name, tbl in tables.items()
+    }
+
+
+def save_profile(profile: Dict[str, Any], session_path: str) -> str:
+    profile_path = os.path.join(session_path, PROFILE_FILE_NAME)
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    return profile_path
+
+
+def load_profile(session_path: str) -> Dict[str, Any]:
+    """Loads a saved profile; returns an empty profile if there is none."""
+    try:
+        with open(os.path.join(session_path, PROFILE_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def format_column_profile(column_profile: Dict[str, Any]) -> str:
+    """Renders one column's statistics as a single compact line for prompts."""
+    parts = []
+
+    if column_profile.get("null_count"):
+        parts.append(f"nulls={column_profile['null_count']} ({column_profile['null_fraction']:.0%})")
+    if "cardinality" in column_profile:
+        approx = "~" if column_profile.get("cardinality_approx") else ""
+        parts.append(f"distinct={approx}{column_profile['cardinality']}")
+    if "min" in column_profile:
+        parts.append(f"range=[{column_profile['min']}, {column_profile['max']}]")
+    if column_profile.get("top_values"):
+        top = ", ".join(f"{value} ({count})" for value, count in column_profile["top_values"])
+        parts.append(f"top: {top}")
+    if column_profile.get("cardinality") == 0:
+        parts.append("ALL NULL")
+
+    return "; ".join(parts)
+
+
+def format_profile_for_prompt(profile: Dict[str, Any], table_name: Optional[str] = None,
+                              columns: Optional[Iterable[str]] = None) -> str:
+    """
+    Renders a compact, one-line-per-column view of a table profile.
+
+    Args:
+        profile (dict): Output of `profile_tables`.
+        table_name (str, optional): Restrict to one table.
+        columns (Iterable[str], optional): Restrict to these columns.
+    """
+    lines = []
+    wanted = set(columns) if columns is not None else None
+
+    for tbl_name, tbl_profile in profile.items():
+        if table_name is not None and tbl_name != table_name:
+            continue
+        lines.append(f"Table {tbl_name} ({tbl_profile['row_count']} rows):")
+        for col, column_profile in tbl_profile["columns"].items():
+            if wanted is not None and col not in wanted:
+                continue
+            lines.append(f"- {col}: {format_column_profile(column_profile)}")
+
+    return "\n".join(lines)
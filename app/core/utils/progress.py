@@ -0,0 +1,23 @@
+from typing import Any
+
+
+def emit_progress(event: str, **data: Any) -> None:
+    """
+    Publishes a progress event on the running graph's "custom" stream
+    (`graph.stream(..., stream_mode="custom")`), e.g. when one analytic
+    finishes executing or one report section is ready.
+
+    Outside a graph run, or when nobody streams custom events, this is a no-op,
+    so nodes and helpers can call it unconditionally.
+
+    Args:
+        event (str): The event name, e.g. "section_completed".
+        **data: JSON-serializable event fields.
+    """
+    try:
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+    except (ImportError, RuntimeError, KeyError):
+        return
+
+    writer({"event": event, **data})
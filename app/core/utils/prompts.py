@@ -0,0 +1,19 @@
+import os
+from functools import lru_cache
+
+# Prompt templates ship inside the package, so they resolve regardless of the
+# working directory the API is started from.
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+
+@lru_cache(maxsize=None)
+def load_prompt(file_name: str) -> str:
+    """
+    Returns the text of a prompt template from PROMPTS_DIR. Each file is read
+    once per process, on first use.
+
+    Args:
+        file_name (str): The template file name, e.g. "plotting_prompt_template.txt".
+    """
+    with open(os.path.join(PROMPTS_DIR, file_name), "r", encoding="utf-8") as f:
+        return f.read()
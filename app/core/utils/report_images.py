@@ -0,0 +1,105 @@
+import os
+import math
+from typing import Dict, Iterable, Optional
+
+# "auto" picks a palette PNG for line art and JPEG for photographic plots
+# (heatmaps, gradients, dense scatters); "png" / "jpeg" force one format and
+# "original" embeds the rendered PNG as is.
+REPORT_IMAGE_FORMAT = os.getenv("REPORT_IMAGE_FORMAT", "auto").strip().lower()
+REPORT_PNG_COLORS = min(256, max(2, int(os.getenv("REPORT_PNG_COLORS", "256"))))
+REPORT_JPEG_QUALITY = min(95, max(10, int(os.getenv("REPORT_JPEG_QUALITY", "85"))))
+# Upper bound on the PDF size, enforced by downscaling the images; 0 disables it
+REPORT_MAX_BYTES = max(0, int(os.getenv("REPORT_MAX_BYTES", str(10 * 1024 * 1024))))
+# Images are never downscaled below this width to meet the budget
+REPORT_IMAGE_MIN_WIDTH_PX = max(1, int(os.getenv("REPORT_IMAGE_MIN_WIDTH_PX", "480")))
+
+REPORT_IMAGES_DIR = "report_images"
+
+# Share of pixels the most common REPORT_PNG_COLORS colors must cover for an
+# image to count as line art; anti-aliased edges make up the rest.
+_LINE_ART_COVERAGE = 0.98
+
+
+def is_line_art(image) -> bool:
+    """True if a palette of REPORT_PNG_COLORS colors represents `image` almost exactly."""
+    counts = image.getcolors(maxcolors=image.width * image.height)
+    if counts is None or len(counts) <= REPORT_PNG_COLORS:
+        return counts is not None
+
+    counts.sort(reverse=True)
+    covered = sum(count for count, _ in counts[:REPORT_PNG_COLORS])
+    return covered / (image.width * image.height) >= _LINE_ART_COVERAGE
+
+
+def optimize_image(source_path: str, output_dir: str, scale: float = 1.0,
+                   image_format: str = REPORT_IMAGE_FORMAT) -> str:
+    """
+    Writes the report copy of a plot: downscaled by `scale` (but not below
+    REPORT_IMAGE_MIN_WIDTH_PX) and re-encoded as a palette PNG or a JPEG.
+
+    Returns:
+        str: Path of the optimized image (the source itself for "original").
+    """
+    if image_format == "original":
+        return source_path
+    if image_format not in {"auto", "png", "jpeg"}:
+        raise ValueError(f"Unsupported report image format: {image_format!r}")
+
+    from PIL import Image
+
+    with Image.open(source_path) as source:
+        image = source.convert("RGBA")
+    # Plots are opaque; flatten onto white so JPEG and palettes need no alpha
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    image = background
+
+    width = max(min(image.width, REPORT_IMAGE_MIN_WIDTH_PX), round(image.width * scale))
+    if width < image.width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+
+    if image_format == "auto":
+        image_format = "png" if is_line_art(image) else "jpeg"
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(source_path))[0]
+
+    if image_format == "png":
+        output_path = os.path.join(output_dir, f"{name}.png")
+        image.quantize(colors=REPORT_PNG_COLORS, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE) \
+            .save(output_path, optimize=True)
+    else:
+        output_path = os.path.join(output_dir, f"{name}.jpg")
+        image.save(output_path, quality=REPORT_JPEG_QUALITY, optimize=True)
+
+    return output_path
+
+
+def min_image_scale(image_paths: Iterable[str]) -> float:
+    """Smallest scale that still shrinks one of the images, given REPORT_IMAGE_MIN_WIDTH_PX."""
+    from PIL import Image
+
+    widths = []
+    for path in image_paths:
+        with Image.open(path) as image:
+            widths.append(image.width)
+    return min(1.0, REPORT_IMAGE_MIN_WIDTH_PX / max(widths)) if widths else 1.0
+
+
+def next_image_scale(scale: float, pdf_bytes: int, image_bytes: int, max_bytes: int) -> Optional[float]:
+    """
+    Returns the image scale to retry with when a PDF of `pdf_bytes` exceeds
+    `max_bytes`, assuming image size grows with the pixel area (scale ** 2).
+    Returns None when there are no images to shrink.
+    """
+    if not image_bytes:
+        return None
+
+    target_image_bytes = max_bytes - (pdf_bytes - image_bytes)
+    ratio = target_image_bytes / image_bytes if target_image_bytes > 0 else 0.0
+    # Shrink by at least 10% and at most 70% per round
+    return scale * min(0.9, max(0.3, math.sqrt(max(ratio, 0.0)) * 0.95))
+
+
+def image_sizes(image_paths: Dict[int, str]) -> int:
+    return sum(os.path.getsize(path) for path in image_paths.values())
@@ -0,0 +1,257 @@
+import os
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from .profile_data import format_column_profile
+
+SCHEMA_CONTEXT_FILE_NAME = "schema_context.json"
+
+# Rough prompt size estimate used when logging prompt sizes
+_CHARS_PER_TOKEN = 4
+
+
+_INVERSE_RELATIONSHIPS = {"many_to_one": "one_to_many", "one_to_one": "one_to_one"}
+
+
+def _table_join_keys(join_keys: List[Dict[str, Any]], tbl_name: str) -> List[Dict[str, str]]:
+    """The join keys of one table, seen from that table (both sides of each detected key)."""
+    table_keys = []
+    for one in join_keys:
+        if one["table"] == tbl_name:
+            table_keys.append({"column": one["column"], "ref_table": one["ref_table"],
+                               "ref_column": one["ref_column"], "relationship": one["relationship"]})
+        if one["ref_table"] == tbl_name:
+            table_keys.append({"column": one["ref_column"], "ref_table": one["table"], "ref_column": one["column"],
+                               "relationship": _INVERSE_RELATIONSHIPS.get(one["relationship"], one["relationship"])})
+    return table_keys
+
+
+def build_schema_context(processed_tables: Dict[str, Any], data_profile: Optional[Dict[str, Any]] = None,
+                         join_keys: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Builds the compact schema context of a session once: for every table its
+    description, join keys and, per column, the type, description and
+    one-line profile.
+
+    Args:
+        processed_tables (dict): Mapping of table name to Table(df, schema).
+        data_profile (dict, optional): Output of `profile_tables`.
+        join_keys (list, optional): Output of `detect_join_keys`.
+
+    Returns:
+        dict: table name → {"description": str, "columns": {column → {"type", "description", "profile"}},
+        "join_keys": [{"column", "ref_table", "ref_column", "relationship"}]}.
+    """
+    data_profile = data_profile or {}
+    join_keys = join_keys or []
+    schema_context: Dict[str, Any] = {}
+
+    for tbl_name, tbl in processed_tables.items():
+        schema = tbl.schema
+        column_profiles = data_profile.get(tbl_name, {}).get("columns", {})
+        descriptions = schema['table_description'].dropna().unique() if 'table_description' in schema else []
+
+        schema_context[tbl_name] = {
+            "description": str(descriptions[0]) if len(descriptions) else "",
+            "columns": {
+                str(col): {
+                    "type": str(data_type),
+                    "description": str(description),
+                    "profile": format_column_profile(column_profiles[str(col)]) if str(col) in column_profiles else "",
+                }
+                for col, description, data_type in zip(
+                    schema['column_name'], schema['column_description'], schema['data_type']
+                )
+            },
+        }
+        table_keys = _table_join_keys(join_keys, tbl_name)
+        if table_keys:
+            schema_context[tbl_name]["join_keys"] = table_keys
+
+    return schema_context
+
+
+def render_schema_context(schema_context: Dict[str, Any],
+                          scope: Optional[Dict[str, Iterable[str]]] = None) -> str:
+    """
+    Renders the schema context as the text block used in prompts, one line per column.
+
+    Args:
+        schema_context (dict): Output of `build_schema_context`.
+        scope (dict, optional): table name → columns to include. Tables not in
+            `scope` are left out, and so are join keys to them; None renders
+            every table and column.
+    """
+    blocks = []
+
+    for tbl_name, tbl_context in schema_context.items():
+        if scope is not None and tbl_name not in scope:
+            continue
+        wanted = set(scope[tbl_name]) if scope is not None else None
+
+        lines = [
+            f"Table name: {tbl_name}",
+            f"Table Description: {tbl_context['description']}",
+            "Columns (name | type | description | profile):",
+        ]
+        for col, column in tbl_context["columns"].items():
+            if wanted is not None and col not in wanted:
+                continue
+            fields = [col, column["type"], column["description"]] + ([column["profile"]] if column["profile"] else [])
+            lines.append("- " + " | ".join(fields))
+
+        join_lines = [
+            f"- {one['column']} -> {one['ref_table']}.{one['ref_column']} ({one['relationship'].replace('_', '-')})"
+            for one in tbl_context.get("join_keys", [])
+            if scope is None or one["ref_table"] in scope
+        ]
+        if join_lines:
+            lines += ["Join keys (column -> table.column):"] + join_lines
+        blocks.append("\n".join(lines))
+
+    return "\n\n".join(blocks) + "\n"
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(one) for one in value]
+
+
+def _related_scope(schema_context: Dict[str, Any], tbl_name: str, one_analytic: dict,
+                   scope: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """
+    Adds to `scope` the tables joined to `tbl_name` that the analytic names
+    (the table itself, `table.column` or, in `column_names`, one of its own
+    columns), with the columns it names and both join key columns.
+    """
+    text = " ".join([str(one_analytic.get('analysis_name') or "")] + _as_list(one_analytic.get('description'))).lower()
+    names = [name.strip().lower() for name in _as_list(one_analytic.get('column_names'))]
+    main_columns = {col.lower() for col in schema_context[tbl_name]["columns"]}
+
+    for one in schema_context[tbl_name].get("join_keys", []):
+        ref_table = one["ref_table"]
+        if ref_table not in schema_context:
+            continue
+        ref_columns = list(schema_context[ref_table]["columns"])
+        prefix = f"{ref_table.lower()}."
+        wanted = {
+            col for col in ref_columns
+            if f"{prefix}{col.lower()}" in names or f"{prefix}{col.lower()}" in text
+            or (col.lower() in names and col.lower() not in main_columns)
+        }
+        if not wanted and ref_table.lower() not in text:
+            continue
+
+        wanted = wanted or set(ref_columns)
+        wanted.add(one["ref_column"])
+        wanted |= set(scope.get(ref_table, []))
+        scope[ref_table] = [col for col in ref_columns if col in wanted]
+        if one["column"] not in scope[tbl_name]:
+            scope[tbl_name] = [col for col in schema_context[tbl_name]["columns"]
+                               if col in scope[tbl_name] or col == one["column"]]
+    return scope
+
+
+def analytic_scope(schema_context: Dict[str, Any], one_analytic: dict,
+                   schema_index=None) -> Optional[Dict[str, List[str]]]:
+    """
+    Returns the tables and columns a planned analytic needs: the `column_names`
+    of the plan plus any column named in its description, and the tables
+    joined to its table that it names, with their join keys. Column names are
+    matched case-insensitively.
+
+    Args:
+        schema_index (SchemaIndex, optional): The session's schema index; when
+            the plan names no known column, or an unknown table, the columns
+            closest to the analytic's description are used instead.
+
+    Returns:
+        dict or None: {table name: [columns]}, or None when the analytic's
+        table is unknown and nothing matched (the caller should fall back to
+        the full schema). When none of the listed columns exist and nothing
+        matched either, every column of the table is kept.
+    """
+    tbl_name = one_analytic.get('table_name')
+    query = " ".join([str(one_analytic.get('analysis_name') or "")] + _as_list(one_analytic.get('description')))
+    if tbl_name not in schema_context:
+        return schema_index.select(query) if schema_index is not None else None
+
+    columns = list(schema_context[tbl_name]["columns"])
+    by_lower = {col.lower(): col for col in columns}
+    description = " ".join(_as_list(one_analytic.get('description'))).lower()
+
+    prefix = f"{tbl_name.lower()}."
+    names = [name.strip().lower() for name in _as_list(one_analytic.get('column_names'))]
+    names = [name[len(prefix):] if name.startswith(prefix) else name for name in names]
+    wanted = {by_lower[name] for name in names if name in by_lower}
+    wanted |= {col for col in columns if col.lower() in description}
+
+    if not wanted:
+        selected = schema_index.select(query, tables=[tbl_name]) if schema_index is not None else None
+        scope = selected if selected and len(selected[tbl_name]) < len(columns) else {tbl_name: columns}
+    else:
+        # Keep the schema's column order
+        scope = {tbl_name: [col for col in columns if col in wanted]}
+    return _related_scope(schema_context, tbl_name, one_analytic, scope)
+
+
+def batch_scope(schema_context: Dict[str, Any], analytics: List[dict],
+                schema_index=None) -> Optional[Dict[str, List[str]]]:
+    """
+    Returns the union of the scopes of several analytics, or None when any of
+    them needs the full schema.
+    """
+    merged: Dict[str, set] = {}
+    for one_analytic in analytics:
+        scope = analytic_scope(schema_context, one_analytic, schema_index)
+        if scope is None:
+            return None
+        for tbl_name, columns in scope.items():
+            merged.setdefault(tbl_name, set()).update(columns)
+
+    return {
+        tbl_name: [col for col in schema_context[tbl_name]["columns"] if col in columns]
+        for tbl_name, columns in merged.items()
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // _CHARS_PER_TOKEN)
+
+
+def scoped_input_table_schema(schema_context: Dict[str, Any], one_analytic: dict, schema_index=None) -> str:
+    """
+    Renders only the table and columns one analytic references, and logs the
+    estimated prompt size against the full schema.
+    """
+    full_tokens = estimate_tokens(render_schema_context(schema_context))
+    scope = analytic_scope(schema_context, one_analytic, schema_index)
+    scoped = render_schema_context(schema_context, scope)
+
+    print(f"Schema context for '{one_analytic.get('analysis_name')}': "
+          f"{full_tokens} -> {estimate_tokens(scoped)} tokens (estimated)")
+    return scoped
+
+
+def get_schema_context(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the session's cached schema context from the state, building it if absent."""
+    return state.get('schema_context') or build_schema_context(state['processed_tables'], state.get('data_profile'))
+
+
+def save_schema_context(schema_context: Dict[str, Any], session_path: str) -> str:
+    context_path = os.path.join(session_path, SCHEMA_CONTEXT_FILE_NAME)
+    with open(context_path, "w", encoding="utf-8") as f:
+        json.dump(schema_context, f)
+    return context_path
+
+
+def load_schema_context(session_path: str) -> Dict[str, Any]:
+    """Loads a saved schema context; returns an empty one if there is none."""
+    try:
+        with open(os.path.join(session_path, SCHEMA_CONTEXT_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
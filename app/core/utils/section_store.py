@@ -0,0 +1,253 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from .prompts import load_prompt
+
+SECTION_REUSE_ENABLED = os.getenv("SECTION_REUSE_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+
+# Section artifacts are stored under <session_path>/<SECTIONS_DIR>
+SECTIONS_DIR = "sections"
+# The session's analytics plan, as generated or as edited through the API
+ANALYTICS_PLAN_FILE_NAME = "analytics_plan.json"
+
+# Prompt templates each artifact is generated from; editing a template
+# invalidates the artifacts built with it
+_PLAN_PROMPTS = ("data_understanding_prompt.txt",)
+_RESULT_PROMPTS = (
+    "code_generation_prompt_template.txt",
+    "batch_code_generation_prompt_template.txt",
+    "code_correction_prompt_template.txt",
+    "sql_generation_prompt_template.txt",
+    "batch_sql_generation_prompt_template.txt",
+    "sql_correction_prompt_template.txt",
+)
+_CONTENT_PROMPTS = ("plotting_prompt_template.txt", "interpretation_prompt_template.txt")
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _prompts_digest(file_names: Iterable[str]) -> str:
+    return _digest(*(load_prompt(name) for name in file_names))
+
+
+def _model_identity(llm_model) -> Dict[str, Any]:
+    """Model name, temperature and backend of a chat model, as LangChain identifies it."""
+    try:
+        return dict(llm_model._identifying_params)
+    except Exception:
+        return {"type": type(llm_model).__name__}
+
+
+def _frame_digest(data) -> bytes:
+    """Hashes the labels, dtypes and values of a DataFrame or Series."""
+    digest = hashlib.sha256()
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in frame.dtypes.items()]).encode("utf-8"))
+    try:
+        values = pd.util.hash_pandas_object(frame, index=True)
+    except TypeError:
+        # Unhashable cells (lists, dicts); hash their text instead
+        values = pd.util.hash_pandas_object(frame.astype(str), index=True)
+    digest.update(values.values.tobytes())
+    return digest.digest()
+
+
+def table_content_hash(df: pd.DataFrame) -> str:
+    """Content hash of a table: column names, dtypes and every value."""
+    return _frame_digest(df).hex()
+
+
+def table_content_hashes(processed_tables: Dict[str, Any], table_names: Iterable[str]) -> Dict[str, str]:
+    """Content hashes of the named tables that exist in `processed_tables`."""
+    return {
+        name: table_content_hash(processed_tables[name].df)
+        for name in set(table_names) if name in processed_tables
+    }
+
+
+def result_hash(result: Any) -> str:
+    """Content hash of an analytic's result (DataFrame, Series or any picklable value)."""
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return _frame_digest(result).hex()
+    try:
+        return hashlib.sha256(pickle.dumps(result)).hexdigest()
+    except Exception:
+        return _digest(type(result).__name__, repr(result))
+
+
+def plan_key(input_table_schema: str, llm_model) -> str:
+    """Key of the analytics plan: the schema context the plan is generated from."""
+    return _digest("plan", input_table_schema, _prompts_digest(_PLAN_PROMPTS), _model_identity(llm_model))
+
+
+def analytic_result_key(one_analytic: dict, table_hashes: Dict[str, str], llm_model) -> str:
+    """
+    Key of an analytic's code and result: the analytic as planned, the
+    content of the session's tables (its own and those it may join through
+    `tables`) and the language it is written in.
+    """
+    from .code_executor import CODE_LANGUAGE
+
+    analytic = {
+        field: one_analytic.get(field)
+        for field in ("analysis_type", "analysis_name", "table_name", "column_names", "description")
+    }
+    return _digest("result", analytic, table_hashes.get(one_analytic.get('table_name')),
+                   sorted(table_hashes.items()), CODE_LANGUAGE, _prompts_digest(_RESULT_PROMPTS),
+                   _model_identity(llm_model))
+
+
+def analytic_result_keys(analytics: List[dict], processed_tables: Dict[str, Any], llm_model) -> List[str]:
+    """`analytic_result_key` of every analytic of a plan, hashing each table once."""
+    table_hashes = table_content_hashes(processed_tables, processed_tables)
+    return [analytic_result_key(one, table_hashes, llm_model) for one in analytics]
+
+
+def section_content_key(query_result: dict, llm_model) -> str:
+    """Key of a section's plot and narrative: the analytic's name and result."""
+    from .plot_renderer import PLOT_DPI, PLOT_FIGSIZE
+
+    return _digest(
+        "content", query_result['analysis_name'], result_hash(query_result['result']),
+        _prompts_digest(_CONTENT_PROMPTS), _model_identity(llm_model), PLOT_FIGSIZE, PLOT_DPI,
+    )
+
+
+def report_key(report_content: List[dict], plot_paths: Dict[int, str]) -> str:
+    """
+    Key of the PDF: every section's title, narrative and plot bytes, the
+    report image settings and the date printed on the title page.
+    """
+    from .report_images import (
+        REPORT_IMAGE_FORMAT, REPORT_IMAGE_MIN_WIDTH_PX, REPORT_JPEG_QUALITY, REPORT_MAX_BYTES, REPORT_PNG_COLORS
+    )
+
+    sections = []
+    for idx, content in enumerate(report_content):
+        plot_digest = None
+        if idx in plot_paths:
+            with open(plot_paths[idx], "rb") as f:
+                plot_digest = hashlib.sha256(f.read()).hexdigest()
+        sections.append([content.get('analysis_name'), content.get('narrative'), plot_digest])
+
+    return _digest(
+        "report", sections, date.today().isoformat(), REPORT_IMAGE_FORMAT, REPORT_PNG_COLORS,
+        REPORT_JPEG_QUALITY, REPORT_MAX_BYTES, REPORT_IMAGE_MIN_WIDTH_PX,
+    )
+
+
+class SectionStore:
+    """
+    Per-session store of report artifacts keyed by a content hash of their
+    inputs: the analytics plan, each analytic's code and result, each
+    section's plot and narrative, and the PDF's stats. A regeneration looks
+    every stage up by its key and only recomputes the sections whose inputs
+    changed.
+
+    Entries are pickles written atomically, one file per key; a section's plot
+    is kept next to its entry.
+    """
+
+    def __init__(self, session_path: str):
+        self.session_path = session_path
+        self.path = os.path.join(session_path, SECTIONS_DIR)
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry_path(self, key: str, extension: str = "pkl") -> str:
+        return os.path.join(self.path, f"{key}.{extension}")
+
+    def _replace(self, write, path: str) -> None:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the artifact stored under `key`, or None."""
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def put(self, key: str, value: Any) -> bool:
+        """Stores `value` under `key`; returns False if it cannot be pickled."""
+        try:
+            payload = pickle.dumps(value)
+        except Exception as e:
+            print(f"Section artifact {key[:12]} cannot be stored: {e}")
+            return False
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+
+        with self._lock:
+            self._replace(write, self._entry_path(key))
+        return True
+
+    def save_plot(self, key: str, plot_path: str) -> None:
+        """Keeps a copy of a section's rendered plot under `key`."""
+        with self._lock:
+            self._replace(lambda tmp_path: shutil.copyfile(plot_path, tmp_path), self._entry_path(key, "png"))
+
+    def restore_plot(self, key: str, plot_path: str) -> bool:
+        """Copies the plot stored under `key` to `plot_path`; False if there is none."""
+        stored_path = self._entry_path(key, "png")
+        if not os.path.exists(stored_path):
+            return False
+        os.makedirs(os.path.dirname(plot_path) or ".", exist_ok=True)
+        shutil.copyfile(stored_path, plot_path)
+        return True
+
+
+def get_section_store(session_path: str, enabled: bool = True) -> Optional[SectionStore]:
+    """Returns the session's section store, or None if reuse is disabled."""
+    if not (SECTION_REUSE_ENABLED and enabled and session_path):
+        return None
+    return SectionStore(session_path)
+
+
+def load_analytics_plan(session_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the session's saved plan record ({"key", "edited", "plan"}), or
+    None if no plan was generated or uploaded yet.
+    """
+    try:
+        with open(os.path.join(session_path, SECTIONS_DIR, ANALYTICS_PLAN_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_analytics_plan(session_path: str, plan: Dict[str, Any], key: Optional[str] = None,
+                        edited: bool = False) -> None:
+    """
+    Saves the session's analytics plan. An edited plan (`edited=True`) is used
+    by every later report of the session instead of a generated one.
+    """
+    path = os.path.join(session_path, SECTIONS_DIR, ANALYTICS_PLAN_FILE_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "edited": edited, "plan": plan}, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def delete_analytics_plan(session_path: str) -> bool:
+    """Drops the session's saved plan, so the next report plans from scratch."""
+    try:
+        os.remove(os.path.join(session_path, SECTIONS_DIR, ANALYTICS_PLAN_FILE_NAME))
+        return True
+    except FileNotFoundError:
+        return False
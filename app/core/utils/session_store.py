@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .columnar_store import COLUMNAR_DIR, SESSION_DATA_TYPE, load_session_tables, schema_file_name
+from .preprocess_data import table_memory_footprint
+from .profile_data import load_profile
+from .join_keys import load_join_keys
+from .schema_context import build_schema_context, load_schema_context, save_schema_context
+
+SESSIONS_ROOT = os.getenv("SESSIONS_ROOT", "app/data_storage")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(SESSIONS_ROOT, "sessions.db"))
+# Bounds of the in-memory (hot) tier; least-recently-used sessions are dropped
+# past either limit and reloaded from their columnar files on the next access.
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "8"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+REPORT_FILE_NAME = "financial_analysis_report.pdf"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    session_path TEXT NOT NULL,
+    table_names TEXT NOT NULL,
+    report_path TEXT,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL
+)
+"""
+
+
+class SessionStore:
+    """
+    Two-tier session store.
+
+    Session metadata (paths, table names, report path) lives in a SQLite
+    database shared by every worker process, so any uvicorn worker can serve
+    any session id. Table data lives on disk as the session's memory-mapped
+    columnar files; the tables of recently used sessions are also kept in a
+    bounded in-memory LRU and are reloaded lazily after eviction or restart.
+
+    `get` returns the same session dict the API used before: processed_tables,
+    session_path, columnar_path, table_names, data_profile, schema_context,
+    report_path and plots_path.
+    """
+
+    def __init__(self, db_path: str = SESSION_DB_PATH, sessions_root: str = SESSIONS_ROOT,
+                 max_sessions: int = SESSION_CACHE_MAX_SESSIONS, max_bytes: int = SESSION_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.sessions_root = sessions_root
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # session id → (tables, data_profile, schema_context, footprint in bytes)
+        self._hot: "OrderedDict[str, tuple]" = OrderedDict()
+        self._hot_bytes = 0
+        # Per-session locks so concurrent requests reload a cold session once
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # WAL lets readers in other workers proceed while one worker writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # --- Metadata tier ---
+
+    def _read_row(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT session_path, table_names, report_path FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE sessions SET last_accessed = ? WHERE session_id = ?", (time.time(), session_id))
+
+        if row is None:
+            return self._discover(session_id)
+
+        session_path, table_names, report_path = row
+        return {"session_path": session_path, "table_names": json.loads(table_names), "report_path": report_path}
+
+    def _write_row(self, session_id: str, session_path: str, table_names: List[str],
+                   report_path: Optional[str] = None) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, session_path, table_names, report_path, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, session_path, json.dumps(table_names), report_path, now, now),
+            )
+
+    def _discover(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Registers a session directory written before the metadata store existed."""
+        session_path = os.path.join(self.sessions_root, os.path.basename(session_id))
+        columnar_path = os.path.join(session_path, COLUMNAR_DIR)
+        if not session_id or not os.path.isdir(columnar_path):
+            return None
+
+        suffix = f".{SESSION_DATA_TYPE}"
+        table_names = sorted(
+            name[: -len(suffix)] for name in os.listdir(columnar_path)
+            if name.endswith(suffix) and not name.endswith(f"{schema_file_name('')}{suffix}")
+        )
+        if not table_names:
+            return None
+
+        report_path = os.path.join(session_path, REPORT_FILE_NAME)
+        report_path = report_path if os.path.exists(report_path) else None
+        self._write_row(session_id, session_path, table_names, report_path)
+        return {"session_path": session_path, "table_names": table_names, "report_path": report_path}
+
+    # --- Hot tier ---
+
+    def _remember(self, session_id: str, tables: Dict[str, Any], data_profile: Dict[str, Any],
+                  schema_context: Dict[str, Any]) -> tuple:
+        footprint = sum(table_memory_footprint(tables).values())
+        entry = (tables, data_profile, schema_context, footprint)
+
+        with self._lock:
+            if session_id in self._hot:
+                self._hot_bytes -= self._hot.pop(session_id)[-1]
+            self._hot[session_id] = entry
+            self._hot_bytes += footprint
+
+            # Always keep the session just added, even if it alone exceeds the budget
+            while len(self._hot) > 1 and (len(self._hot) > self.max_sessions or self._hot_bytes > self.max_bytes):
+                _, evicted = self._hot.popitem(last=False)
+                self._hot_bytes -= evicted[-1]
+                self.evictions += 1
+
+        return entry
+
+    def _recall(self, session_id: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._hot.get(session_id)
+            if entry is not None:
+                self._hot.move_to_end(session_id)
+                self.hits += 1
+            return entry
+
+    def _load_tables(self, session_id: str, session_path: str, table_names: List[str]) -> tuple:
+        with self._lock:
+            load_lock = self._load_locks.setdefault(session_id, threading.Lock())
+
+        with load_lock:
+            # Another request may have loaded it while we waited
+            entry = self._recall(session_id)
+            if entry is not None:
+                return entry
+
+            tables = load_session_tables(os.path.join(session_path, COLUMNAR_DIR), table_names)
+            data_profile = load_profile(session_path)
+            schema_context = load_schema_context(session_path)
+            if not schema_context:
+                # Sessions created before the schema context was saved
+                schema_context = build_schema_context(tables, data_profile, load_join_keys(session_path))
+                save_schema_context(schema_context, session_path)
+            entry = self._remember(session_id, tables, data_profile, schema_context)
+            with self._lock:
+                self.loads += 1
+                self._load_locks.pop(session_id, None)
+            return entry
+
+    # --- Public API ---
+
+    def create(self, session_id: str, session_path: str, processed_tables: Dict[str, Any],
+               data_profile: Dict[str, Any], schema_context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Registers a new session whose tables were already saved under
+        `<session_path>/arrow`, and keeps its tables hot.
+        """
+        table_names = list(processed_tables.keys())
+        self._write_row(session_id, session_path, table_names)
+        self._remember(session_id, processed_tables, data_profile, schema_context)
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the session dict for `session_id`, or None if it does not exist.
+        Cold sessions are reloaded by memory-mapping their columnar tables.
+        """
+        if not session_id:
+            return None
+
+        meta = self._read_row(session_id)
+        if meta is None:
+            return None
+
+        entry = self._recall(session_id) or self._load_tables(session_id, meta["session_path"], meta["table_names"])
+        tables, data_profile, schema_context, _ = entry
+
+        plots_path = os.path.join(meta["session_path"], "plots")
+        os.makedirs(plots_path, exist_ok=True)
+        return {
+            "processed_tables": tables,
+            "session_path": meta["session_path"],
+            "columnar_path": os.path.join(meta["session_path"], COLUMNAR_DIR),
+            "table_names": meta["table_names"],
+            "data_profile": data_profile,
+            "schema_context": schema_context,
+            "report_path": meta["report_path"],
+            "plots_path": plots_path,
+        }
+
+    def set_report_path(self, session_id: str, report_path: Optional[str]) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET report_path = ? WHERE session_id = ?", (report_path, session_id))
+
+    def evict(self, session_id: str) -> None:
+        """Drops a session's tables from memory; its files and metadata stay."""
+        with self._lock:
+            entry = self._hot.pop(session_id, None)
+            if entry is not None:
+                self._hot_bytes -= entry[-1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            return {
+                "sessions": total,
+                "hot_sessions": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Returns the process-wide session store."""
+    global _session_store
+
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+        return _session_store
@@ -0,0 +1,157 @@
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Set
+
+# --- Worker side ---
+
+# Where this worker reports the id of each task it starts
+_started_queue = None
+
+
+def _init_pool_worker(started_queue, initializer: Optional[Callable], initargs: tuple) -> None:
+    global _started_queue
+    _started_queue = started_queue
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _call(task_id: int, fn: Callable, args: tuple) -> Any:
+    _started_queue.put(task_id)
+    return fn(*args)
+
+
+# --- API process side ---
+
+
+class SharedProcessPool:
+    """
+    Process-wide pool of spawned worker processes shared by every session and
+    report, which contains a failed task instead of failing its neighbours.
+
+    - A task's timeout counts from when a worker starts it, not from when it
+      was queued behind busy workers. A task that outlives it retires the
+      pool: new tasks go to a fresh pool at once, and so do the tasks queued
+      on the old one. The tasks already running there may finish (up to the
+      same timeout) before its workers, the stuck one included, are killed.
+    - A worker that dies (e.g. killed for exceeding its memory) breaks the
+      whole pool, and every task in flight on it fails with BrokenProcessPool.
+      Each of them is then re-run alone in a single-worker pool, so only the
+      task that killed the worker fails.
+    """
+
+    def __init__(self, max_workers: int, initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[ProcessPoolExecutor, Set[Any]] = {}
+        # Set once a worker starts the task (or it is done without starting), by task id
+        self._started: Dict[int, threading.Event] = {}
+        self._started_queues: Dict[ProcessPoolExecutor, Any] = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _new_pool(self, max_workers: int) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context("spawn")
+        started_queue = context.SimpleQueue()
+        pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_pool_worker,
+            initargs=(started_queue, self.initializer, self.initargs),
+        )
+        self._started_queues[pool] = started_queue
+
+        def _listen():
+            for task_id in iter(started_queue.get, None):
+                started = self._started.get(task_id)
+                if started is not None:
+                    started.set()
+
+        threading.Thread(target=_listen, name="worker-pool-starts", daemon=True).start()
+        return pool
+
+    def _kill(self, pool: ProcessPoolExecutor) -> None:
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+        started_queue = self._started_queues.pop(pool, None)
+        if started_queue is not None:
+            started_queue.put(None)
+
+    def _submit_to(self, pool: ProcessPoolExecutor, fn: Callable, args: tuple):
+        task_id = next(self._task_ids)
+        started = self._started[task_id] = threading.Event()
+        future = pool.submit(_call, task_id, fn, args)
+
+        def _done(done_future):
+            self._started.pop(task_id, None)
+            started.set()
+        future.add_done_callback(_done)
+        return future, started
+
+    def _submit(self, fn: Callable, args: tuple):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._new_pool(self.max_workers)
+            pool = self._pool
+            future, started = self._submit_to(pool, fn, args)
+            self._in_flight.setdefault(pool, set()).add(future)
+
+        def _done(done_future, pool=pool):
+            with self._lock:
+                self._in_flight.get(pool, set()).discard(done_future)
+        future.add_done_callback(_done)
+        return pool, future, started
+
+    @staticmethod
+    def _result(future, started: threading.Event, timeout: float) -> Any:
+        # Waiting in the queue does not count against the timeout
+        started.wait()
+        return future.result(timeout=timeout)
+
+    def _retire(self, pool: ProcessPoolExecutor, timeout: float, stuck=None) -> None:
+        """Stops handing out `pool` and kills it once its other tasks are done or out of time."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            others = [one for one in self._in_flight.pop(pool, set()) if one is not stuck]
+        # Tasks that have not started yet are cancelled; `run` moves them to the fresh pool
+        others = [one for one in others if not one.cancel()]
+
+        def _reap():
+            wait(others, timeout=timeout)
+            self._kill(pool)
+
+        threading.Thread(target=_reap, name="retire-worker-pool", daemon=True).start()
+
+    def _run_alone(self, fn: Callable, args: tuple, timeout: float) -> Any:
+        pool = self._new_pool(1)
+        try:
+            return self._result(*self._submit_to(pool, fn, args), timeout)
+        finally:
+            self._kill(pool)
+
+    def run(self, fn: Callable, *args, timeout: float) -> Any:
+        """
+        Runs `fn(*args)` in a worker and returns its result.
+
+        Raises:
+            concurrent.futures.TimeoutError: The task did not finish within `timeout` seconds of starting.
+            BrokenProcessPool: The task killed its worker, even when run alone.
+        """
+        pool, future, started = self._submit(fn, args)
+        try:
+            return self._result(future, started, timeout)
+        except FutureTimeoutError:
+            self._retire(pool, timeout, stuck=future)
+            raise
+        except CancelledError:
+            # Queued on a pool that was retired before the task started
+            return self.run(fn, *args, timeout=timeout)
+        except BrokenProcessPool:
+            self._retire(pool, timeout)
+            return self._run_alone(fn, args, timeout)
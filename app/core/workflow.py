@@ -1,16 +1,40 @@
+from functools import lru_cache
+from typing import Annotated
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from .state import merge_report_state
 from .agents.understand_data import data_understanding_node
+from .utils.schema_context import get_schema_context
+from .utils.section_store import SECTION_REUSE_ENABLED, analytic_result_keys
 from .agents.plan_analytics import analytics_planning_node
 from .agents.code_execution_agent import code_execution_node
 from .agents.content_planning_agent import content_planning_node
+from .agents.analytic_pipeline import analytic_pipeline_node, assemble_sections_node
 from .agents.report_generation import report_generation_node
+from .agents.chat_agent import chat_query_node, chat_answer_node, chat_memory_node
 from .llm_tools.schema_selection import schema_selection_node
 # from IPython.display import Image, display
 
 
-def build_report_workflow(state):
-    """Builds the workflow for the Agentic AI Data Analyst."""
-    
+def build_report_workflow(state=None, pipelined: bool = False):
+    """
+    Builds the workflow for the Agentic AI Data Analyst.
+
+    The graph is compiled once per mode and then reused: a compiled graph holds
+    no per-run state, so concurrent report jobs can share it.
+
+    Args:
+        state (dict, optional): The initial report state (unused by the graph structure).
+        pipelined (bool): If True, each suggested analytic flows through
+            generate -> execute -> plot -> narrate in its own branch instead of
+            waiting at a barrier after every stage.
+    """
+    if pipelined:
+        return build_pipelined_report_workflow(state)
+    return _compile_staged_report_workflow()
+
+@lru_cache(maxsize=None)
+def _compile_staged_report_workflow():
     # Build the LangGraph
     workflow = StateGraph(dict)
 
@@ -34,14 +58,78 @@ def build_report_workflow(state):
     
     return workflow.compile()
 
-def build_chat_workflow(state):
-    """Builds the workflow for the chat functionality of the Agentic AI Data Analyst."""
-    
+def dispatch_analytics(state):
+    """Fans out one `analytic_pipeline` branch per suggested analytic."""
+    schema_context = get_schema_context(state)
+    analytics_suggested = state['analytics_plan']['analytics_suggested']
+    # Tables are hashed once here rather than once per branch
+    reuse_sections = SECTION_REUSE_ENABLED and state.get('reuse_sections', True)
+    section_keys = (analytic_result_keys(analytics_suggested, state['processed_tables'], state['llm_model'])
+                    if reuse_sections else [None] * len(analytics_suggested))
+
+    return [
+        Send("analytic_pipeline", {
+            "idx": idx,
+            "analytic": one_analytic,
+            "schema_context": schema_context,
+            "llm_model": state['llm_model'],
+            "processed_tables": state['processed_tables'],
+            "plots_path": state['plots_path'],
+            "job_path": state.get('job_path', ""),
+            "reuse_sections": reuse_sections,
+            "section_key": section_keys[idx],
+        })
+        for idx, one_analytic in enumerate(analytics_suggested)
+    ]
+
+def build_pipelined_report_workflow(state=None):
+    """
+    Builds the per-analytic pipelined variant of the report workflow.
+
+    `START` -> `data_understanding` -> N x `analytic_pipeline` -> `assemble_sections`
+    -> `report_generation` -> `END`
+    """
+    return _compile_pipelined_report_workflow()
+
+@lru_cache(maxsize=None)
+def _compile_pipelined_report_workflow():
+    # The root state needs a reducer because the analytic branches update it in parallel
+    workflow = StateGraph(Annotated[dict, merge_report_state])
+
+    workflow.add_node("data_understanding", data_understanding_node)
+    workflow.add_node("analytic_pipeline", analytic_pipeline_node)
+    workflow.add_node("assemble_sections", assemble_sections_node)
+    workflow.add_node("report_generation", report_generation_node)
+
+    workflow.add_edge(START, "data_understanding")
+    workflow.add_conditional_edges("data_understanding", dispatch_analytics, ["analytic_pipeline"])
+    workflow.add_edge("analytic_pipeline", "assemble_sections")
+    workflow.add_edge("assemble_sections", "report_generation")
+    workflow.add_edge("report_generation", END)
+
+    return workflow.compile()
+
+def build_chat_workflow(state=None):
+    """
+    Builds (once) the workflow for the chat functionality of the Agentic AI Data Analyst.
+
+    `START` -> `schema_selection` -> `chat_query` -> `chat_answer` -> `chat_memory` -> `END`
+    """
+    return _compile_chat_workflow()
+
+@lru_cache(maxsize=None)
+def _compile_chat_workflow():
     # Build the LangGraph
     workflow = StateGraph(dict)
     workflow.add_node("schema_selection", schema_selection_node)
+    workflow.add_node("chat_query", chat_query_node)
+    workflow.add_node("chat_answer", chat_answer_node)
+    workflow.add_node("chat_memory", chat_memory_node)
 
     workflow.add_edge(START, "schema_selection")
-    workflow.add_edge("schema_selection", END)
+    workflow.add_edge("schema_selection", "chat_query")
+    workflow.add_edge("chat_query", "chat_answer")
+    workflow.add_edge("chat_answer", "chat_memory")
+    workflow.add_edge("chat_memory", END)
     
     return workflow.compile()
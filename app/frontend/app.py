@@ -1,7 +1,7 @@
 import streamlit as st
 import requests
 import os
-import time
+import json
 
 st.title("Agentic AI Data Analyst")
 
@@ -15,15 +15,108 @@ if 'report_path' not in st.session_state:
     st.session_state.report_path = None
 if 'report_ready' not in st.session_state:
     st.session_state.report_ready = False
+if 'report_version' not in st.session_state:
+    st.session_state.report_version = None
 if 'page' not in st.session_state:
     st.session_state.page = "main"
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+if 'report_sections' not in st.session_state:
+    st.session_state.report_sections = {}
 
 # --- Page Navigation ---
 def navigate_to(page):
     st.session_state.page = page
 
+# --- Report Download ---
+@st.cache_data(max_entries=8, show_spinner=False)
+def fetch_report(report_url, session_id, report_version):
+    """
+    Downloads a report once per session and report version. Streamlit reruns
+    the script on every interaction; later reruns are served from this cache
+    without contacting the backend. Failed downloads raise, so they are not cached.
+
+    Returns:
+        bytes: The PDF.
+    """
+    response = requests.get(report_url, timeout=(5, 60))
+    response.raise_for_status()
+    return response.content
+
+# --- Report Progress ---
+def iter_job_events(job_id):
+    """Yields the report job's progress events from its Server-Sent Events stream."""
+    with requests.get(f"{API_URL}/report/jobs/{job_id}/events", stream=True, timeout=(5, None)) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data: "):
+                yield json.loads(line[len("data: "):])
+
+def fetch_plot(plot_url):
+    """
+    Downloads a section's plot through this server, since API_URL is only
+    reachable from here and not from a remote browser.
+
+    Returns:
+        bytes or None: The image, or None if it could not be fetched.
+    """
+    try:
+        response = requests.get(f"{API_URL}{plot_url}", timeout=(5, 30))
+        response.raise_for_status()
+        return response.content
+    except requests.exceptions.RequestException:
+        return None
+
+def render_section(section):
+    st.subheader(section["analysis_name"])
+    if section.get("plot_url"):
+        # Kept with the section, so reruns do not download it again
+        if section.get("plot_bytes") is None:
+            section["plot_bytes"] = fetch_plot(section["plot_url"])
+        if section["plot_bytes"] is not None:
+            st.image(section["plot_bytes"])
+        else:
+            st.warning("Could not load the plot of this section.")
+    st.markdown(section.get("narrative", ""))
+
+def follow_report_job(job):
+    """
+    Renders the report job's progress as it streams in: the current step,
+    executed analytics and every section as soon as it is completed.
+
+    Returns:
+        dict: The final job status.
+    """
+    status_box = st.empty()
+    progress_bar = st.progress(0.0)
+    sections_area = st.container()
+    analyses, executed = [], set()
+
+    for event in iter_job_events(job["job_id"]):
+        kind = event["event"]
+        if kind == "status":
+            job.update(status=event["status"], error=event.get("error"))
+            status_box.info(f"Report job {event['status']}...")
+        elif kind == "analytics_planned":
+            analyses = event["analyses"]
+            status_box.info(f"Planned {len(analyses)} analyses: " + ", ".join(analyses))
+        elif kind == "node_completed":
+            status_box.info(f"Finished step: {event['node'].replace('_', ' ')}")
+        elif kind == "analytic_executed":
+            executed.add(event["idx"])
+            status_box.info(f"Executed '{event['analysis_name']}'" + ("" if event["ok"] else " (failed)"))
+        elif kind == "section_completed":
+            st.session_state.report_sections[event["idx"]] = event
+            with sections_area:
+                render_section(event)
+
+        if analyses:
+            done = len(executed) + len(st.session_state.report_sections)
+            progress_bar.progress(min(1.0, done / (2 * len(analyses))))
+
+    status_box.empty()
+    progress_bar.empty()
+    return job
+
 # --- Main Page ---
 def main_page():
     st.header("2. Generate Analysis Report")
@@ -36,30 +129,48 @@ def main_page():
                 try:
                     response = requests.post(f"{API_URL}/report?session_id={st.session_state.session_id}")
 
-                    if response.status_code == 200:
-                        data = response.json()
-                        st.session_state.report_path = data.get("report_path")
-                        st.session_state.report_ready = True
-                        st.success("Report generated successfully!")
+                    if response.status_code == 202:
+                        job = response.json()
+                        st.session_state.report_ready = False
+                        st.session_state.report_sections = {}
+                        job = follow_report_job(job)
+
+                        if job.get("status") == "succeeded":
+                            st.session_state.report_path = job.get("report_path")
+                            # Each successful job is a new version of the session's report
+                            st.session_state.report_version = job.get("job_id")
+                            st.session_state.report_ready = True
+                            st.success("Report generated successfully!")
+                        else:
+                            st.error(f"Report job {job.get('status')}: {job.get('error')}")
+                    elif response.status_code == 429:
+                        st.warning("The server is busy generating other reports. Please try again shortly.")
                     else:
                         st.error(f"Error generating report: {response.status_code} - {response.text}")
                 except requests.exceptions.ConnectionError:
                     st.error("Connection Error: Could not connect to the backend.")
 
+        elif st.session_state.report_sections:
+            # Sections streamed during the last run (Streamlit reruns the script on every interaction)
+            for idx in sorted(st.session_state.report_sections):
+                render_section(st.session_state.report_sections[idx])
+
         if st.session_state.report_ready and st.session_state.report_path:
             st.markdown("### 3. Download Your Report")
             try:
-                report_url = f"{API_URL}{st.session_state.report_path}"
-                report_response = requests.get(report_url)
-                if report_response.status_code == 200:
-                    st.download_button(
-                        label="Download PDF Report",
-                        data=report_response.content,
-                        file_name="financial_analysis_report.pdf",
-                        mime="application/pdf"
-                    )
-                else:
-                    st.error("Could not fetch the report for download.")
+                report_bytes = fetch_report(
+                    f"{API_URL}{st.session_state.report_path}",
+                    st.session_state.session_id,
+                    st.session_state.report_version
+                )
+                st.download_button(
+                    label="Download PDF Report",
+                    data=report_bytes,
+                    file_name="financial_analysis_report.pdf",
+                    mime="application/pdf"
+                )
+            except requests.exceptions.HTTPError:
+                st.error("Could not fetch the report for download.")
             except requests.exceptions.ConnectionError:
                 st.error("Connection Error: Could not fetch the report.")
     else:
@@ -105,16 +216,17 @@ def chat_page():
 # --- Sidebar for Data Upload and Navigation ---
 with st.sidebar:
     st.header("1. Start New Session")
-    data_file = st.file_uploader("Upload CSV Data File", type="csv")
-    schema_file = st.file_uploader("Upload Schema File", type="csv")
+    data_files = st.file_uploader("Upload CSV Data Files", type="csv", accept_multiple_files=True)
+    schema_files = st.file_uploader(
+        "Upload Schema Files", type="csv", accept_multiple_files=True,
+        help="One per data file, named <data file>_schema.csv or uploaded in the same order."
+    )
 
     if st.button("Start Session"):
-        if data_file and schema_file:
+        if data_files and schema_files:
             with st.spinner("Creating session and processing data..."):
-                files = {
-                    "data_file": (data_file.name, data_file, "text/csv"),
-                    "schema_file": (schema_file.name, schema_file, "text/csv")
-                }
+                files = [("data_file", (one.name, one, "text/csv")) for one in data_files]
+                files += [("schema_file", (one.name, one, "text/csv")) for one in schema_files]
                 try:
                     response = requests.post(f"{API_URL}/session", files=files)
                     if response.status_code == 200:
@@ -122,8 +234,13 @@ with st.sidebar:
                         st.session_state.session_id = data.get("session_id")
                         st.session_state.report_ready = False
                         st.session_state.report_path = None
+                        st.session_state.report_version = None
+                        st.session_state.report_sections = {}
                         st.session_state.chat_history = []
                         st.success(f"Session created: {st.session_state.session_id}")
+                        for one in data.get("join_keys") or []:
+                            st.caption(f"Join key: {one['table']}.{one['column']} -> "
+                                       f"{one['ref_table']}.{one['ref_column']}")
                         navigate_to("main")  # Switch to main page after session creation
                     else:
                         st.error(f"Error creating session: {response.text}")
@@ -0,0 +1,174 @@
+"""
+Compares the pandas and DuckDB execution backends on equivalent analytics.
+
+Each analytic is written twice, as the `analyze_data(df)` code the python
+backends run and as the SQL query the duckdb backend runs, and both are
+executed through their executor (`InProcessExecutor` and `DuckDBExecutor`)
+on the same table:
+
+- group_by: sum, mean and count of a measure per category.
+- filter_count: rows matching a range and category filter.
+- top_k: the 10 largest values of a measure with their keys.
+- distinct: number of distinct values of a high-cardinality key.
+- window: running total of a measure per category, summarized per category.
+
+The table is synthetic (--rows rows of a category, a key, two measures and a
+date) unless --table points to a session's Arrow file, in which case the
+queries use --category-column and --measure-column.
+
+Usage (from the repository root):
+
+    python benchmarks/execution_benchmark.py
+    python benchmarks/execution_benchmark.py --rows 20000000 --runs 5 --json
+    python benchmarks/execution_benchmark.py --table app/data_storage/<session>/arrow/df.arrow \\
+        --category-column Region --measure-column Revenue
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+TABLE_NAME = "df"
+
+
+def synthetic_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "category": rng.choice([f"c{i}" for i in range(50)], rows),
+        "key": rng.integers(0, max(1, rows // 10), rows),
+        "amount": rng.normal(100.0, 25.0, rows),
+        "quantity": rng.integers(1, 100, rows),
+        "day": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, rows), unit="D"),
+    })
+
+
+def analytics(category: str, measure: str, key: str) -> List[Tuple[str, str, str]]:
+    """(name, pandas code, SQL) of each benchmarked analytic."""
+    return [
+        (
+            "group_by",
+            f"def analyze_data(df):\n"
+            f"    return df.groupby({category!r})[{measure!r}].agg(['sum', 'mean', 'count']).reset_index()",
+            f'SELECT "{category}", SUM("{measure}") AS sum, AVG("{measure}") AS mean, COUNT("{measure}") AS count '
+            f'FROM {TABLE_NAME} GROUP BY 1',
+        ),
+        (
+            "filter_count",
+            f"def analyze_data(df):\n"
+            f"    first = df[{category!r}].iloc[0]\n"
+            f"    mask = (df[{measure!r}] > df[{measure!r}].median()) & (df[{category!r}] != first)\n"
+            f"    return int(mask.sum())",
+            f'SELECT COUNT(*) AS matches FROM {TABLE_NAME} '
+            f'WHERE "{measure}" > (SELECT MEDIAN("{measure}") FROM {TABLE_NAME}) '
+            f'AND "{category}" <> (SELECT "{category}" FROM {TABLE_NAME} LIMIT 1)',
+        ),
+        (
+            "top_k",
+            f"def analyze_data(df):\n"
+            f"    return df.nlargest(10, {measure!r})[[{key!r}, {measure!r}]]",
+            f'SELECT "{key}", "{measure}" FROM {TABLE_NAME} ORDER BY "{measure}" DESC LIMIT 10',
+        ),
+        (
+            "distinct",
+            f"def analyze_data(df):\n"
+            f"    return int(df[{key!r}].nunique())",
+            f'SELECT COUNT(DISTINCT "{key}") AS distinct_keys FROM {TABLE_NAME}',
+        ),
+        (
+            "window",
+            f"def analyze_data(df):\n"
+            f"    running = df.groupby({category!r})[{measure!r}].cumsum()\n"
+            f"    return running.groupby(df[{category!r}]).max().reset_index()",
+            f'SELECT "{category}", MAX(running) AS running FROM ('
+            f'SELECT "{category}", SUM("{measure}") OVER (PARTITION BY "{category}" ROWS UNBOUNDED PRECEDING) '
+            f'AS running FROM {TABLE_NAME}) GROUP BY 1',
+        ),
+    ]
+
+
+def _time(executor, code: str, runs: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        outcome = executor.run(code, TABLE_NAME)
+        timings.append(time.perf_counter() - started)
+        if outcome.error is not None:
+            return {"error": outcome.error}
+    return {"median_seconds": round(statistics.median(timings), 4), "min_seconds": round(min(timings), 4)}
+
+
+def run_benchmark(df: pd.DataFrame, runs: int, threads: int, category: str, measure: str, key: str,
+                  table_dir: str) -> Dict[str, Any]:
+    from app.core.utils.load_data import Table
+    from app.core.utils.code_executor import DuckDBExecutor, InProcessExecutor
+
+    processed_tables = {TABLE_NAME: Table(df=df, schema=None)}
+    pandas_executor = InProcessExecutor(processed_tables)
+    duckdb_executor = DuckDBExecutor(processed_tables, table_dir, threads=threads)
+    # Publishes the table's Arrow file and memory-maps it before timing
+    duckdb_executor.run(f"SELECT COUNT(*) FROM {TABLE_NAME}", TABLE_NAME)
+
+    results = []
+    for name, pandas_code, sql in analytics(category, measure, key):
+        pandas_timing = _time(pandas_executor, pandas_code, runs)
+        duckdb_timing = _time(duckdb_executor, sql, runs)
+        one = {"analytic": name, "pandas": pandas_timing, "duckdb": duckdb_timing}
+        if "median_seconds" in pandas_timing and "median_seconds" in duckdb_timing:
+            one["speedup"] = round(pandas_timing["median_seconds"] / max(duckdb_timing["median_seconds"], 1e-9), 2)
+        results.append(one)
+    return {"rows": len(df), "runs": runs, "duckdb_threads": threads, "analytics": results}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Rows of the synthetic table.")
+    parser.add_argument("--table", default=None, help="Arrow file of a session table to use instead.")
+    parser.add_argument("--category-column", default="category", help="Grouping column (with --table).")
+    parser.add_argument("--measure-column", default="amount", help="Numeric column (with --table).")
+    parser.add_argument("--key-column", default=None,
+                        help="High-cardinality column for top-k and distinct "
+                             "(default: `key`, or the measure column with --table).")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per analytic and backend.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 2, help="DuckDB threads.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as session_path:
+        table_dir = os.path.join(session_path, "arrow")
+        os.makedirs(table_dir)
+        if args.table:
+            from app.core.utils.columnar_store import read_columnar
+
+            df = read_columnar(args.table)
+            os.symlink(os.path.abspath(args.table), os.path.join(table_dir, f"{TABLE_NAME}.arrow"))
+            key = args.key_column or args.measure_column
+        else:
+            df = synthetic_table(args.rows)
+            key = args.key_column or "key"
+        results = run_benchmark(df, args.runs, args.threads, args.category_column, args.measure_column, key,
+                                table_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{results['rows']} rows, median of {results['runs']} runs, DuckDB on {results['duckdb_threads']} threads")
+        for one in results["analytics"]:
+            pandas_timing, duckdb_timing = one["pandas"], one["duckdb"]
+            print(f"  {one['analytic']:<14} pandas {pandas_timing.get('median_seconds', pandas_timing.get('error'))}s"
+                  f"  duckdb {duckdb_timing.get('median_seconds', duckdb_timing.get('error'))}s"
+                  + (f"  x{one['speedup']}" if "speedup" in one else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
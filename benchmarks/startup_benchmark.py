@@ -0,0 +1,134 @@
+"""
+Measures API import time and cold-start cost, so startup regressions show up.
+
+Every measurement runs in a fresh interpreter:
+
+- import: `import app.api.main`, repeated --runs times (min / median / max).
+- top imports: the slowest modules imported by `app.api.main` (`-X importtime`).
+- cold start: first and second `build_report_workflow()` calls (the first
+  one pays for the lazy imports and the graph compilation; the second must
+  hit the compiled-graph cache), and the first HTTP request served.
+
+Usage (from the repository root):
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 10 --max-import-seconds 1.5 --json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import app.api.main
+print(time.perf_counter() - started)
+"""
+
+_COLD_START_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import app.api.main as main
+imported = time.perf_counter()
+
+from app.core.workflow import build_report_workflow
+build_report_workflow()
+first_build = time.perf_counter()
+build_report_workflow()
+second_build = time.perf_counter()
+
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    request_started = time.perf_counter()
+    client.get("/report/queue")
+    first_request = time.perf_counter() - request_started
+
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_workflow_build_seconds": first_build - imported,
+    "cached_workflow_build_seconds": second_build - first_build,
+    "first_request_seconds": first_request,
+}))
+"""
+
+
+def _run(code: str, *args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, WARM_START="false")
+    return subprocess.run(
+        [sys.executable, *args, "-c", code], cwd=REPO_ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+
+
+def measure_import(runs: int) -> Dict[str, float]:
+    timings = [float(_run(_IMPORT_SNIPPET).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "min_seconds": round(min(timings), 4),
+        "median_seconds": round(statistics.median(timings), 4),
+        "max_seconds": round(max(timings), 4),
+    }
+
+
+def measure_top_imports(limit: int) -> List[Dict[str, Any]]:
+    """Slowest modules by cumulative import time (`python -X importtime`)."""
+    stderr = _run("import app.api.main", "-X", "importtime").stderr
+
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        modules.append({"module": name, "cumulative_ms": round(int(cumulative_us) / 1000, 1)})
+
+    modules.sort(key=lambda one: one["cumulative_ms"], reverse=True)
+    return modules[:limit]
+
+
+def measure_cold_start() -> Dict[str, float]:
+    timings = json.loads(_run(_COLD_START_SNIPPET).stdout.strip().splitlines()[-1])
+    return {name: round(value, 4) for name, value in timings.items()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh-interpreter import runs.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list.")
+    parser.add_argument("--max-import-seconds", type=float, default=None,
+                        help="Exit with status 1 if the median import time exceeds this budget.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "import": measure_import(args.runs),
+        "cold_start": measure_cold_start(),
+        "top_imports": measure_top_imports(args.top),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Python {results['python']}")
+        print("import app.api.main: " + ", ".join(f"{k}={v}" for k, v in results["import"].items()))
+        print("cold start: " + ", ".join(f"{k}={v}" for k, v in results["cold_start"].items()))
+        print("slowest imports:")
+        for one in results["top_imports"]:
+            print(f"  {one['cumulative_ms']:>9.1f} ms  {one['module']}")
+
+    budget = args.max_import_seconds
+    if budget is not None and results["import"]["median_seconds"] > budget:
+        print(f"Import time regression: median {results['import']['median_seconds']}s > budget {budget}s",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import ast
+
+from app.core.utils.code_validation import check_column_literals
+
+COLUMNS = ["region", "sales"]
+
+
+def _diagnostics(code):
+    return check_column_literals(ast.parse(code), COLUMNS, "orders")
+
+
+def test_unknown_column_is_flagged():
+    diagnostics = _diagnostics("def analyze_data(df):\n    return df['revenue'].sum()\n")
+    assert [one.check for one in diagnostics] == ["columns"]
+    assert "'revenue'" in diagnostics[0].message
+
+
+def test_lookups_after_the_table_argument_is_rebound_are_not_checked():
+    for code in (
+        "def analyze_data(df):\n    df = df.reset_index()\n    return df['index']\n",
+        "def analyze_data(df):\n    df = df.melt(id_vars='region')\n    return df.groupby('variable')['value'].sum()\n",
+        "def analyze_data(df):\n    df.rename(columns=str.upper, inplace=True)\n    return df['REGION']\n",
+        "def analyze_data(df):\n    if len(df) > 1:\n        df = df.pivot_table(index='region', values='sales')\n"
+        "    return df.loc[:, 'sales_sum']\n",
+    ):
+        assert _diagnostics(code) == [], code
+
+
+def test_lookups_before_the_rebinding_are_still_checked():
+    code = "def analyze_data(df):\n    total = df['revenue'].sum()\n    df = df.reset_index()\n    return df['index'], total\n"
+    assert [one.line for one in _diagnostics(code)] == [2]
+
+
+def test_rebinding_in_a_loop_covers_the_whole_loop():
+    code = (
+        "def analyze_data(df):\n    for _ in range(2):\n        x = df['index']\n        df = df.reset_index()\n"
+        "    return x\n"
+    )
+    assert _diagnostics(code) == []
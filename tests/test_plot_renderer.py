@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.core.utils.plot_renderer import PyplotShim, render_plot
+
+ESCAPED_PLOT = """
+import time
+df['cat'].value_counts().plot(kind='bar', color='{color}')
+time.sleep(0.3)
+plt.title('{color}')
+"""
+
+
+def _pixels(path, rgb):
+    import matplotlib.image
+
+    image = matplotlib.image.imread(path)[..., :3]
+    return int(np.all(np.abs(image - np.array(rgb)) < 0.05, axis=-1).sum())
+
+
+def test_concurrent_escaped_renders_do_not_share_figures(tmp_path):
+    df = pd.DataFrame({"cat": list("aabbbc")})
+    paths = {color: str(tmp_path / f"{color}.png") for color in ("red", "blue")}
+    results = {}
+
+    def _render(color):
+        results[color] = render_plot(ESCAPED_PLOT.format(color=color), df, paths[color])
+
+    threads = [threading.Thread(target=_render, args=(color,)) for color in paths]
+    for one in threads:
+        one.start()
+    for one in threads:
+        one.join()
+
+    assert results == paths
+    assert _pixels(paths["red"], (1, 0, 0)) > 0
+    assert _pixels(paths["red"], (0, 0, 1)) == 0
+    assert _pixels(paths["blue"], (0, 0, 1)) > 0
+    assert _pixels(paths["blue"], (1, 0, 0)) == 0
+
+
+def test_pyplot_only_functions_stay_on_the_render_figure(tmp_path):
+    df = pd.DataFrame({"x": [1, 2, 3], "y": [3, 1, 2]})
+    code = """
+import matplotlib.pyplot as plt
+plt.rc('font', size=30)
+lines = plt.plot(df['x'], df['y'])
+plt.setp(lines, color='red')
+plt.figtext(0.5, 0.01, 'note')
+"""
+    import matplotlib
+
+    font_size = matplotlib.rcParams["font.size"]
+    path = str(tmp_path / "plot.png")
+    assert render_plot(code, df, path) == path
+    assert _pixels(path, (1, 0, 0)) > 0
+    assert matplotlib.rcParams["font.size"] == font_size
+
+
+def test_unknown_pyplot_function_is_rejected():
+    from matplotlib.figure import Figure
+
+    shim = PyplotShim(Figure())
+    try:
+        shim.not_a_pyplot_function
+    except AttributeError as e:
+        assert "plt.not_a_pyplot_function" in str(e)
+    else:
+        raise AssertionError("expected AttributeError")
@@ -0,0 +1,26 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import pytest
+
+from app.core.utils.worker_pool import SharedProcessPool
+
+
+def test_time_queued_behind_busy_workers_does_not_count():
+    pool = SharedProcessPool(1)
+    # Both tasks run within the timeout, but the second one waits for the first
+    with ThreadPoolExecutor(2) as threads:
+        futures = [threads.submit(pool.run, time.sleep, 1.0, timeout=1.5) for _ in range(2)]
+        assert [one.result() for one in futures] == [None, None]
+
+
+def test_task_that_outlives_its_timeout_fails_alone():
+    pool = SharedProcessPool(2)
+    with ThreadPoolExecutor(2) as threads:
+        stuck = threads.submit(pool.run, time.sleep, 30, timeout=1.0)
+        time.sleep(0.5)
+        innocent = threads.submit(pool.run, time.sleep, 0.5, timeout=1.0)
+        with pytest.raises(FutureTimeoutError):
+            stuck.result()
+        assert innocent.result() is None
+    assert pool.run(abs, -3, timeout=5) == 3